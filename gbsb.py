@@ -1,11 +1,25 @@
+import io
+import os
 import sys
 import json
 import argparse
+import traceback
+from itertools import repeat
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 from src.lexer import Lexer
 from src.parser import Parser
 from src.transformer import ast_to_ir
 from src.transpiler import generate_c
-from src.sprite import Sprite
+from src.passes import PassManager, PASSES, TRANSFORMS, OPT_LEVELS, DEFAULT_OPT_LEVEL, format_timings
+from src.verify import IRVerifyError
+from src.cfg import SSA
+from src.sprite_bin import load_sprite, compile_file
+from src.sprite_import import import_image, collect_images
+from src.cache import BuildCache, CACHE_DIR
+from src.sprite_cache import configure_sprite_cache, DEFAULT_BUDGET
+from src import bench
+from src.bench import SHAPES
 
 def open_file(input_file):
     try:
@@ -51,34 +65,292 @@ def debug_transformer(ast, pretty=False, output=False):
         print(ir)
     return ir
 
-def run_transpile(args):
-    input_f = args.input_file 
+def parse_file(input_f, debug_lexer_output=False):
+    lexer = Lexer()
+    if debug_lexer_output:
+        src = open_file(input_f)
+        tokens = lexer.tokenize(src)
+        debug_lexer(lexer, tokens, output=True)
+        parser_instance = Parser(tokens, input_f)
+        program = parser_instance.parse()
+    else:
+        # Stream tokens straight from the file into the parser
+        try:
+            f = open(input_f, 'r')
+        except OSError as e:
+            print(f"Error: Failed to open file '{input_f}': {e}")
+            sys.exit(1)
+        with f:
+            parser_instance = Parser(lexer.iter_file(f), input_f)
+            program = parser_instance.parse()
+        debug_lexer(lexer, None)
+    return parser_instance, program
+
+def parse_source(src, input_f):
+    lexer = Lexer()
+    parser_instance = Parser(lexer.iter_tokens(src), input_f)
+    program = parser_instance.parse()
+    debug_lexer(lexer, None)
+    return parser_instance, program
 
-    if not args.input_file.endswith(".gbs"):
+def transpile_file(input_f, args):
+    if not input_f.endswith(".gbs"):
         print("Error: Input file must have a .gbs extension.")
         sys.exit(1)
 
-    src = open_file(args.input_file)
+    configure_sprite_cache(
+        args.sprite_cache_mb * 1024 * 1024,
+        None if args.no_cache else os.path.join(args.cache_dir, "sprites"),
+    )
 
-    lexer = Lexer()
-    tokens = lexer.tokenize(src)
-    debug_lexer(lexer, tokens, output=args.debug_lexer)
+    debug = args.debug_lexer or args.debug_parser or args.debug_ir or args.debug_cfg
+    passes = PassManager.from_options(args.opt_level, args.enable_pass, args.disable_pass, verify=args.verify_ir or debug)
+
+    # The debug dumps and pass reports need the real compile, so they bypass the cache
+    use_cache = not (args.no_cache or args.debug_lexer or args.debug_parser or args.debug_cfg or args.report_dead or args.report_tiles or args.time_passes)
+
+    if use_cache:
+        cache = BuildCache(args.cache_dir)
+        src = open_file(input_f)
+        key = cache.key(src, input_f, passes.describe())
+        entry = cache.load(key)
+        if entry is not None:
+            if args.debug_ir:
+                print(entry.ir)
+            for warning in entry.warnings:
+                print(f"GBSB: warning: {warning}")
+            return entry.c_code
+        parser_instance, program = parse_source(src, input_f)
+    else:
+        parser_instance, program = parse_file(input_f, args.debug_lexer)
 
-    parser_instance = Parser(tokens, input_f)
-    program = parser_instance.parse()
     debug_parser(parser_instance, program, output=args.debug_parser)
 
     ir = debug_transformer(program, pretty=False, output=args.debug_ir)
+    try:
+        ir, ctx = passes.run(ir)
+    except IRVerifyError as e:
+        print(f"Error: IR verification failed after '{e.pass_name}':")
+        for problem in e.problems:
+            print(" -", problem)
+        sys.exit(1)
+
+    for warning in ctx.warnings:
+        print(f"GBSB: warning: {warning}")
+    if args.report_dead:
+        for item in ctx.removed:
+            print(f"GBSB: removed {item}")
+    if args.report_tiles and ctx.tile_bank is not None:
+        print(f"GBSB: {ctx.tile_bank.report()}")
+    if args.debug_cfg:
+        for cfg in passes.analysis("cfg", ir, ctx).values():
+            print(cfg.dump(SSA(cfg)))
+    if args.time_passes:
+        print(format_timings(ctx.timings))
 
     c_code = generate_c(ir)
 
-    if args.output:
-        save_file(args.output, c_code)
+    if use_cache:
+        cache.store(key, ir, c_code, parser_instance.asset_files, ctx.warnings)
+    return c_code
+
+class BuildResult:
+    def __init__(self, input_file, c_code, log, ok):
+        self.input_file = input_file
+        self.c_code = c_code
+        self.log = log # everything the build printed (debug dumps, errors)
+        self.ok = ok
+
+def build_one(input_f, args):
+    """Compile one file, capturing its output so it can run in a worker process."""
+    log = io.StringIO()
+    try:
+        with redirect_stdout(log):
+            c_code = transpile_file(input_f, args)
+        return BuildResult(input_f, c_code, log.getvalue(), True)
+    except SystemExit:
+        return BuildResult(input_f, None, log.getvalue(), False)
+    except Exception:
+        log.write(f"Error: Internal compiler error while building '{input_f}':\n")
+        log.write(traceback.format_exc())
+        return BuildResult(input_f, None, log.getvalue(), False)
+
+def collect_inputs(paths):
+    """Expand files and directories into (source, output-relative path) pairs."""
+    inputs = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(".gbs"):
+                        src = os.path.join(root, name)
+                        found.append((src, os.path.relpath(src, path)))
+        else:
+            found = [(path, os.path.basename(path))]
+
+        for src, rel in found:
+            key = os.path.abspath(src)
+            if key not in seen:
+                seen.add(key)
+                inputs.append((src, rel))
+    return inputs
+
+def run_transpile(args):
+    inputs = collect_inputs(args.input_files)
+    if not inputs:
+        print("Error: No .gbs files found.")
+        sys.exit(1)
+
+    # One plain file keeps the original behaviour: -o names the .c file and
+    # without it the C goes to stdout
+    single = len(args.input_files) == 1 and not os.path.isdir(args.input_files[0])
+    if single:
+        result = build_one(inputs[0][0], args)
+        print(result.log, end="")
+        if not result.ok:
+            sys.exit(1)
+        if args.output:
+            save_file(args.output, result.c_code)
+        else:
+            print(result.c_code)
+        return
+
+    # Several files: each foo.gbs becomes foo.c, under -o DIR if given,
+    # otherwise next to the source
+    targets = {}
+    for src, rel in inputs:
+        if args.output:
+            out = os.path.join(args.output, os.path.splitext(rel)[0] + ".c")
+        else:
+            out = os.path.splitext(src)[0] + ".c"
+        if out in targets:
+            print(f"Error: '{src}' and '{targets[out]}' would both be written to '{out}'")
+            sys.exit(1)
+        targets[out] = src
+    outputs = list(targets)
+
+    sources = [src for src, _ in inputs]
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs == 1:
+        results = (build_one(src, args) for src in sources)
     else:
-        print(c_code)
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(sources)))
+        results = pool.map(build_one, sources, repeat(args), chunksize=max(1, len(sources) // (jobs * 4)))
+
+    # Results arrive in input order, whatever order the workers finish in
+    failed = []
+    for out, result in zip(outputs, results):
+        if result.log:
+            print(f"== {result.input_file}")
+            print(result.log, end="")
+        if result.ok:
+            os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+            save_file(out, result.c_code)
+        else:
+            failed.append(result.input_file)
+
+    if jobs != 1:
+        pool.shutdown()
+
+    if failed:
+        print(f"GBSB: {len(failed)} of {len(sources)} files failed to build:")
+        for src in failed:
+            print(" -", src)
+        sys.exit(1)
+
+def run_bench(args):
+    shapes = SHAPES if args.shape == "all" else (args.shape,)
+    try:
+        result = bench.run_bench(shapes, args.size, args.repeat, args.seed, args.sprite_tiles)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(bench.format_report(result))
+    if args.json:
+        save_file(args.json, json.dumps(result, indent=3))
+
+    if args.baseline:
+        baseline = json.loads(open_file(args.baseline))
+        regressions = bench.compare(result, baseline, args.threshold / 100)
+        if regressions:
+            print(f"GBSB bench: {len(regressions)} regression(s) against {args.baseline}:")
+            for reg in regressions:
+                print(" -", reg)
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold}%)")
+
+def run_import_sprites(args):
+    if not args.paths:
+        print("Error: 'gbsb spr import' needs at least one image or directory.")
+        sys.exit(1)
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found.")
+            sys.exit(1)
+    inputs = collect_images(args.paths)
+    if not inputs:
+        print("Error: No .png or .pgm files found.")
+        sys.exit(1)
+
+    # Like build: -o names the file for one plain image, else the output directory
+    single = len(args.paths) == 1 and not os.path.isdir(args.paths[0])
+    targets = {}
+    for src, rel in inputs:
+        if single and args.output:
+            out = args.output
+        elif args.output:
+            out = os.path.join(args.output, rel)
+        else:
+            out = os.path.splitext(src)[0] + ".gbspr"
+        if out in targets:
+            print(f"Error: '{src}' and '{targets[out]}' would both be written to '{out}'")
+            sys.exit(1)
+        targets[out] = src
+
+    sources = list(targets.values())
+    outputs = list(targets)
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs == 1 or len(sources) == 1:
+        results = list(map(import_image, sources, outputs, repeat(args.force)))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(sources))) as pool:
+            results = list(pool.map(import_image, sources, outputs, repeat(args.force),
+                                    chunksize=max(1, len(sources) // (jobs * 4))))
+
+    counts = {"converted": 0, "unchanged": 0, "failed": 0}
+    for result in results:
+        counts[result.status] += 1
+        if result.status == "converted":
+            print(f"{result.source} -> {result.output} ({result.message})")
+        elif result.status == "failed":
+            print(f"Error: {result.message}")
+    print(f"GBSB: {counts['converted']} converted, {counts['unchanged']} unchanged, {counts['failed']} failed")
+    if counts["failed"]:
+        sys.exit(1)
 
 def run_view_sprite(args):
-    sprite = Sprite.from_file(args.sprite_file)
+    if args.sprite_file == "import":
+        run_import_sprites(args)
+        return
+    if args.paths:
+        print("Error: Only 'gbsb spr import' takes more than one path.")
+        sys.exit(1)
+    if not os.path.isfile(args.sprite_file):
+        print(f"Error: Sprite file '{args.sprite_file}' not found.")
+        sys.exit(1)
+    try:
+        if args.compile:
+            out_path = compile_file(args.sprite_file, args.output)
+            print(f"Compiled {args.sprite_file} to {out_path}")
+            return
+        sprite = load_sprite(args.sprite_file)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     print(f"Sprite Name: {sprite.name}")
     sprite.print_ascii()
 
@@ -87,17 +359,49 @@ def main():
     subparsers = parser.add_subparsers(dest="command")
 
     # Subcommand: transpile
-    transpile_parser = subparsers.add_parser("build", help="Transpile a .gbs file to C")
-    transpile_parser.add_argument("input_file", help="Path to .gbs source file")
-    transpile_parser.add_argument("-o", "--output", help="Path to output .c file")
+    transpile_parser = subparsers.add_parser("build", help="Transpile .gbs files to C")
+    transpile_parser.add_argument("input_files", nargs="+", metavar="input", help="Paths to .gbs source files or directories")
+    transpile_parser.add_argument("-o", "--output", help="Path to output .c file (output directory when building several files)")
+    transpile_parser.add_argument("-j", "--jobs", type=int, default=0, help="Files to compile in parallel (default: one per CPU)")
     transpile_parser.add_argument("--debug-lexer", action="store_true", help="Print tokens")
     transpile_parser.add_argument("--debug-parser", action="store_true", help="Print AST")
     transpile_parser.add_argument("--debug-ir", action="store_true", help="Print IR")
+    transpile_parser.add_argument("--debug-cfg", action="store_true", help="Print the basic blocks of each state and function, in SSA form")
+    transpile_parser.add_argument("-O", dest="opt_level", choices=tuple(OPT_LEVELS), default=DEFAULT_OPT_LEVEL,
+                                  help=f"Optimization level: 0 none, 1 folding and dead code, 2 all, s all but favour size (default: {DEFAULT_OPT_LEVEL})")
+    transpile_parser.add_argument("--enable-pass", action="append", default=[], choices=TRANSFORMS, metavar="PASS",
+                                  help=f"Run an IR pass the -O level leaves out: {', '.join(f'{name} ({PASSES[name].help})' for name in TRANSFORMS)}")
+    transpile_parser.add_argument("--disable-pass", action="append", default=[], choices=TRANSFORMS, metavar="PASS", help="Skip an IR pass")
+    transpile_parser.add_argument("--verify-ir", action="store_true", help="Check the IR after every pass (always on with --debug-*)")
+    transpile_parser.add_argument("--time-passes", action="store_true", help="Print how long each IR pass took")
+    transpile_parser.add_argument("--report-dead", action="store_true", help="List the unreachable code and unused declarations removed")
+    transpile_parser.add_argument("--report-tiles", action="store_true", help="Print the tiles and VRAM/ROM bytes the tilebank pass saved")
+    transpile_parser.add_argument("--no-cache", action="store_true", help="Always compile from scratch")
+    transpile_parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"Build cache directory (default: {CACHE_DIR})")
+    transpile_parser.add_argument("--sprite-cache-mb", type=int, default=DEFAULT_BUDGET // (1024 * 1024), help="Memory budget for decoded sprites, in MB")
     transpile_parser.set_defaults(func=run_transpile)
 
+    # Subcommand: bench
+    bench_parser = subparsers.add_parser("bench", help="Benchmark the compiler phases on synthetic programs")
+    bench_parser.add_argument("--shape", choices=SHAPES + ("all",), default="all", help="Kind of program to generate")
+    bench_parser.add_argument("--size", type=int, default=2000, help="Approximate number of statements per program")
+    bench_parser.add_argument("--repeat", type=int, default=3, help="Timing runs per phase (best is kept)")
+    bench_parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated programs")
+    bench_parser.add_argument("--sprite-tiles", type=int, default=bench.SPRITE_TILES, help="Tiles in the sprite sheet used to time .gbspr parsing and 2bpp encode/decode (0 to skip)")
+    bench_parser.add_argument("--json", help="Write results as JSON to this path")
+    bench_parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    bench_parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown/growth in percent before flagging a regression")
+    bench_parser.set_defaults(func=run_bench)
+
     # Subcommand: view-sprite
-    sprite_parser = subparsers.add_parser("spr", help="View a sprite from a .gbspr file")
-    sprite_parser.add_argument("sprite_file", help="Path to .gbspr sprite file")
+    sprite_parser = subparsers.add_parser("spr", help="View a sprite from a .gbspr file, compile it, or import images ('spr import')")
+    sprite_parser.add_argument("sprite_file", help="Path to .gbspr sprite file (or a compiled .gbsprc), or 'import'")
+    sprite_parser.add_argument("paths", nargs="*", metavar="image", help="With 'import': PNG/PGM images or directories of them to convert to .gbspr")
+    sprite_parser.add_argument("--compile", action="store_true", help="Write the binary .gbsprc form, which builds load without parsing")
+    sprite_parser.add_argument("-o", "--output", help="Path of the compiled sprite (default: next to the input, as .gbsprc); "
+                                                      "with 'import', the .gbspr file for one image or the output directory")
+    sprite_parser.add_argument("-j", "--jobs", type=int, default=0, help="With 'import': images to convert in parallel (default: one per CPU)")
+    sprite_parser.add_argument("--force", action="store_true", help="With 'import': convert images even if their .gbspr is up to date")
     sprite_parser.set_defaults(func=run_view_sprite)
 
     args = parser.parse_args()
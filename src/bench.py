@@ -0,0 +1,297 @@
+# bench.py
+import os
+import time
+import random
+import tempfile
+import platform
+import tracemalloc
+from src.lexer import Lexer
+from src.parser import Parser
+from src.transformer import ast_to_ir
+from src.transpiler import generate_c
+from src.passes import PassManager
+from src.sprite_cache import sprite_cache
+from src.sprite import Sprite, ASCII_TO_PIXELS
+
+SHAPES = ("mixed", "deep", "states", "groups", "sprites")
+PHASES = ("lexer", "parser", "transformer", "optimize", "codegen")
+SPRITE_PHASES = ("parse", "encode", "decode")
+SPRITE_TILES = 10000
+
+# region Corpus generation
+def gen_expr(rng, depth):
+    if depth <= 0:
+        # Only plain operands: the right side of '*' is parsed as a primary
+        return rng.choice(("x", "y", str(rng.randint(0, 255))))
+    op = rng.choice(("+", "-", "*", "/", "%", "<", "==", "&&"))
+    return f"({gen_expr(rng, depth - 1)} {op} {gen_expr(rng, depth - 1)})"
+
+def gen_deep_expr(rng, depth):
+    # One long right-leaning chain: stresses parser recursion, not size
+    expr = str(rng.randint(0, 9))
+    for _ in range(depth):
+        expr = f"({expr} {rng.choice(('+', '-', '*'))} {rng.randint(1, 9)})"
+    return expr
+
+def gen_stmt(rng, i):
+    kind = i % 6
+    if kind == 0:
+        return f"var v{i} : int = {gen_expr(rng, 3)};"
+    if kind == 1:
+        return f"x = {gen_expr(rng, 2)};"
+    if kind == 2:
+        return f"if (x == {i % 7}) {{ y = y + {i % 13}; }} elif (x < 3) {{ y--; }} else {{ print(\"{i}\"); }}"
+    if kind == 3:
+        return f"while (y < {i % 50 + 1}) {{ y++; }}"
+    if kind == 4:
+        return f"for (var i = 0; i < {i % 20 + 1}; i++) {{ draw_sprite(slime[0], i, y); }}"
+    if i % 12 == 5:
+        return f"y = p.age + nums[{i % 4}];"
+    return f"x += add(x, {i % 9});"
+
+def gen_body(rng, count, start=0, indent="    "):
+    return "\n".join(indent + gen_stmt(rng, start + i) for i in range(count))
+
+def gen_sprite_sheet(rng, name, tiles):
+    lines = ["type: sprite", f"name: {name}", "", "tiles:"]
+    for t in range(1, tiles + 1):
+        lines.append(f"{t}:")
+        lines.extend("".join(rng.choice("0123") for _ in range(8)) for _ in range(8))
+        lines.append("")
+    return "\n".join(lines)
+
+def generate_program(shape, size, seed=0, asset_dir=None):
+    """Build a synthetic GBScript program of roughly `size` statements.
+
+    Sprite sheets for the "sprites" and "mixed" shapes are written into
+    `asset_dir`, which must then be the directory of the source file.
+    """
+    rng = random.Random(seed)
+    out = ['module("stdgb")', "obj pet { age: int, kind: int };", "var x : int = 0;", "var y : int = 0;"]
+    out.append("func add(a: int, b: int) : int {\n    return a + b;\n}")
+
+    if shape in ("sprites", "mixed"):
+        sheets = max(1, size // 20) if shape == "sprites" else max(1, size // 200)
+        for s in range(sheets):
+            name = f"sheet{s}"
+            with open(os.path.join(asset_dir, name + ".gbspr"), "w") as f:
+                f.write(gen_sprite_sheet(rng, name, 16))
+            out.append(f'sprite("{name}.gbspr");')
+
+    if shape in ("groups", "mixed"):
+        groups = max(1, size // 50)
+        items = 256 if shape == "groups" else 32
+        for g in range(groups):
+            values = ", ".join(str(rng.randint(0, 255)) for _ in range(items))
+            out.append(f"grp table{g} : int[{items}] = [{values}];")
+
+    if shape == "deep":
+        body = "\n".join(f"    x = {gen_deep_expr(rng, 60)};" for _ in range(max(1, size // 10)))
+        out.append(f"state onload() {{\n{body}\n}}")
+        out.append(f"state gameloop() {{\n    y = {gen_expr(rng, 8)};\n}}")
+    elif shape == "states":
+        per_state = 10
+        for s in range(max(1, size // per_state)):
+            name = "gameloop" if s == 0 else f"scene{s}"
+            out.append(f"state {name}() {{\n{gen_body(rng, per_state, s * per_state)}\n}}")
+    else:
+        out.append(f"state onload() {{\n{gen_body(rng, max(1, size // 4))}\n}}")
+        out.append(f"state gameloop() {{\n{gen_body(rng, size, size)}\n}}")
+
+    return "\n".join(out) + "\n"
+# endregion
+
+# region Measurement
+def count_nodes(node):
+    """Count AST or IR nodes reachable through slot fields."""
+    count = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+            continue
+        slots = getattr(type(item), "__slots__", None)
+        if slots is None or type(item).__module__ not in ("src.nodes", "src.ir_nodes"):
+            continue
+        count += 1
+        for klass in type(item).__mro__:
+            for name in getattr(klass, "__slots__", ()):
+                value = getattr(item, name, None)
+                if isinstance(value, list) or hasattr(type(value), "__slots__"):
+                    stack.append(value)
+    return count
+
+def run_phases(source, path):
+    lexer = Lexer()
+    tokens = lexer.tokenize(source)
+    yield "lexer", tokens
+    parser = Parser(tokens, path)
+    program = parser.parse()
+    if lexer.errors or parser.errors:
+        raise ValueError(f"generated program does not compile: {(lexer.errors + parser.errors)[:3]}")
+    yield "parser", program
+    ir = ast_to_ir(program)
+    yield "transformer", ir
+    ir, _ = PassManager.from_options().run(ir)
+    yield "optimize", ir
+    yield "codegen", generate_c(ir)
+
+# phase -> (unit of work, how to count it in the phase's output)
+PHASE_UNITS = {
+    "lexer": ("tokens", len),
+    "parser": ("ast_nodes", count_nodes),
+    "transformer": ("ir_nodes", count_nodes),
+    "optimize": ("opt_ir_nodes", count_nodes),
+    "codegen": ("c_bytes", len),
+}
+
+def time_phases(source, path, repeat):
+    best = {phase: float("inf") for phase in PHASES}
+    sizes = {}
+    for _ in range(repeat):
+        sprite_cache.clear() # every run pays for its sprite decoding
+        start = time.perf_counter()
+        for phase, value in run_phases(source, path):
+            now = time.perf_counter()
+            best[phase] = min(best[phase], now - start)
+            # Counted between timings: the optimizer rewrites the IR in place
+            if phase not in sizes:
+                sizes[phase] = PHASE_UNITS[phase][1](value)
+            start = time.perf_counter()
+    return best, sizes
+
+def peak_memory(source, path):
+    peaks = {}
+    sprite_cache.clear()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for phase, _ in run_phases(source, path):
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - base
+            tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def bench_shape(shape, size, repeat=3, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"bench_{shape}.gbs")
+        source = generate_program(shape, size, seed, tmp)
+        with open(path, "w") as f:
+            f.write(source)
+
+        times, sizes = time_phases(source, path, repeat)
+        peaks = peak_memory(source, path)
+
+    result = {"source_bytes": len(source), "phases": {}}
+    for phase in PHASES:
+        unit = PHASE_UNITS[phase][0]
+        n = sizes[phase]
+        secs = times[phase]
+        result[unit] = n
+        result["phases"][phase] = {
+            "seconds": round(secs, 6),
+            f"{unit}_per_sec": round(n / secs) if secs > 0 else None,
+            "peak_bytes": peaks[phase],
+        }
+    return result
+
+def bench_sprites(tiles, repeat=3, seed=0):
+    """Time parsing a .gbspr sheet of `tiles` tiles and the 2bpp encode/decode of its pixels."""
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_sheet.gbspr")
+        with open(path, "w") as f:
+            f.write(gen_sprite_sheet(rng, "sheet", tiles))
+
+        steps = {
+            "parse": lambda: Sprite.from_file(path),
+            "encode": lambda: sprite.get_tile_bytes(),
+            "decode": lambda: Sprite.decode_tiles(data),
+        }
+        sprite = Sprite.from_file(path)
+        data = sprite.get_tile_bytes()
+        # The round trip is what the cache and codegen rely on
+        pixels = b"".join(sprite.tiles[t] for t in sorted(sprite.tiles))
+        if Sprite.decode_tiles(data) != pixels:
+            raise ValueError("sprite decode does not round-trip the encoded sheet")
+
+        result = {"tiles": tiles, "tile_bytes": len(data), "phases": {}}
+        for phase in SPRITE_PHASES:
+            secs = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                steps[phase]()
+                secs = min(secs, time.perf_counter() - start)
+            tracemalloc.start()
+            try:
+                steps[phase]()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            result["phases"][phase] = {
+                "seconds": round(secs, 6),
+                "tiles_per_sec": round(tiles / secs) if secs > 0 else None,
+                "peak_bytes": peak,
+            }
+    return result
+
+def run_bench(shapes, size, repeat=3, seed=0, sprite_tiles=SPRITE_TILES):
+    result = {
+        "version": 1,
+        "python": platform.python_version(),
+        "size": size,
+        "repeat": repeat,
+        "seed": seed,
+        "shapes": {shape: bench_shape(shape, size, repeat, seed) for shape in shapes},
+    }
+    if sprite_tiles:
+        result["sprites"] = bench_sprites(sprite_tiles, repeat, seed)
+    return result
+# endregion
+
+# region Baseline comparison
+def compare(current, baseline, threshold=0.10):
+    """Return a list of regressions: phases whose time or peak memory grew by more than `threshold`."""
+    regressions = []
+    groups = dict(current["shapes"])
+    base_groups = dict(baseline.get("shapes", {}))
+    if "sprites" in current:
+        groups["sprites"] = current["sprites"]
+        base_groups["sprites"] = baseline.get("sprites")
+    for shape, result in groups.items():
+        base = base_groups.get(shape)
+        if base is None:
+            continue
+        for phase, stats in result["phases"].items():
+            old = base["phases"].get(phase)
+            if old is None:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                new_v, old_v = stats.get(metric), old.get(metric)
+                if not new_v or not old_v:
+                    continue
+                change = (new_v - old_v) / old_v
+                if change > threshold:
+                    regressions.append(f"{shape}/{phase} {metric}: {old_v} -> {new_v} (+{change:.0%})")
+    return regressions
+
+def format_report(current):
+    lines = []
+    for shape, result in current["shapes"].items():
+        lines.append(f"{shape}: {result['source_bytes']} bytes, {result['tokens']} tokens, "
+                     f"{result['ast_nodes']} AST nodes, {result['ir_nodes']} IR nodes")
+        for phase, stats in result["phases"].items():
+            rate = next(v for k, v in stats.items() if k.endswith("_per_sec"))
+            lines.append(f"  {phase:<12} {stats['seconds'] * 1000:9.2f} ms  {rate or 0:>12,}/s  "
+                         f"peak {stats['peak_bytes'] / 1024:10.1f} KiB")
+    if "sprites" in current:
+        result = current["sprites"]
+        lines.append(f"sprite sheet: {result['tiles']} tiles, {result['tile_bytes']} bytes of 2bpp data")
+        for phase, stats in result["phases"].items():
+            lines.append(f"  {phase:<12} {stats['seconds'] * 1000:9.2f} ms  {stats['tiles_per_sec'] or 0:>12,}/s  "
+                         f"peak {stats['peak_bytes'] / 1024:10.1f} KiB")
+    return "\n".join(lines)
+# endregion
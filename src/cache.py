@@ -0,0 +1,95 @@
+# cache.py
+import os
+import glob
+import pickle
+import hashlib
+
+CACHE_DIR = ".gbsb-cache"
+CACHE_FORMAT = 2 # bump when CacheEntry changes
+
+_compiler_version = None
+
+def compiler_version():
+    """Hash of the compiler's own sources, so any compiler change invalidates the cache."""
+    global _compiler_version
+    if _compiler_version is None:
+        h = hashlib.sha256(f"format:{CACHE_FORMAT}".encode())
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(src_dir, "*.py"))):
+            with open(path, "rb") as f:
+                h.update(os.path.basename(path).encode())
+                h.update(f.read())
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, ir, c_code, deps, warnings=()):
+        self.ir = ir
+        self.c_code = c_code
+        self.warnings = list(warnings) # printed again when the entry is used
+        self.deps = deps # { path: sha256 } of files read while compiling (sprites)
+
+
+class BuildCache:
+    """On-disk cache of compiled .gbs files.
+
+    Entries are keyed by the hash of the source text, its directory (sprite
+    paths are relative to it), the build options and the compiler version. Each entry also
+    records the hashes of the sprite files the source pulled in, and is only
+    used while those still match.
+    """
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def key(self, source: str, source_path: str, options: str = ""):
+        h = hashlib.sha256(compiler_version().encode())
+        h.update(os.path.dirname(os.path.abspath(source_path)).encode())
+        h.update(b"\0")
+        h.update(options.encode()) # anything else that changes the output, like the -O level
+        h.update(b"\0")
+        h.update(source.encode("utf-8"))
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def load(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ImportError):
+            return None
+
+        for dep, digest in entry.deps.items():
+            try:
+                if file_digest(dep) != digest:
+                    return None
+            except OSError:
+                return None
+        return entry
+
+    def store(self, key, ir, c_code, dep_paths, warnings=()):
+        try:
+            deps = {os.path.abspath(path): file_digest(path) for path in dep_paths}
+            data = pickle.dumps(CacheEntry(ir, c_code, deps, warnings), pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PicklingError, RecursionError):
+            return False # not cacheable, just compile it next time
+
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path) # atomic, so concurrent builds never see half an entry
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,504 @@
+# cfg.py
+from src.ir_nodes import *
+from src.deadcode import if_chain
+from src.transpiler import generate_c
+
+
+class BasicBlock:
+    """A run of statements with one entry and one exit.
+
+    A block ending in a branch has `cond` set and two successors: taken
+    when the condition is true, then when it is false. A block ending in
+    a return has the CFG's exit block as its only successor.
+    """
+    __slots__ = ("id", "stmts", "cond", "succs", "preds")
+
+    def __init__(self, id):
+        self.id = id
+        self.stmts = []
+        self.cond = None
+        self.succs = []
+        self.preds = []
+
+    def returns(self):
+        return bool(self.stmts) and self.stmts[-1].kind == IRKind.RETURN
+
+    def __repr__(self):
+        return f"B{self.id}"
+
+
+# region Regions
+# The CFG keeps the if/loop nesting it was built from, so structured IR
+# (and from it C) can be regenerated after passes edit the blocks.
+
+class SeqRegion:
+    def __init__(self, items):
+        self.items = items # BasicBlocks and nested regions, in order
+
+    def to_ir(self):
+        stmts = []
+        for item in self.items:
+            if isinstance(item, BasicBlock):
+                stmts.extend(item.stmts)
+            else:
+                stmts.extend(item.to_ir())
+        return stmts
+
+
+class IfRegion:
+    def __init__(self, branches, else_region):
+        self.branches = branches # [(block holding the condition, SeqRegion)]
+        self.else_region = else_region
+
+    def to_ir(self):
+        # Nest the elifs the way the parser does, with the else innermost
+        ir = None
+        for block, region in reversed(self.branches):
+            if ir is None:
+                else_body = self.else_region.to_ir() if self.else_region else []
+                ir = IRIf([block.cond], region.to_ir(), [], else_body)
+            else:
+                ir = IRIf([block.cond], region.to_ir(), [ir], [])
+        return [ir]
+
+
+class LoopRegion:
+    """A while or for loop.
+
+    `preheader` runs once before the loop; for a for loop its last
+    statement is the loop's init. Statements placed before that (code
+    hoisted out of the loop) are emitted ahead of the loop. `header`
+    holds the condition and `latch` the for loop's increment.
+    """
+    def __init__(self, kind, preheader, header, body, latch):
+        self.kind = kind
+        self.preheader = preheader
+        self.header = header
+        self.body = body
+        self.latch = latch
+
+    def to_ir(self):
+        before = list(self.preheader.stmts)
+        if self.kind == "while":
+            return before + [IRWhile(self.header.cond, self.body.to_ir())]
+        init = before.pop() if before else IRNull()
+        increment = self.latch.stmts[0] if self.latch.stmts else IRNull()
+        return before + [IRFor(init, self.header.cond, increment, self.body.to_ir())]
+# endregion
+
+
+class CFG:
+    def __init__(self, name, entry, exit, blocks, region, params=()):
+        self.name = name
+        self.entry = entry
+        self.exit = exit
+        self.blocks = blocks # every block but exit, in creation order
+        self.region = region
+        self.params = list(params)
+
+    def to_ir(self):
+        """Structured IR statements for the body, with any edits to the blocks."""
+        return self.region.to_ir()
+
+    def reachable(self):
+        seen = {self.entry}
+        stack = [self.entry]
+        while stack:
+            for succ in stack.pop().succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append(succ)
+        return seen
+
+    def reverse_postorder(self):
+        order = []
+        seen = set()
+        stack = [(self.entry, iter(self.entry.succs))]
+        seen.add(self.entry)
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def dump(self, ssa=None):
+        lines = [f"CFG {self.name}:"]
+        for block in self.blocks + [self.exit]:
+            label = " (entry)" if block is self.entry else " (exit)" if block is self.exit else ""
+            lines.append(f"  {block}{label}: preds {block.preds} succs {block.succs}")
+            if ssa is not None:
+                for name, args in sorted(ssa.phis.get(block, {}).items()):
+                    version = ssa.phi_versions[block][name]
+                    operands = ", ".join(f"{pred}: {name}.{args[pred]}" for pred in block.preds if pred in args)
+                    lines.append(f"    {name}.{version} = phi({operands})")
+            for stmt in block.stmts:
+                line = f"    {generate_c(stmt)}"
+                if ssa is not None and id(stmt) in ssa.defs:
+                    line += " // {}.{}".format(*ssa.defs[id(stmt)])
+                lines.append(line)
+            if block.cond is not None:
+                lines.append(f"    branch {generate_c(block.cond)} ? {block.succs[0]} : {block.succs[1]}")
+        return "\n".join(lines)
+
+
+class CFGBuilder:
+    """Lowers a state or function body into basic blocks."""
+    def __init__(self):
+        self.blocks = []
+        self.current = None
+        self.exit = None
+
+    def new_block(self):
+        block = BasicBlock(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def link(self, src, dst):
+        src.succs.append(dst)
+        dst.preds.append(src)
+
+    def end(self, block, target):
+        # Fall through to `target` unless the block already returned
+        if not block.returns():
+            self.link(block, target)
+
+    def build(self, name, body, params=()):
+        entry = self.new_block()
+        self.exit = BasicBlock(-1)
+        self.current = entry
+        region = self.seq(body)
+        self.end(self.current, self.exit)
+        self.exit.id = len(self.blocks)
+        return CFG(name, entry, self.exit, self.blocks, region, params)
+
+    def seq(self, stmts):
+        items = [self.current]
+        for stmt in stmts:
+            match stmt.kind:
+                case IRKind.IF:
+                    items.append(self.if_region(stmt))
+                case IRKind.WHILE | IRKind.FOR:
+                    items.append(self.loop_region(stmt))
+                case IRKind.RETURN:
+                    self.current.stmts.append(stmt)
+                    self.link(self.current, self.exit)
+                    # Anything after the return lands in a block nothing jumps to
+                    self.current = self.new_block()
+                case _:
+                    self.current.stmts.append(stmt)
+                    continue
+            items.append(self.current)
+        return SeqRegion(items)
+
+    def if_region(self, ir):
+        test = self.current
+        chain, else_body = if_chain(ir)
+        ends = []
+        branches = []
+        for i, (cond, body) in enumerate(chain):
+            if i:
+                # Each elif tests in its own block, reached when the previous test failed
+                block = self.new_block()
+                self.link(test, block)
+                test = block
+            test.cond = cond
+            self.current = self.new_block()
+            self.link(test, self.current)
+            branches.append((test, self.seq(body)))
+            ends.append(self.current)
+
+        else_region = None
+        if else_body:
+            self.current = self.new_block()
+            self.link(test, self.current)
+            else_region = self.seq(else_body)
+            ends.append(self.current)
+
+        join = self.new_block()
+        if not else_body:
+            self.link(test, join)
+        for block in ends:
+            self.end(block, join)
+        self.current = join
+        return IfRegion(branches, else_region)
+
+    def loop_region(self, ir):
+        preheader = self.new_block()
+        self.link(self.current, preheader)
+        header = self.new_block()
+        self.link(preheader, header)
+
+        latch = None
+        if ir.kind == IRKind.FOR:
+            preheader.stmts.append(ir.init)
+            latch = self.new_block()
+            latch.stmts.append(ir.increment)
+
+        header.cond = ir.condition
+        self.current = self.new_block()
+        self.link(header, self.current)
+        body = self.seq(ir.body)
+
+        back = latch or header
+        self.end(self.current, back)
+        if latch is not None:
+            self.link(latch, header)
+
+        exit_block = self.new_block()
+        self.link(header, exit_block)
+        self.current = exit_block
+        return LoopRegion("for" if latch else "while", preheader, header, body, latch)
+
+
+def build_cfg(ir):
+    """CFG for an IRState or IRFuncDecl."""
+    params = [param.name for param in ir.params] if ir.kind == IRKind.FUNC_DECL else ()
+    return CFGBuilder().build(ir.name, ir.body, params)
+
+def build_cfgs(program):
+    """{name: CFG} for every state and function in `program`."""
+    return {
+        stmt.name: build_cfg(stmt)
+        for stmt in program.body
+        if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL)
+    }
+
+
+# region Dataflow
+def stmt_names(ir, uses, defs):
+    """Add the names `ir` reads to `uses` (if not already defined) and writes to `defs`."""
+    match ir.kind:
+        case IRKind.IDENT:
+            if ir.value not in defs:
+                uses.add(ir.value)
+        case IRKind.VAR_DECL:
+            stmt_names(ir.value, uses, defs)
+            defs.add(ir.name)
+        case IRKind.ASSIGNMENT:
+            stmt_names(ir.value, uses, defs)
+            if ir.operator != "=" or not isinstance(ir.assignee, IRIdent):
+                stmt_names(ir.assignee, uses, defs)
+            if isinstance(ir.assignee, IRIdent):
+                defs.add(ir.assignee.value)
+        case IRKind.UNARY:
+            stmt_names(ir.operand, uses, defs)
+            if ir.operator in ("++", "--") and isinstance(ir.operand, IRIdent):
+                defs.add(ir.operand.value)
+        case _:
+            for field in ir.fields():
+                value = getattr(ir, field, None)
+                if isinstance(value, IRNode):
+                    stmt_names(value, uses, defs)
+                elif isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, IRNode):
+                            stmt_names(item, uses, defs)
+
+def block_names(block):
+    uses, defs = set(), set()
+    for stmt in block.stmts:
+        stmt_names(stmt, uses, defs)
+    if block.cond is not None:
+        stmt_names(block.cond, uses, defs)
+    return uses, defs
+
+def liveness(cfg):
+    """({block: names live on entry}, {block: names live on exit})."""
+    gen_kill = {block: block_names(block) for block in cfg.blocks}
+    live_in = {block: set() for block in cfg.blocks + [cfg.exit]}
+    live_out = {block: set() for block in cfg.blocks + [cfg.exit]}
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(cfg.blocks):
+            out = set().union(*(live_in[succ] for succ in block.succs))
+            uses, defs = gen_kill[block]
+            new_in = uses | (out - defs)
+            if out != live_out[block] or new_in != live_in[block]:
+                live_out[block] = out
+                live_in[block] = new_in
+                changed = True
+    return live_in, live_out
+# endregion
+
+
+# region SSA
+def dominators(cfg):
+    """{block: immediate dominator} for reachable blocks (Cooper, Harvey & Kennedy)."""
+    order = cfg.reverse_postorder()
+    index = {block: i for i, block in enumerate(order)}
+    idom = {cfg.entry: cfg.entry}
+
+    def intersect(a, b):
+        while a is not b:
+            while index[a] > index[b]:
+                a = idom[a]
+            while index[b] > index[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            preds = [p for p in block.preds if p in idom]
+            new = preds[0]
+            for pred in preds[1:]:
+                new = intersect(pred, new)
+            if idom.get(block) is not new:
+                idom[block] = new
+                changed = True
+    return idom
+
+def dominance_frontiers(cfg, idom):
+    frontiers = {block: set() for block in idom}
+    for block in idom:
+        preds = [p for p in block.preds if p in idom]
+        if len(preds) < 2:
+            continue
+        for pred in preds:
+            runner = pred
+            while runner is not idom[block]:
+                frontiers[runner].add(block)
+                runner = idom[runner]
+    return frontiers
+
+
+class SSA:
+    """Static single assignment view of a CFG.
+
+    The IR isn't rewritten; instead every definition and use of a local
+    variable gets a version number: `defs` and `uses` map id(IR node) to
+    (name, version), and `phis[block][name]` gives the version flowing
+    in from each predecessor. Version 0 is the value on entry (a
+    parameter, or uninitialized). Names declared more than once in the
+    body (shadowing) are left out, since a name no longer identifies a
+    single variable.
+    """
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.defs = {}
+        self.uses = {}
+        self.phis = {}         # block -> {name: {pred: version}}
+        self.phi_versions = {} # block -> {name: version defined by the phi}
+        self.counter = {}
+        self.stacks = {}
+
+        declared = {}
+        for block in cfg.blocks:
+            for stmt in block.stmts:
+                if stmt.kind == IRKind.VAR_DECL:
+                    declared[stmt.name] = declared.get(stmt.name, 0) + 1
+        self.names = {name for name, count in declared.items() if count == 1} | set(cfg.params)
+
+        self.idom = dominators(cfg)
+        self.place_phis()
+        children = {block: [] for block in self.idom}
+        for block, parent in self.idom.items():
+            if block is not parent:
+                children[parent].append(block)
+        self.children = children
+        for name in self.names:
+            self.counter[name] = 0
+            self.stacks[name] = [0]
+        self.rename(cfg.entry)
+
+    def place_phis(self):
+        frontiers = dominance_frontiers(self.cfg, self.idom)
+        def_blocks = {name: set() for name in self.names}
+        for block in self.idom:
+            _, defs = block_names(block)
+            for name in defs & self.names:
+                def_blocks[name].add(block)
+
+        for name, blocks in def_blocks.items():
+            work = list(blocks)
+            while work:
+                block = work.pop()
+                for frontier in frontiers[block]:
+                    phis = self.phis.setdefault(frontier, {})
+                    if name not in phis:
+                        phis[name] = {}
+                        if frontier not in blocks:
+                            work.append(frontier)
+
+    def new_version(self, name):
+        self.counter[name] += 1
+        self.stacks[name].append(self.counter[name])
+        return self.counter[name]
+
+    def rename(self, entry):
+        # Iterative walk of the dominator tree; each frame remembers how
+        # many versions it pushed so they can be popped on the way out
+        stack = [(entry, None)]
+        while stack:
+            block, pushed = stack.pop()
+            if pushed is not None:
+                for name in pushed:
+                    self.stacks[name].pop()
+                continue
+
+            pushed = []
+            for name in self.phis.get(block, {}):
+                self.phi_versions.setdefault(block, {})[name] = self.new_version(name)
+                pushed.append(name)
+            for stmt in block.stmts:
+                self.visit(stmt, pushed)
+            if block.cond is not None:
+                self.visit(block.cond, pushed)
+
+            for succ in block.succs:
+                for name, args in self.phis.get(succ, {}).items():
+                    args[block] = self.stacks[name][-1]
+
+            stack.append((block, pushed))
+            for child in reversed(self.children.get(block, [])):
+                stack.append((child, None))
+
+    def visit(self, ir, pushed):
+        # Uses are numbered before the definition they feed: x = x + 1
+        match ir.kind:
+            case IRKind.IDENT:
+                if ir.value in self.names:
+                    self.uses[id(ir)] = (ir.value, self.stacks[ir.value][-1])
+                return
+            case IRKind.VAR_DECL:
+                self.visit(ir.value, pushed)
+                if ir.name in self.names:
+                    self.defs[id(ir)] = (ir.name, self.new_version(ir.name))
+                    pushed.append(ir.name)
+                return
+            case IRKind.ASSIGNMENT:
+                self.visit(ir.value, pushed)
+                target = ir.assignee
+                if isinstance(target, IRIdent) and target.value in self.names:
+                    if ir.operator != "=":
+                        self.visit(target, pushed)
+                    self.defs[id(ir)] = (target.value, self.new_version(target.value))
+                    pushed.append(target.value)
+                else:
+                    self.visit(target, pushed)
+                return
+            case IRKind.UNARY if ir.operator in ("++", "--"):
+                self.visit(ir.operand, pushed)
+                if isinstance(ir.operand, IRIdent) and ir.operand.value in self.names:
+                    self.defs[id(ir)] = (ir.operand.value, self.new_version(ir.operand.value))
+                    pushed.append(ir.operand.value)
+                return
+
+        for field in ir.fields():
+            value = getattr(ir, field, None)
+            if isinstance(value, IRNode):
+                self.visit(value, pushed)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, IRNode):
+                        self.visit(item, pushed)
+# endregion
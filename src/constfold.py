@@ -0,0 +1,222 @@
+# constfold.py
+from src.ir_nodes import *
+
+# C integer types GBScript values can end up in: (bits, signed).
+# SDCC's int is 16 bits, and every operand is promoted to it before arithmetic.
+INT_TYPES = {
+    "int": (16, True),
+    "char": (8, True),
+    "int8_t": (8, True),
+    "uint8_t": (8, False),
+    "int16_t": (16, True),
+    "uint16_t": (16, False),
+}
+
+INT_MIN = -0x8000
+INT_MAX = 0x7FFF
+
+def wrap(value, bits=16, signed=True):
+    """Truncate `value` to a `bits` wide two's complement integer."""
+    value &= (1 << bits) - 1
+    if signed and value >= 1 << (bits - 1):
+        value -= 1 << bits
+    return value
+
+def is_int_const(ir):
+    return isinstance(ir, IRConst) and type(ir.value) is int
+
+def c_div(a, b):
+    # C truncates towards zero, Python floors
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def fold_binary(op, a, b):
+    """Evaluate `a op b` as 16-bit C int arithmetic; None if it can't be folded."""
+    # Literals outside int range are `long` in C, leave those to the C compiler
+    if not (INT_MIN <= a <= INT_MAX and INT_MIN <= b <= INT_MAX):
+        return None
+
+    match op:
+        case "+": return wrap(a + b)
+        case "-": return wrap(a - b)
+        case "*": return wrap(a * b)
+        case "/":
+            return wrap(c_div(a, b)) if b != 0 else None
+        case "%":
+            return wrap(a - b * c_div(a, b)) if b != 0 else None
+        case "<<":
+            return wrap(a << b) if 0 <= b < 16 else None
+        case ">>":
+            return a >> b if 0 <= b < 16 else None
+        case "&": return wrap(a & b)
+        case "|": return wrap(a | b)
+        case "^": return wrap(a ^ b)
+        case "==": return int(a == b)
+        case "!=": return int(a != b)
+        case "<": return int(a < b)
+        case "<=": return int(a <= b)
+        case ">": return int(a > b)
+        case ">=": return int(a >= b)
+        case "&&" | "and": return int(bool(a) and bool(b))
+        case "||" | "or": return int(bool(a) or bool(b))
+    return None
+
+def fold_unary(op, a):
+    if not INT_MIN <= a <= INT_MAX:
+        return None
+    match op:
+        case "-": return wrap(-a)
+        case "+": return a
+        case "!": return int(not a)
+        case "~": return wrap(~a)
+    return None
+
+
+class ConstFolder:
+    """Folds constant IRBinary/IRUnary expressions and propagates `const` values.
+
+    A `const` IRVarDecl whose value folds to an integer is substituted into
+    every later read of that name in its scope, unless the value is outside
+    int (a u16 above 32767). Inner declarations, function parameters and
+    groups of the same name shadow it.
+    """
+    def __init__(self):
+        self.scopes = [{}] # name -> int value, or None when shadowed by a non-constant
+        self.folded = 0
+        self.propagated = 0
+
+    def run(self, program):
+        self.stmts(program.body)
+        return program
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def stmts(self, body, new_scope=True):
+        if new_scope:
+            self.scopes.append({})
+        for stmt in body:
+            self.stmt(stmt)
+        if new_scope:
+            self.scopes.pop()
+
+    def stmt(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL:
+                ir.value = self.expr(ir.value)
+                value = None
+                if ir.is_const and is_int_const(ir.value):
+                    bits, signed = INT_TYPES.get(ir.explicit_type, (16, True))
+                    value = wrap(ir.value.value, bits, signed)
+                    ir.value.value = value
+                    if not INT_MIN <= value <= INT_MAX:
+                        # As a bare literal C would make it a long; reading the const keeps its type
+                        value = None
+                self.scopes[-1][ir.name] = value
+
+            case IRKind.GRP_DECL:
+                for item in ir.items:
+                    item.value = self.expr(item.value)
+                self.scopes[-1][ir.name] = None
+
+            case IRKind.FUNC_DECL:
+                self.scopes.append({param.name: None for param in ir.params})
+                self.stmts(ir.body, new_scope=False)
+                self.scopes.pop()
+
+            case IRKind.STATE:
+                self.stmts(ir.body)
+
+            case IRKind.IF:
+                ir.conditions = [self.expr(cond) for cond in ir.conditions]
+                self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.stmt(elif_ir)
+                self.stmts(ir.else_branch)
+
+            case IRKind.WHILE:
+                ir.condition = self.expr(ir.condition)
+                self.stmts(ir.body)
+
+            case IRKind.FOR:
+                self.scopes.append({})
+                self.stmt(ir.init)
+                ir.condition = self.expr(ir.condition)
+                ir.increment = self.expr(ir.increment)
+                self.stmts(ir.body)
+                self.scopes.pop()
+
+            case IRKind.RETURN:
+                ir.value = self.expr(ir.value)
+
+            case IRKind.OBJ_DECL | IRKind.MODULE | IRKind.CBLOCK | IRKind.NULL:
+                pass
+
+            case _:
+                self.expr(ir) # expression statement; only its subexpressions can change
+
+    def lvalue(self, ir):
+        # An assignment target keeps its name; only computed indexes fold
+        if isinstance(ir, IRIdent):
+            return ir
+        if isinstance(ir, IRMember):
+            ir.object = self.lvalue(ir.object)
+            if ir.computed:
+                ir.property = self.expr(ir.property)
+            return ir
+        return self.expr(ir)
+
+    def expr(self, ir):
+        match ir.kind:
+            case IRKind.IDENT:
+                value = self.lookup(ir.value)
+                if value is not None:
+                    self.propagated += 1
+                    return IRConst(value)
+                return ir
+
+            case IRKind.BINARY:
+                ir.left = self.expr(ir.left)
+                ir.right = self.expr(ir.right)
+                if is_int_const(ir.left) and is_int_const(ir.right):
+                    value = fold_binary(ir.operator, ir.left.value, ir.right.value)
+                    if value is not None:
+                        self.folded += 1
+                        return IRConst(value)
+                return ir
+
+            case IRKind.UNARY:
+                if ir.operator in ("++", "--"):
+                    ir.operand = self.lvalue(ir.operand)
+                    return ir
+                ir.operand = self.expr(ir.operand)
+                if is_int_const(ir.operand):
+                    value = fold_unary(ir.operator, ir.operand.value)
+                    if value is not None:
+                        self.folded += 1
+                        return IRConst(value)
+                return ir
+
+            case IRKind.ASSIGNMENT:
+                ir.assignee = self.lvalue(ir.assignee)
+                ir.value = self.expr(ir.value)
+                return ir
+
+            case IRKind.CALL:
+                ir.args = [self.expr(arg) for arg in ir.args]
+                return ir
+
+            case IRKind.MEMBER:
+                ir.object = self.lvalue(ir.object)
+                if ir.computed:
+                    ir.property = self.expr(ir.property)
+                return ir
+
+        return ir
+
+
+def fold_constants(program):
+    return ConstFolder().run(program)
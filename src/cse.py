@@ -0,0 +1,337 @@
+# cse.py
+from src.ir_nodes import *
+from src.constfold import is_int_const
+from src.deadcode import referenced_names
+from src.cfg import build_cfg, BasicBlock, SeqRegion, IfRegion
+from src.loops import ValueTypes, HOISTABLE_TYPES
+
+# Operators whose result is reused; `/` and `%` are left alone so a
+# division by zero is never moved ahead of the check guarding it
+CSE_OPERATORS = ("+", "-", "*", "<<", ">>", "&", "|", "^",
+                 "==", "!=", "<", "<=", ">", ">=", "&&", "||", "and", "or")
+BOOLEAN_OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "&&", "||", "and", "or")
+SHORT_CIRCUIT = ("&&", "||", "and", "or")
+
+
+def access_path(ir):
+    """("a", "f", "[]") for a.f[i]; None if `ir` isn't a variable, field or element."""
+    if ir.kind == IRKind.IDENT:
+        return (ir.value,)
+    if ir.kind == IRKind.MEMBER:
+        base = access_path(ir.object)
+        if base is None:
+            return None
+        if ir.computed:
+            return base + ("[]",)
+        return base + (ir.property.value,) if isinstance(ir.property, IRIdent) else None
+    return None
+
+def overlaps(a, b):
+    # a.f and a.f.g overlap, a.f and a.g don't; any two elements of a group may be the same
+    n = min(len(a), len(b))
+    return a[:n] == b[:n]
+
+
+class Value:
+    """One computation of an expression, valid until something it reads is written."""
+    __slots__ = ("reads", "type_name", "count", "temp")
+
+    def __init__(self, reads, type_name):
+        self.reads = reads
+        self.type_name = type_name
+        self.count = 1
+        self.temp = None
+
+
+class CSE:
+    """Local common subexpression elimination over basic blocks.
+
+    Within a block, a pure expression (a member or element read, or
+    arithmetic) that is computed again before anything it reads changes
+    is computed once into a temporary declared just before the first
+    statement that needs it. Writes only invalidate what they can alias:
+    assigning a.f kills a.f and a.f.g but not a.g, and assigning any
+    element of a group kills every element read. A call kills everything
+    except reads of local scalars and objects. Temporaries get the
+    declared type of what they hold, or uint8_t for a comparison or a
+    byte mask, and range narrowing can shrink them further.
+
+    The right operand of `&&` and `||` may not run at all, so nothing
+    found there starts a temporary; it can only reuse one computed
+    unconditionally before it.
+    """
+    def __init__(self, program):
+        self.values = ValueTypes(program)
+        self.taken = set()
+        referenced_names(program, self.taken)
+        self.next_temp = 0
+        self.eliminated = 0
+
+    def run(self, program):
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                cfg = build_cfg(stmt)
+                self.values.enter(stmt, cfg)
+                changed = False
+                for block in self.blocks(cfg.region):
+                    changed |= self.block(block)
+                if changed:
+                    stmt.body = cfg.to_ir()
+        return program
+
+    def blocks(self, region):
+        """Blocks that can take new statements: those in a sequence, and loop preheaders."""
+        if isinstance(region, SeqRegion):
+            for item in region.items:
+                if isinstance(item, BasicBlock):
+                    yield item
+                else:
+                    yield from self.blocks(item)
+        elif isinstance(region, IfRegion):
+            for _, body in region.branches:
+                yield from self.blocks(body)
+            if region.else_region:
+                yield from self.blocks(region.else_region)
+        else:
+            yield region.preheader
+            yield from self.blocks(region.body)
+
+    def temp_name(self):
+        while True:
+            name = f"_cse{self.next_temp}"
+            self.next_temp += 1
+            if name not in self.taken:
+                return name
+
+    def temp_type(self, ir):
+        if ir.kind == IRKind.BINARY:
+            if ir.operator in BOOLEAN_OPERATORS:
+                return "uint8_t"
+            if ir.operator in ("&", ">>") and self.byte(ir.left) or ir.operator == "&" and self.byte(ir.right):
+                return "uint8_t"
+        return self.values.type_of(ir)
+
+    def byte(self, ir):
+        if is_int_const(ir):
+            return 0 <= ir.value <= 0xFF
+        return self.values.type_of(ir) == "uint8_t"
+
+    # region Scan
+    def block(self, block):
+        self.active = {}      # repr -> Value currently holding it
+        self.occurrences = {} # id(IR node) -> Value it computes
+        self.conditional = 0  # > 0 while scanning an operand that may not be evaluated
+        for stmt in block.stmts:
+            self.scan_stmt(stmt)
+        if block.cond is not None:
+            self.scan(block.cond)
+
+        if not any(value.count > 1 for value in self.occurrences.values()):
+            return False
+        stmts = []
+        for stmt in block.stmts:
+            self.pending = []
+            self.rewrite_stmt(stmt)
+            stmts.extend(self.pending)
+            stmts.append(stmt)
+        if block.cond is not None:
+            self.pending = []
+            block.cond = self.rewrite(block.cond)
+            stmts.extend(self.pending)
+        # Temporaries only go in ahead of a statement, so a for loop's init stays last in its preheader
+        block.stmts = stmts
+        return True
+
+    def scan_stmt(self, ir):
+        # The statement's reads all happen before its writes land
+        self.reads_of(ir)
+        self.writes_of(ir)
+
+    def reads_of(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.RETURN:
+                self.scan(ir.value)
+            case IRKind.GRP_DECL:
+                for item in ir.items:
+                    self.scan(item.value)
+            case IRKind.OBJ_DECL | IRKind.MODULE | IRKind.CBLOCK | IRKind.NULL:
+                pass
+            case _:
+                self.scan(ir)
+
+    def scan(self, ir):
+        match ir.kind:
+            case IRKind.ASSIGNMENT:
+                self.scan_target(ir.assignee)
+                self.scan(ir.value)
+                return
+            case IRKind.UNARY if ir.operator in ("++", "--"):
+                self.scan_target(ir.operand)
+                return
+            case IRKind.CALL:
+                for arg in ir.args:
+                    self.scan(arg)
+                return
+
+        reads = self.candidate(ir)
+        if reads is not None:
+            key = repr(ir)
+            value = self.active.get(key)
+            if value is not None:
+                # A repeat is replaced whole, so what's inside it isn't counted again
+                value.count += 1
+                self.occurrences[id(ir)] = value
+                return
+            if not self.conditional:
+                value = self.active[key] = Value(reads, self.temp_type(ir))
+                self.occurrences[id(ir)] = value
+
+        if ir.kind == IRKind.BINARY and ir.operator in SHORT_CIRCUIT:
+            self.scan(ir.left)
+            self.conditional += 1
+            self.scan(ir.right)
+            self.conditional -= 1
+            return
+        for field in ir.fields():
+            if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+                continue
+            child = getattr(ir, field, None)
+            if isinstance(child, IRNode):
+                self.scan(child)
+
+    def scan_target(self, ir):
+        # An assignment target isn't read, but its element indexes are
+        if ir.kind == IRKind.MEMBER:
+            self.scan_target(ir.object)
+            if ir.computed:
+                self.scan(ir.property)
+
+    def candidate(self, ir):
+        """The access paths `ir` reads if it can be reused, else None."""
+        if ir.kind == IRKind.MEMBER:
+            if access_path(ir) is None:
+                return None
+        elif ir.kind == IRKind.BINARY:
+            if ir.operator not in CSE_OPERATORS:
+                return None
+        elif ir.kind != IRKind.UNARY or ir.operator not in ("-", "~", "!"):
+            return None
+        if self.temp_type(ir) not in HOISTABLE_TYPES:
+            return None
+        reads = set()
+        if not self.pure_reads(ir, reads) or not reads:
+            return None
+        return reads
+
+    def pure_reads(self, ir, reads):
+        match ir.kind:
+            case IRKind.CONST:
+                return True
+            case IRKind.IDENT:
+                reads.add((ir.value,))
+                return True
+            case IRKind.MEMBER:
+                path = access_path(ir)
+                if path is None:
+                    return False
+                reads.add(path)
+                node = ir
+                while node.kind == IRKind.MEMBER:
+                    if node.computed and not self.pure_reads(node.property, reads):
+                        return False
+                    node = node.object
+                return True
+            case IRKind.BINARY:
+                return ir.operator in CSE_OPERATORS \
+                    and self.pure_reads(ir.left, reads) and self.pure_reads(ir.right, reads)
+            case IRKind.UNARY:
+                return ir.operator in ("-", "+", "~", "!") and self.pure_reads(ir.operand, reads)
+        return False
+
+    def writes_of(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.GRP_DECL:
+                self.kill((ir.name,))
+            case IRKind.ASSIGNMENT:
+                self.kill(access_path(ir.assignee))
+            case IRKind.UNARY if ir.operator in ("++", "--"):
+                self.kill(access_path(ir.operand))
+            case IRKind.CALL:
+                self.kill_call()
+        if ir.kind in (IRKind.OBJ_DECL, IRKind.CBLOCK, IRKind.MODULE):
+            return
+        for field in ir.fields():
+            child = getattr(ir, field, None)
+            if isinstance(child, IRNode):
+                self.writes_of(child)
+            elif isinstance(child, list):
+                for item in child:
+                    if isinstance(item, IRNode):
+                        self.writes_of(item)
+
+    def kill(self, path):
+        if path is None:
+            self.active.clear()
+            return
+        self.active = {key: value for key, value in self.active.items()
+                       if not any(overlaps(path, read) for read in value.reads)}
+
+    def kill_call(self):
+        self.active = {key: value for key, value in self.active.items()
+                       if all(self.values.local_scalar(read[0]) for read in value.reads)}
+    # endregion
+
+    # region Rewrite
+    def rewrite_stmt(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.RETURN:
+                ir.value = self.rewrite(ir.value)
+            case IRKind.GRP_DECL:
+                for item in ir.items:
+                    item.value = self.rewrite(item.value)
+            case IRKind.OBJ_DECL | IRKind.MODULE | IRKind.CBLOCK | IRKind.NULL:
+                pass
+            case _:
+                self.rewrite(ir)
+
+    def rewrite(self, ir):
+        value = self.occurrences.get(id(ir))
+        if value is not None and value.count > 1:
+            if value.temp is None:
+                # Inner repeats get their temporaries first, and this one is built from them
+                self.rewrite_children(ir)
+                value.temp = self.temp_name()
+                self.pending.append(IRVarDecl(value.temp, value.type_name, False, ir, inferred=True))
+                self.eliminated += value.count - 1
+            return IRIdent(value.temp)
+        self.rewrite_children(ir)
+        return ir
+
+    def rewrite_children(self, ir):
+        match ir.kind:
+            case IRKind.ASSIGNMENT:
+                self.rewrite_target(ir.assignee)
+                ir.value = self.rewrite(ir.value)
+                return
+            case IRKind.UNARY if ir.operator in ("++", "--"):
+                self.rewrite_target(ir.operand)
+                return
+        for field in ir.fields():
+            if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+                continue
+            child = getattr(ir, field, None)
+            if isinstance(child, IRNode):
+                setattr(ir, field, self.rewrite(child))
+            elif isinstance(child, list):
+                setattr(ir, field, [self.rewrite(item) if isinstance(item, IRNode) else item for item in child])
+
+    def rewrite_target(self, ir):
+        if ir.kind == IRKind.MEMBER:
+            self.rewrite_target(ir.object)
+            if ir.computed:
+                ir.property = self.rewrite(ir.property)
+    # endregion
+
+
+def eliminate_common_subexpressions(program):
+    return CSE(program).run(program)
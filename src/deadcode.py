@@ -0,0 +1,211 @@
+# deadcode.py
+import re
+from src.ir_nodes import *
+
+# States generate_c turns into main(); everything else must be reachable from them
+ROOT_STATES = ("onload", "gameloop")
+
+# Fields naming a type, which keeps an `obj` declaration alive
+TYPE_FIELDS = ("explicit_type", "declared_type", "return_type")
+
+C_IDENT_RE = re.compile(r"[A-Za-z_]\w*")
+
+def const_truth(ir):
+    """True/False for a constant condition, None when it is only known at run time."""
+    if isinstance(ir, IRConst) and type(ir.value) is int:
+        return ir.value != 0
+    return None
+
+def declares(stmts):
+    return any(stmt.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL) for stmt in stmts)
+
+def if_chain(ir):
+    """Flatten an IRIf into ([(condition, body), ...], else_body).
+
+    The parser nests each elif as an IRIf, and the trailing else ends up
+    on the innermost one.
+    """
+    branches = [(ir.conditions[0], ir.then_branch)]
+    else_body = ir.else_branch
+    for elif_ir in ir.elif_branches:
+        more, inner_else = if_chain(elif_ir)
+        branches.extend(more)
+        else_body = inner_else or else_body
+    return branches, else_body
+
+def referenced_names(ir, names):
+    """Add every identifier and type name used under `ir` to `names`."""
+    stack = [ir]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, IRNode):
+            continue
+        if node.kind == IRKind.IDENT:
+            names.add(node.value)
+            continue
+        if node.kind == IRKind.CBLOCK and node.name is None:
+            # Hand-written C: any word in it may name one of our globals
+            names.update(C_IDENT_RE.findall(node.value))
+            continue
+        for field in node.fields():
+            value = getattr(node, field, None)
+            if field in TYPE_FIELDS:
+                names.add(value)
+            elif isinstance(value, (IRNode, list)):
+                stack.append(value)
+    return names
+
+def has_side_effects(ir, calls=True):
+    if ir.kind == IRKind.ASSIGNMENT or (calls and ir.kind == IRKind.CALL):
+        return True
+    if ir.kind == IRKind.UNARY and ir.operator in ("++", "--"):
+        return True
+    for field in ir.fields():
+        value = getattr(ir, field, None)
+        if isinstance(value, IRNode) and has_side_effects(value, calls):
+            return True
+        if isinstance(value, list) and any(isinstance(item, IRNode) and has_side_effects(item, calls) for item in value):
+            return True
+    return False
+
+
+class DeadCodeEliminator:
+    """Removes IR that can never run or is never used.
+
+    Inside states and functions it drops statements after a `return`,
+    `if`/`while` branches whose condition folded to a constant and
+    `for` loops that never iterate. At the top level only what is
+    reachable from the onload/gameloop states is kept: unused functions,
+    globals, groups, objects, sprite tile arrays and other states are
+    removed. Each removal is described in `dropped`.
+    """
+    def __init__(self):
+        self.dropped = []
+
+    def run(self, program):
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                stmt.body = self.block(stmt.body, stmt.name)
+        program.body = self.prune_globals(program.body)
+        return program
+
+    # region Statements
+    def block(self, stmts, where):
+        out = []
+        for i, stmt in enumerate(stmts):
+            out.extend(self.stmt(stmt, where))
+            if out and out[-1].kind == IRKind.RETURN:
+                rest = len(stmts) - i - 1
+                if rest:
+                    self.dropped.append(f"{rest} unreachable statement(s) after return in '{where}'")
+                break
+        return out
+
+    def stmt(self, ir, where):
+        """Return the statements `ir` is replaced with."""
+        match ir.kind:
+            case IRKind.IF:
+                return self.if_stmt(ir, where)
+
+            case IRKind.WHILE:
+                if const_truth(ir.condition) is False:
+                    self.dropped.append(f"while loop with false condition in '{where}'")
+                    return []
+                ir.body = self.block(ir.body, where)
+
+            case IRKind.FOR:
+                if const_truth(ir.condition) is False:
+                    self.dropped.append(f"for loop with false condition in '{where}'")
+                    # The initializer still runs; a declaration only needs its value's side effects
+                    if ir.init.kind != IRKind.VAR_DECL:
+                        return [ir.init]
+                    return [ir.init.value] if has_side_effects(ir.init.value) else []
+                ir.body = self.block(ir.body, where)
+
+        return [ir]
+
+    def if_stmt(self, ir, where):
+        kept = []
+        branches, else_branch = if_chain(ir)
+        else_body = None
+        for cond, body in branches:
+            truth = const_truth(cond)
+            if truth is False:
+                self.dropped.append(f"if branch with false condition in '{where}'")
+                continue
+            body = self.block(body, where)
+            if truth is True:
+                # Always taken: it becomes the else, and nothing after it can run
+                else_body = body
+                if else_branch:
+                    self.dropped.append(f"else branch after a true condition in '{where}'")
+                break
+            kept.append((cond, body))
+
+        if else_body is None:
+            else_body = self.block(else_branch, where)
+
+        if not kept:
+            if declares(else_body):
+                # Keep the braces so its declarations stay scoped
+                return [IRIf([IRConst(1)], else_body, [], [])]
+            return else_body
+
+        (cond, body), rest = kept[0], kept[1:]
+        return [IRIf([cond], body, [IRIf([c], b, [], []) for c, b in rest], else_body)]
+    # endregion
+
+    # region Globals
+    def prune_globals(self, body):
+        decls = {} # name -> top-level declarations of that name
+        roots = []
+        for stmt in body:
+            match stmt.kind:
+                case IRKind.STATE:
+                    if stmt.name.lower() in ROOT_STATES:
+                        roots.append(stmt)
+                case IRKind.FUNC_DECL | IRKind.VAR_DECL | IRKind.GRP_DECL | IRKind.OBJ_DECL:
+                    decls.setdefault(stmt.name, []).append(stmt)
+                case IRKind.CBLOCK if stmt.name is not None:
+                    decls.setdefault(stmt.name, []).append(stmt)
+                case IRKind.MODULE:
+                    pass
+                case _:
+                    roots.append(stmt) # top-level code we don't model; keep what it uses
+
+        live = set()
+        pending = roots
+        while pending:
+            names = set()
+            for node in pending:
+                referenced_names(node, names)
+            pending = [decl for name in names - live for decl in decls.get(name, ())]
+            live.update(names)
+
+        out = []
+        for stmt in body:
+            if stmt.kind == IRKind.STATE and stmt not in roots:
+                self.dropped.append(f"state '{stmt.name}' (never entered)")
+            elif stmt.kind in DECL_LABELS and stmt.name in decls and stmt.name not in live:
+                self.dropped.append(f"{DECL_LABELS[stmt.kind]} '{stmt.name}' (unused)")
+            else:
+                out.append(stmt)
+        return out
+    # endregion
+
+
+DECL_LABELS = {
+    IRKind.FUNC_DECL: "function",
+    IRKind.VAR_DECL: "global",
+    IRKind.GRP_DECL: "group",
+    IRKind.OBJ_DECL: "object",
+    IRKind.CBLOCK: "sprite",
+}
+
+def eliminate_dead_code(program):
+    """Run DeadCodeEliminator over `program`; returns (program, dropped)."""
+    pass_ = DeadCodeEliminator()
+    return pass_.run(program), pass_.dropped
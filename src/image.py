@@ -0,0 +1,216 @@
+# image.py
+import zlib
+import struct
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG color type -> samples per pixel
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Bit depth -> byte -> its packed samples, leftmost first
+UNPACK = {
+    depth: tuple(bytes((b >> shift) & ((1 << depth) - 1) for shift in range(8 - depth, -1, -depth))
+                 for b in range(256))
+    for depth in (1, 2, 4)
+}
+
+
+class Image:
+    """A decoded image reduced to what sprites need: one luminance byte
+    (0 black - 255 white) per pixel, row after row, and optionally one
+    alpha byte per pixel."""
+    def __init__(self, width, height, luma, alpha=None):
+        self.width = width
+        self.height = height
+        self.luma = luma
+        self.alpha = alpha
+
+
+def luminance(r, g, b):
+    return (r * 299 + g * 587 + b * 114) // 1000
+
+def scale_table(maxval):
+    """Sample value -> 0-255, for samples up to `maxval`."""
+    return bytes(v * 255 // maxval for v in range(maxval + 1))
+
+def load_image(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return decode_image(data, path)
+
+def decode_image(data, path="<image>"):
+    if data.startswith(PNG_SIGNATURE):
+        return read_png(data, path)
+    if data[:2] in (b"P2", b"P5"):
+        return read_pgm(data, path)
+    raise ValueError(f"{path}: not a PNG or PGM image")
+
+
+# region PNG
+def read_png(data, path="<image>"):
+    header = None
+    palette = None
+    transparent = None
+    idat = []
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack_from(">I4s", data, pos)
+        body = data[pos + 8:pos + 8 + length]
+        crc = data[pos + 8 + length:pos + 12 + length]
+        if len(body) != length or len(crc) != 4:
+            raise ValueError(f"{path}: PNG is truncated")
+        if zlib.crc32(ctype + body) != struct.unpack(">I", crc)[0]:
+            raise ValueError(f"{path}: PNG chunk {ctype.decode('latin-1')} is corrupt")
+        pos += 12 + length
+
+        if ctype == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif ctype == b"PLTE":
+            palette = body
+        elif ctype == b"tRNS":
+            transparent = body
+        elif ctype == b"IDAT":
+            idat.append(body)
+        elif ctype == b"IEND":
+            break
+    if header is None or not idat:
+        raise ValueError(f"{path}: PNG has no image data")
+
+    width, height, depth, color, _, _, interlace = header
+    if color not in PNG_CHANNELS or depth not in (1, 2, 4, 8, 16):
+        raise ValueError(f"{path}: unsupported PNG color type {color} at bit depth {depth}")
+    if interlace:
+        raise ValueError(f"{path}: interlaced PNGs are not supported; save it without interlacing")
+    if color == 3 and palette is None:
+        raise ValueError(f"{path}: palette PNG has no PLTE chunk")
+
+    channels = PNG_CHANNELS[color]
+    bits = depth * channels
+    stride = (width * bits + 7) // 8
+    try:
+        raw = zlib.decompress(b"".join(idat))
+    except zlib.error as e:
+        raise ValueError(f"{path}: PNG image data is corrupt ({e})")
+    if len(raw) < (stride + 1) * height:
+        raise ValueError(f"{path}: PNG image data is truncated")
+    rows = unfilter(raw, stride, height, max(1, bits // 8))
+
+    # Samples reduced to one byte each, full range for gray
+    if depth == 16:
+        samples = rows[0::2]
+    elif depth == 8:
+        samples = rows
+    else:
+        per_row = width * channels
+        table = UNPACK[depth]
+        samples = b"".join(b"".join(map(table.__getitem__, rows[y * stride:(y + 1) * stride]))[:per_row]
+                           for y in range(height))
+    samples = bytes(samples)
+
+    alpha = None
+    if color == 3:
+        lut = bytes(luminance(*palette[i:i + 3]) for i in range(0, len(palette) - 2, 3))
+        lut = lut.ljust(256, b"\x00")
+        luma = samples.translate(lut)
+        if transparent is not None:
+            alpha = samples.translate(transparent[:256].ljust(256, b"\xff"))
+    elif color in (0, 4):
+        luma = samples[0::channels]
+        if depth < 8:
+            luma = luma.translate(scale_table((1 << depth) - 1).ljust(256, b"\xff"))
+        if color == 4:
+            alpha = samples[1::2]
+        elif transparent is not None:
+            key = struct.unpack(">H", transparent[:2])[0] >> (8 if depth == 16 else 0)
+            alpha = bytes(0 if v == key else 255 for v in samples)
+    else:
+        r, g, b = samples[0::channels], samples[1::channels], samples[2::channels]
+        luma = bytes(map(luminance, r, g, b))
+        if color == 6:
+            alpha = samples[3::4]
+        elif transparent is not None:
+            key = tuple(v >> (8 if depth == 16 else 0) for v in struct.unpack(">HHH", transparent[:6]))
+            alpha = bytes(0 if pixel == key else 255 for pixel in zip(r, g, b))
+    return Image(width, height, luma, alpha)
+
+def paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+def unfilter(raw, stride, height, bpp):
+    """Undo PNG's per-row filters; returns the rows back to back without their filter bytes."""
+    out = bytearray(stride * height)
+    prev = bytes(stride)
+    pos = 0
+    for y in range(height):
+        ftype = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += stride + 1
+        if ftype == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif ftype == 2:
+            line = bytearray((a + b) & 0xFF for a, b in zip(line, prev))
+        elif ftype == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif ftype == 4:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                up_left = prev[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + paeth(left, prev[i], up_left)) & 0xFF
+        elif ftype != 0:
+            raise ValueError(f"unknown PNG filter type {ftype}")
+        out[y * stride:(y + 1) * stride] = line
+        prev = line
+    return out
+# endregion
+
+
+# region PGM
+def read_pgm(data, path="<image>"):
+    # Header: magic, width, height, maxval, separated by whitespace and # comments
+    fields = []
+    pos = 2
+    while len(fields) < 3:
+        while pos < len(data) and data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            while pos < len(data) and data[pos] not in b"\r\n":
+                pos += 1
+            continue
+        start = pos
+        while pos < len(data) and data[pos:pos + 1].isdigit():
+            pos += 1
+        if start == pos:
+            raise ValueError(f"{path}: PGM header is malformed")
+        fields.append(int(data[start:pos]))
+    width, height, maxval = fields
+    if not 0 < maxval < 65536:
+        raise ValueError(f"{path}: PGM maxval {maxval} is out of range")
+
+    count = width * height
+    if data[:2] == b"P5":
+        raster = data[pos + 1:] # exactly one whitespace byte ends the header
+        if maxval > 255:
+            raster = raster[0:count * 2:2]
+            maxval >>= 8
+        else:
+            raster = raster[:count]
+        if len(raster) < count:
+            raise ValueError(f"{path}: PGM image data is truncated")
+        values = raster
+    else:
+        values = [int(v) for v in data[pos:].split()[:count]]
+        if len(values) < count:
+            raise ValueError(f"{path}: PGM image data is truncated")
+        if maxval > 255:
+            values = [v >> 8 for v in values]
+            maxval >>= 8
+        values = bytes(values)
+    return Image(width, height, bytes(values).translate(scale_table(maxval).ljust(256, b"\xff")))
+# endregion
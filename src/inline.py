@@ -0,0 +1,385 @@
+# inline.py
+from copy import deepcopy
+from src.ir_nodes import *
+from src.constfold import INT_TYPES
+from src.deadcode import referenced_names, has_side_effects
+from src.strength import is_pure
+from src.cfg import build_cfg
+from src.loops import ir_size, ValueTypes
+
+# Calls on the SM83 push every argument and the return address, so a
+# function whose body is at most this many IR nodes is cheaper inlined
+INLINE_BUDGET = 20
+INLINE_BUDGET_SIZE = 6 # -Os: only bodies about as small as the call itself
+
+# Fixed-width types, where passing an argument or returning converts the value
+FIXED_WIDTH = tuple(t for t in INT_TYPES if t not in ("int", "char"))
+
+# Argument types an int parameter holds unchanged (the narrower ones are promoted to int anyway)
+INT_EXACT = ("int", "char", "int8_t", "uint8_t", "int16_t")
+
+
+def calls_in(ir, found):
+    """Add the name of every function called under `ir` to `found`."""
+    if ir.kind == IRKind.CALL and isinstance(ir.caller, IRIdent):
+        found.append(ir.caller.value)
+    for field in ir.fields():
+        value = getattr(ir, field, None)
+        if isinstance(value, IRNode):
+            calls_in(value, found)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, IRNode):
+                    calls_in(item, found)
+    return found
+
+def count_returns(stmts):
+    return sum(1 for stmt in stmts for _ in returns_in(stmt))
+
+def returns_in(ir):
+    if ir.kind == IRKind.RETURN:
+        yield ir
+    for field in ("then_branch", "elif_branches", "else_branch", "body"):
+        for item in getattr(ir, field, None) or ():
+            yield from returns_in(item)
+
+def local_names(stmts, names):
+    """Add every name declared anywhere in `stmts` to `names`."""
+    for stmt in stmts:
+        if stmt.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL):
+            names.add(stmt.name)
+        elif stmt.kind == IRKind.FOR:
+            local_names([stmt.init], names)
+        for field in ("then_branch", "elif_branches", "else_branch", "body"):
+            local_names(getattr(stmt, field, None) or [], names)
+    return names
+
+def rename(ir, names):
+    """Rename declarations of and references to `names` ({old: new}) under `ir`."""
+    if ir.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL) and ir.name in names:
+        ir.name = names[ir.name]
+    for field in ir.fields():
+        if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+            continue # a field name, not a variable
+        value = getattr(ir, field, None)
+        if isinstance(value, IRIdent):
+            if value.value in names:
+                value.value = names[value.value]
+        elif isinstance(value, IRNode):
+            rename(value, names)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, IRIdent):
+                    if item.value in names:
+                        item.value = names[item.value]
+                elif isinstance(item, IRNode):
+                    rename(item, names)
+
+
+class Inliner:
+    """Substitutes the bodies of small, non-recursive functions at their calls.
+
+    A function is inlined when it is marked `inline`, its body is within
+    the size budget, or it has only one call site. Its body may hold at
+    most one return, as its last statement (or none, for void functions).
+
+    A body that is just `return <expr>` is substituted into any
+    expression, with the arguments in place of the parameters, as long
+    as that can't change what is evaluated: each argument with side
+    effects must be used exactly once, and fixed-width parameters and
+    return types, or an argument whose type the parameter would convert
+    (a u16 passed as int), need a temporary. Other
+    bodies are spliced in before the statement the call is the whole
+    value of: `f(...);`, `x = f(...);`, `var x = f(...);` or
+    `return f(...);`. Parameters become temporaries initialised from the
+    arguments, and every local of the callee gets a fresh name.
+    """
+    def __init__(self, program, budget=INLINE_BUDGET):
+        self.budget = budget
+        self.funcs = {}
+        for stmt in program.body:
+            if stmt.kind == IRKind.FUNC_DECL:
+                self.funcs[stmt.name] = stmt
+        self.taken = set()
+        referenced_names(program, self.taken)
+        self.next_suffix = 0
+        self.inlined = 0
+        self.warnings = []
+        self.values = ValueTypes(program)
+
+        # Call sites per function, over the whole program
+        self.sites = {}
+        for name in calls_in(program, []):
+            self.sites[name] = self.sites.get(name, 0) + 1
+        self.recursive = {name for name in self.funcs if self.reaches(name, name)}
+
+        # Globals each function reads; inlining it where a local hides one would change its meaning
+        self.free = {}
+        for name, func in self.funcs.items():
+            own = local_names(func.body, {param.name for param in func.params})
+            self.free[name] = referenced_names(func, set()) - own
+        self.scope = set()
+
+    def reaches(self, start, target):
+        seen = set()
+        stack = calls_in(self.funcs[start], [])
+        while stack:
+            name = stack.pop()
+            if name == target:
+                return True
+            if name in self.funcs and name not in seen:
+                seen.add(name)
+                stack.extend(calls_in(self.funcs[name], []))
+        return False
+
+    def run(self, program):
+        # Callees before callers, so a caller is measured with its calls already inlined
+        done = set()
+        def visit(name):
+            if name in done or name not in self.funcs:
+                return
+            done.add(name)
+            for callee in calls_in(self.funcs[name], []):
+                if callee not in self.recursive:
+                    visit(callee)
+            func = self.funcs[name]
+            self.scope = local_names(func.body, {param.name for param in func.params})
+            self.values.enter(func, build_cfg(func))
+            func.body = self.stmts(func.body)
+        for name in self.funcs:
+            visit(name)
+
+        for stmt in program.body:
+            if stmt.kind == IRKind.STATE:
+                self.scope = local_names(stmt.body, set())
+                self.values.enter(stmt, build_cfg(stmt))
+                stmt.body = self.stmts(stmt.body)
+
+        for name in sorted(self.recursive):
+            if self.funcs[name].inline:
+                self.warnings.append(f"'{name}' is recursive and was not inlined")
+        return program
+
+    def inlinable(self, name):
+        func = self.funcs.get(name)
+        if func is None or name in self.recursive:
+            return None
+        returns = count_returns(func.body)
+        if returns > 1 or (returns == 1 and func.body[-1].kind != IRKind.RETURN):
+            if func.inline:
+                self.warn(func, "has a return before its end")
+            return None
+        if returns == 0 and func.return_type != "void":
+            return None
+        hidden = self.free[name] & self.scope
+        if hidden:
+            if func.inline:
+                self.warn(func, f"reads '{min(hidden)}', which a local of the caller hides,")
+            return None
+        if func.inline or self.sites.get(name, 0) == 1 or ir_size(func.body) <= self.budget:
+            return func
+        return None
+
+    def warn(self, func, why):
+        msg = f"'{func.name}' {why} and was not inlined"
+        if msg not in self.warnings:
+            self.warnings.append(msg)
+
+    def fresh(self, name):
+        while True:
+            self.next_suffix += 1
+            new = f"_{name}{self.next_suffix}"
+            if new not in self.taken:
+                self.taken.add(new)
+                return new
+
+    # region Expression inlining
+    def expr_body(self, func, call):
+        """The call's value as one expression, or None if it can't be written as one."""
+        if len(func.body) != 1 or func.body[0].kind != IRKind.RETURN:
+            return None
+        if len(call.args) != len(func.params) or func.return_type in FIXED_WIDTH:
+            return None
+        value = func.body[0].value
+        if has_side_effects(value, calls=False):
+            return None # it could write a parameter, which is now the caller's variable
+        has_call = bool(calls_in(value, []))
+
+        reads = {}
+        self.count_reads(value, reads)
+
+        args = {}
+        for param, arg in zip(func.params, call.args):
+            uses = reads.get(param.name, 0)
+            pure = arg.kind == IRKind.CONST or (is_pure(arg) and not has_call)
+            if param.declared_type in FIXED_WIDTH and arg.kind != IRKind.CONST:
+                return None
+            if self.converts(param.declared_type, arg):
+                return None
+            if not pure and (uses != 1 or has_call):
+                return None
+            args[param.name] = arg
+        # Arguments used more than once are pure, so each use gets its own copy
+        copies = {name: [deepcopy(arg) for _ in range(max(reads.get(name, 0), 1))]
+                  for name, arg in args.items()}
+        return self.substitute(deepcopy(value), copies)
+
+    def converts(self, param_type, arg):
+        """True if passing `arg` to a `param_type` parameter could change its value or type."""
+        if arg.kind == IRKind.CONST:
+            if type(arg.value) is not int:
+                return False
+            bits, signed = INT_TYPES.get(param_type, (16, True))
+            low = -(1 << bits - 1) if signed else 0
+            return not low <= arg.value < low + (1 << bits)
+        if param_type in FIXED_WIDTH:
+            return False # only constants get here, checked above
+        arg_type = self.values.type_of(arg)
+        if param_type == "int":
+            return arg_type not in INT_EXACT
+        return arg_type != param_type
+
+    def count_reads(self, ir, reads):
+        if ir.kind == IRKind.IDENT:
+            reads[ir.value] = reads.get(ir.value, 0) + 1
+            return
+        for field in ir.fields():
+            if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+                continue
+            value = getattr(ir, field, None)
+            if isinstance(value, IRNode):
+                self.count_reads(value, reads)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, IRNode):
+                        self.count_reads(item, reads)
+
+    def substitute(self, ir, copies):
+        if ir.kind == IRKind.IDENT and ir.value in copies:
+            return copies[ir.value].pop()
+        for field in ir.fields():
+            if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+                continue
+            value = getattr(ir, field, None)
+            if isinstance(value, IRNode):
+                setattr(ir, field, self.substitute(value, copies))
+            elif isinstance(value, list):
+                setattr(ir, field, [self.substitute(item, copies) if isinstance(item, IRNode) else item
+                                    for item in value])
+        return ir
+    # endregion
+
+    # region Statement inlining
+    def splice(self, func, call):
+        """(statements to run first, expression for the call's value) or None."""
+        if len(call.args) != len(func.params):
+            return None
+        body = deepcopy(func.body)
+        names = {name: self.fresh(name) for name in local_names(body, set())}
+        for param in func.params:
+            names[param.name] = self.fresh(param.name)
+        for stmt in body:
+            rename(stmt, names)
+
+        stmts = [IRVarDecl(names[param.name], param.declared_type, False, arg)
+                 for param, arg in zip(func.params, call.args)]
+        value = None
+        if body and body[-1].kind == IRKind.RETURN:
+            value = body.pop().value
+        stmts.extend(body)
+        if value is not None and func.return_type in FIXED_WIDTH:
+            # Keep the conversion the return would have done
+            result = self.fresh(func.name)
+            stmts.append(IRVarDecl(result, func.return_type, False, value))
+            value = IRIdent(result)
+        return stmts, value
+
+    def stmts(self, body):
+        new = []
+        for stmt in body:
+            new.extend(self.stmt(stmt))
+        return new
+
+    def stmt(self, ir):
+        # A call that is the whole value of a statement can take any body
+        match ir.kind:
+            case IRKind.CALL:
+                spliced = self.call_stmt(ir)
+                if spliced is not None:
+                    before, value = spliced
+                    if value is None or not has_side_effects(value):
+                        return before
+                    return before + [value]
+            case IRKind.VAR_DECL | IRKind.ASSIGNMENT | IRKind.RETURN if ir.value.kind == IRKind.CALL:
+                spliced = self.call_stmt(ir.value)
+                if spliced is not None and spliced[1] is not None:
+                    before, ir.value = spliced
+                    return before + self.stmt(ir)
+
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.RETURN:
+                ir.value = self.expr(ir.value)
+            case IRKind.GRP_DECL:
+                for item in ir.items:
+                    item.value = self.expr(item.value)
+            case IRKind.IF:
+                ir.conditions = [self.expr(cond) for cond in ir.conditions]
+                ir.then_branch = self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.stmt(elif_ir)
+                ir.else_branch = self.stmts(ir.else_branch)
+            case IRKind.WHILE:
+                ir.condition = self.expr(ir.condition)
+                ir.body = self.stmts(ir.body)
+            case IRKind.FOR:
+                if ir.init.kind == IRKind.VAR_DECL:
+                    ir.init.value = self.expr(ir.init.value)
+                else:
+                    ir.init = self.expr(ir.init)
+                ir.condition = self.expr(ir.condition)
+                ir.increment = self.expr(ir.increment)
+                ir.body = self.stmts(ir.body)
+            case IRKind.OBJ_DECL | IRKind.MODULE | IRKind.CBLOCK | IRKind.NULL:
+                pass
+            case _:
+                return [self.expr(ir)]
+        return [ir]
+
+    def call_stmt(self, call):
+        if not isinstance(call.caller, IRIdent):
+            return None
+        func = self.inlinable(call.caller.value)
+        if func is None:
+            return None
+        call.args = [self.expr(arg) for arg in call.args]
+        value = self.expr_body(func, call)
+        spliced = ([], value) if value is not None else self.splice(func, call)
+        if spliced is not None:
+            self.inlined += 1
+        return spliced
+    # endregion
+
+    def expr(self, ir):
+        for field in ir.fields():
+            if ir.kind == IRKind.MEMBER and field == "property" and not ir.computed:
+                continue
+            value = getattr(ir, field, None)
+            if isinstance(value, IRNode):
+                setattr(ir, field, self.expr(value))
+            elif isinstance(value, list):
+                setattr(ir, field, [self.expr(item) if isinstance(item, IRNode) else item for item in value])
+
+        if ir.kind == IRKind.CALL and isinstance(ir.caller, IRIdent):
+            func = self.inlinable(ir.caller.value)
+            if func is not None:
+                value = self.expr_body(func, ir)
+                if value is not None:
+                    self.inlined += 1
+                    return value
+        return ir
+
+
+def inline_functions(program, budget=INLINE_BUDGET):
+    """Returns (program, warnings)."""
+    inliner = Inliner(program, budget)
+    return inliner.run(program), inliner.warnings
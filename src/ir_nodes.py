@@ -1,8 +1,49 @@
 # ir_nodes.py
 
+class IRKind:
+    # Integer tag per IR node class, used to index dispatch tables
+    PROGRAM = 0
+    CONST = 1
+    IDENT = 2
+    PROPERTY = 3
+    INDEX = 4
+    VAR_DECL = 5
+    OBJ_DECL = 6
+    GRP_DECL = 7
+    FUNC_DECL = 8
+    STATE = 9
+    IF = 10
+    WHILE = 11
+    FOR = 12
+    RETURN = 13
+    NULL = 14
+    BINARY = 15
+    UNARY = 16
+    ASSIGNMENT = 17
+    CALL = 18
+    MEMBER = 19
+    MODULE = 20
+    CBLOCK = 21
+
+    COUNT = 22
+
 class IRNode:
+    # Subclasses set `op` and `kind` as class attributes; instances only
+    # carry the fields listed in __slots__.
+    __slots__ = ()
+    op = None
+    kind = None
+
     def __init__(self):
-        self.op = None
+        pass
+
+    @classmethod
+    def fields(cls):
+        """Names of the instance fields, in declaration order."""
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(getattr(klass, "__slots__", ()))
+        return names
 
     def __repr__(self):
         return f"{self.__class__.__name__}()"
@@ -15,7 +56,7 @@ class IRNode:
         # Show only fields that aren't 'op' or private
         fields = [
             (name, getattr(self, name))
-            for name in vars(self)
+            for name in self.fields()
             if not name.startswith("_") and name != "op"
         ]
 
@@ -34,36 +75,48 @@ class IRNode:
         return result
 
 class IRProgram(IRNode):
+    __slots__ = ('body',)
+    op = "program"
+    kind = IRKind.PROGRAM
+
     def __init__(self, body):
         super().__init__()
-        self.op = "program"
         self.body = body  # List of IRNodes
 
     def __repr__(self):
         return f"IRProgram({self.body})"
 
 class IRConst(IRNode):
+    __slots__ = ('value',)
+    op = "const"
+    kind = IRKind.CONST
+
     def __init__(self, value):
         super().__init__()
-        self.op = "const"
         self.value = value
 
     def __repr__(self):
         return f"IRConst({self.value})"
 
 class IRIdent(IRNode):
+    __slots__ = ('value',)
+    op = "indent"
+    kind = IRKind.IDENT
+
     def __init__(self, value):
         super().__init__()
-        self.op = "indent"
         self.value = value
 
     def __repr__(self):
         return f"IRIdent({self.value})"
 
 class IRProperty(IRNode):
+    __slots__ = ('name', 'declared_type')
+    op = "prop"
+    kind = IRKind.PROPERTY
+
     def __init__(self, name, declared_type):
         super().__init__()
-        self.op = "prop"
         self.name = name
         self.declared_type = declared_type
 
@@ -71,9 +124,12 @@ class IRProperty(IRNode):
         return f"IRProperty({self.name}, {self.declared_type})"
 
 class IRIndex(IRNode):
+    __slots__ = ('index', 'value')
+    op = "index"
+    kind = IRKind.INDEX
+
     def __init__(self, index, value):
         super().__init__()
-        self.op = "index"
         self.index = index
         self.value = value
     
@@ -81,13 +137,17 @@ class IRIndex(IRNode):
         return f"IRIndex({self.index}, {self.value})"
 
 class IRVarDecl(IRNode):
-    def __init__(self, name, explicit_type, is_const, value):
+    __slots__ = ('name', 'explicit_type', 'is_const', 'value', 'inferred')
+    op = "var_decl"
+    kind = IRKind.VAR_DECL
+
+    def __init__(self, name, explicit_type, is_const, value, inferred=False):
         super().__init__()
-        self.op = "var_decl"
         self.name = name 
         self.explicit_type = explicit_type
         self.is_const = is_const
         self.value = value
+        self.inferred = inferred # explicit_type was worked out by the compiler, not written
 
     def __repr__(self):
         if self.is_const:
@@ -96,9 +156,12 @@ class IRVarDecl(IRNode):
             return f"IRVarDecl('{self.name}', {self.explicit_type}, {self.value})"
 
 class IRObjDecl(IRNode):
+    __slots__ = ('name', 'properties')
+    op = "obj_decl"
+    kind = IRKind.OBJ_DECL
+
     def __init__(self, name, properties):
         super().__init__()
-        self.op = "obj_decl"
         self.name = name
         self.properties = properties
     
@@ -106,9 +169,12 @@ class IRObjDecl(IRNode):
         return f"IRObjDecl('{self.name}, {self.properties})"
 
 class IRGrpDecl(IRNode):
+    __slots__ = ('name', 'declared_type', 'size', 'items')
+    op = "grp_decl"
+    kind = IRKind.GRP_DECL
+
     def __init__(self, name, declared_type, size, items):
         super().__init__()
-        self.op = "grp_decl"
         self.name = name
         self.declared_type = declared_type
         self.size = size
@@ -118,21 +184,29 @@ class IRGrpDecl(IRNode):
         return f"IRGrpDecl({self.name}, {self.declared_type}, {self.size}, items({self.items}))"
 
 class IRFuncDecl(IRNode):
-    def __init__(self, name, params, return_type, body):
+    __slots__ = ('name', 'params', 'return_type', 'body', 'inline')
+    op = "func_decl"
+    kind = IRKind.FUNC_DECL
+
+    def __init__(self, name, params, return_type, body, inline=False):
         super().__init__()
-        self.op = "func_decl"
         self.name = name
         self.params = params  # List of IRProperty
         self.return_type = return_type
         self.body = body      # List of IRNodes
+        self.inline = inline  # `inline func`: always inline when possible
 
     def __repr__(self):
-        return f"IRFuncDecl({self.name}, {self.return_type}, params({self.params}), body({self.body}))"
+        inline = ", inline" if self.inline else ""
+        return f"IRFuncDecl({self.name}, {self.return_type}{inline}, params({self.params}), body({self.body}))"
 
 class IRState(IRNode):
+    __slots__ = ('name', 'body')
+    op = "state_decl"
+    kind = IRKind.STATE
+
     def __init__(self, name, body):
         super().__init__()
-        self.op = "state_decl"
         self.name = name
         self.body = body
 
@@ -141,9 +215,12 @@ class IRState(IRNode):
 
 
 class IRIf(IRNode):
+    __slots__ = ('conditions', 'then_branch', 'elif_branches', 'else_branch')
+    op = "if"
+    kind = IRKind.IF
+
     def __init__(self, conditions, then_branch, elif_branches, else_branch):
         super().__init__()
-        self.op = "if"
         self.conditions = conditions 
         self.then_branch = then_branch  
         self.elif_branches = elif_branches 
@@ -153,9 +230,12 @@ class IRIf(IRNode):
         return f"IRIf({self.conditions}, then({self.then_branch}), elif({self.elif_branches}), else({self.else_branch}))"
 
 class IRWhile(IRNode):
+    __slots__ = ('condition', 'body')
+    op = "while"
+    kind = IRKind.WHILE
+
     def __init__(self, condition, body):
         super().__init__()
-        self.op = "while"
         self.condition = condition
         self.body = body 
 
@@ -163,9 +243,12 @@ class IRWhile(IRNode):
         return f"IRWhile({self.condition}, do({self.body}))"
 
 class IRFor(IRNode):
+    __slots__ = ('init', 'condition', 'increment', 'body')
+    op = "for"
+    kind = IRKind.FOR
+
     def __init__(self, init, condition, increment, body):
         super().__init__()
-        self.op = "for"
         self.init = init
         self.condition = condition
         self.increment = increment
@@ -175,9 +258,12 @@ class IRFor(IRNode):
         return f"IRFor({self.init}, {self.condition}, {self.increment}, do({self.body}))"
 
 class IRReturn(IRNode):
+    __slots__ = ('value',)
+    op = "return"
+    kind = IRKind.RETURN
+
     def __init__(self, value):
         super().__init__()
-        self.op = "return"
         self.value = value
 
     def __repr__(self):
@@ -185,18 +271,24 @@ class IRReturn(IRNode):
 
 
 class IRNull(IRNode):
+    __slots__ = ('value',)
+    op = "null"
+    kind = IRKind.NULL
+
     def __init__(self):
         super().__init__()
-        self.op = "null"
         self.value = "null"
 
     def __repr__(self):
         return f"IRNull(null)"
 
 class IRBinary(IRNode):
+    __slots__ = ('operator', 'left', 'right')
+    op = "binary"
+    kind = IRKind.BINARY
+
     def __init__(self, operator, left, right):
         super().__init__()
-        self.op = "binary"
         self.operator = operator
         self.left = left
         self.right = right
@@ -205,9 +297,12 @@ class IRBinary(IRNode):
         return f"IRBinary('{self.operator}', {self.left}, {self.right})"
 
 class IRUnary(IRNode):
+    __slots__ = ('operator', 'operand', 'postfix')
+    op = "unary"
+    kind = IRKind.UNARY
+
     def __init__(self, operator, operand, postfix=False):
         super().__init__()
-        self.op = "unary"
         self.operator = operator
         self.operand = operand
         self.postfix = postfix
@@ -219,17 +314,23 @@ class IRUnary(IRNode):
             return f"IRUnary({self.operand}{self.operator})"
 
 class IRAssignment(IRNode):
+    __slots__ = ('assignee', 'value', 'operator')
+    op = "assign"
+    kind = IRKind.ASSIGNMENT
+
     def __init__(self, assignee, value, operator):
         super().__init__()
-        self.op = "assign"
         self.assignee = assignee  # IRIdentifier or IRMemberExpr
         self.value = value
         self.operator = operator
 
     def __repr__(self):
-        return f"IRAssignment('{self.assignee}', {self.value}, {self.operator})"
+        return f"IRAssignment({self.assignee}, {self.value}, {self.operator})"
     
 class IRCall(IRNode):
+    __slots__ = ('caller', 'args')
+    kind = IRKind.CALL
+
     def __init__(self, caller, args):
         super().__init__()
         self.caller = caller
@@ -239,9 +340,12 @@ class IRCall(IRNode):
         return f"IRCall({self.caller}, args({self.args}))"
 
 class IRMember(IRNode):
+    __slots__ = ('object', 'property', 'computed')
+    op = "member"
+    kind = IRKind.MEMBER
+
     def __init__(self, obj, prop, computed=False):
         super().__init__()
-        self.op = "member"
         self.object = obj
         self.property = prop
         self.computed = computed
@@ -255,19 +359,27 @@ class IRMember(IRNode):
 
 
 class IRModule(IRNode):
+    __slots__ = ('value',)
+    op = "mod"
+    kind = IRKind.MODULE
+
     def __init__(self, value):
         super().__init__()
-        self.op = "mod"
         self.value = value
 
     def __repr__(self):
         return f"IRModule({self.value})"
     
 class IRCBlock(IRNode):
-    def __init__(self, value):
+    __slots__ = ('value', 'name', 'source')
+    op = "c"
+    kind = IRKind.CBLOCK
+
+    def __init__(self, value, name=None, source=None):
         super().__init__()
-        self.op = "c"
         self.value = value
+        self.name = name
+        self.source = source
 
     def __repr__(self):
         return f"IRCBlock({self.value})"
@@ -1,5 +1,10 @@
 # lexer.py
-from src.tokens import Token, TokenType
+import gc
+import re
+import sys
+from contextlib import contextmanager
+from itertools import count, repeat
+from src.tokens import Token, TokenType, TokenSpans
 
 KEYWORDS = {
     "var": TokenType.VAR,
@@ -22,12 +27,12 @@ KEYWORDS = {
     "return": TokenType.RETURN,
     "func" : TokenType.FUNC,
     "state" : TokenType.STATE,
-    "sprite" : TokenType.SPRITE
+    "sprite" : TokenType.SPRITE,
+    "inline" : TokenType.INLINE,
+    "map" : TokenType.MAP
 }
 
-WHITESPACE = {' ', '\t'}
-
-SINGLE_CHAR_TOKENS = {
+OPERATORS = {
     "(": TokenType.LPAREN,
     ")": TokenType.RPAREN,
     "{": TokenType.LCURL,
@@ -41,210 +46,169 @@ SINGLE_CHAR_TOKENS = {
     "*": TokenType.STAR,
     "/": TokenType.SLASH,
     "%": TokenType.PERCENT,
+    "=": TokenType.ASSIGNMENT,
+    "==": TokenType.EQUALS,
+    "+": TokenType.PLUS,
+    "++": TokenType.P_PLUS,
+    "+=": TokenType.PLUS_EQ,
+    "-": TokenType.DASH,
+    "--": TokenType.M_MINUS,
+    "-=": TokenType.MINUS_EQ,
+    "!": TokenType.NOT,
+    "!=": TokenType.NOT_EQ,
+    "&&": TokenType.AND,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQ,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQ,
 }
 
+# Longest operators first so the alternation is maximal-munch
+_OP_PATTERN = "|".join(re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True))
+
+# One match per token. Whitespace and comments are swallowed by the leading
+# non-capturing part and group 1 is the lexeme; `.` catches any character
+# nothing else accepts so it can be reported. The empty match at `\Z` soaks up
+# trailing whitespace so the skip part never has to backtrack into a comment,
+# and doubles as the EOF token.
+TOKEN_RE = re.compile(
+    r"(?:[ \t\r\n]+|//[^\n]*)*"
+    r"([^\W\d]\w*"
+    rf"|{_OP_PATTERN}"
+    r"|\d+"
+    r'|"[^"]*"?'
+    r"|."
+    r"|\Z)",
+    re.DOTALL,
+)
+
+IDENT_START = re.compile(r"[^\W\d]")
+
+
+class LexemeKinds(dict):
+    """Token type of each lexeme, worked out the first time it turns up.
+
+    None marks a character no token accepts.
+    """
+    def __missing__(self, lexeme: str):
+        if lexeme[0] == '"':
+            kind = TokenType.STRING
+        elif lexeme[0].isdecimal():
+            kind = TokenType.NUMBER
+        elif IDENT_START.match(lexeme):
+            kind = TokenType.IDENT
+        else:
+            kind = None
+        self[lexeme] = kind
+        return kind
+
+
+def find_all(items: list, item):
+    # list.index runs in C, so only the hits cost a Python step
+    i = -1
+    try:
+        while True:
+            i = items.index(item, i + 1)
+            yield i
+    except ValueError:
+        return
+
+
+@contextmanager
+def paused_gc():
+    # Tokens never form cycles, but building hundreds of thousands of them
+    # triggers a collection every few hundred, which costs more than the lexing.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.freeze()   # moves everything into the oldest generation,
+        gc.unfreeze() # so the next young collection doesn't walk every token
+        if enabled:
+            gc.enable()
+
+
 class Lexer:
     def __init__(self):
         self.tokens = []
         self.errors = []
-        self.ln = 1
-        self.col = 1
-        self.pos = 1
-
-    def add_token(self, kind: TokenType, value: str = ""):
-        self.tokens.append(Token(kind, value, self.ln, self.col))
-        self.col += len(value)
-
-    def peek(self, source: str, i: int, offset: int = 1):
-        pos = i + offset
-        if pos < len(source):
-            return source[pos]
-        return None
-
-    def lex_string(self, source: str, i: int):
-        start_line, start_col = self.ln, self.col
-        i += 1  # skip opening quote
-        self.col += 1
-        start = i
-        length = len(source)
-        while i < length and source[i] != '"':
-            if source[i] == '\n':
-                self.ln += 1
-                self.col = 1
-                i += 1
-            else:
-                i += 1
-                self.col += 1
-        val = source[start:i]
-        if i < length:
-            i += 1  # skip closing quote
-            self.col += 1
-            self.add_token(TokenType.STRING, val)
-        else:
-            self.errors.append(f"Unterminated string at line {start_line} col {start_col}")
-        return i
-
-    def lex_number(self, source: str, i: int):
-        start = i
-        length = len(source)
-        while i < length and source[i].isdigit():
-            i += 1
-            self.col += 1
-        val = source[start:i]
-        self.add_token(TokenType.NUMBER, val)
-        return i
-
-    def lex_identifier(self, source: str, i: int):
-        start = i
-        length = len(source)
-        while i < length and (source[i].isalnum() or source[i] == '_'):
-            i += 1
-            self.col += 1
-        val = source[start:i]
-        kind = KEYWORDS.get(val, TokenType.IDENT)
-        self.add_token(kind, val)
-        return i
-
-    def tokenize(self, source: str):
-        i = 0
-        length = len(source)
-
-        while i < length:
-            ch = source[i]
-
-            # Whitespace
-            if ch in WHITESPACE:
-                self.col += 1
-                i += 1
-                continue
-            elif ch == '\n':
-                self.ln += 1
-                self.col = 1
-                i += 1
-                continue
-
-            # Comments
-            if ch == '/' and self.peek(source, i) == '/':
-                i += 2
-                self.col += 2
-                while i < length and source[i] != '\n':
-                    i += 1
-                    self.col += 1
-                continue
-
-            # Single-char tokens
-            if ch in SINGLE_CHAR_TOKENS:
-                self.add_token(SINGLE_CHAR_TOKENS[ch], ch)
-                i += 1
-                continue
-
-            # Two-char or one-char operators
-            def match_two_char(op1, op2, token_two, token_one):
-                if ch == op1:
-                    if self.peek(source, i) == op2:
-                        self.add_token(token_two, op1 + op2)
-                        return 2
-                    else:
-                        self.add_token(token_one, op1)
-                        return 1
-                return 0
-
-            # Two-char or one-char operators
-            if ch == '=':
-                if self.peek(source, i) == '=':
-                    self.add_token(TokenType.EQUALS, '==')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.ASSIGNMENT, '=')
-                    i += 1
-                    self.col += 1
-                continue
-            elif ch == '+':
-                if self.peek(source, i) == '+':
-                    self.add_token(TokenType.P_PLUS, '++')
-                    i += 2
-                    self.col += 2
-                elif self.peek(source, i) == '=':
-                    self.add_token(TokenType.PLUS_EQ, '+=')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.PLUS, '+')
-                    i += 1
-                    self.col += 1
-                continue
-            elif ch == '-':
-                if self.peek(source, i) == '-':
-                    self.add_token(TokenType.M_MINUS, '--')
-                    i += 2
-                    self.col += 2
-                elif self.peek(source, i) == '=':
-                    self.add_token(TokenType.MINUS_EQ, '-=')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.DASH, '-')
-                    i += 1
-                    self.col += 1
-                continue
-            elif ch == '!':
-                if self.peek(source, i) == '=':
-                    self.add_token(TokenType.NOT_EQ, '!=')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.NOT, '!')
-                    i += 1
-                    self.col += 1
-                continue
-            elif ch == '&':
-                if self.peek(source, i) == '&':
-                    self.add_token(TokenType.AND, '&&')
-                    i += 2
-                    self.col += 2
-                continue
-            elif ch == '<':
-                if self.peek(source, i) == '=':
-                    self.add_token(TokenType.LESS_EQ, '<=')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.LESS, '<')
-                    i += 1
-                    self.col += 1
-                continue
-            elif ch == '>':
-                if self.peek(source, i) == '=':
-                    self.add_token(TokenType.GREATER_EQ, '>=')
-                    i += 2
-                    self.col += 2
-                else:
-                    self.add_token(TokenType.GREATER, '>')
-                    i += 1
-                    self.col += 1
-                continue
-
-
-            # String literal
-            if ch == '"':
-                i = self.lex_string(source, i)
-                continue
+        self.lines = None
+        self.kinds = LexemeKinds({**KEYWORDS, **OPERATORS, "": TokenType.EOF})
 
-            # Number literal
-            if ch.isdigit():
-                i = self.lex_number(source, i)
-                continue
+    def error_at(self, msg: str, pos: int):
+        ln, col = self.lines.locate(pos)
+        self.errors.append(msg.format(ln=ln, col=col))
 
-            # Identifier or keyword
-            if ch.isalpha() or ch == '_':
-                i = self.lex_identifier(source, i)
-                continue
-
-            # Unknown character
-            self.errors.append(f"Unexpected character: '{ch}' at line {self.ln}, col {self.col}")
-            i += 1
-            self.col += 1
-
-        self.add_token(TokenType.EOF, "")
+    def tokenize(self, source: str):
+        lines = self.lines = TokenSpans(source, TOKEN_RE)
+        self.tokens.extend(self.scan(source, 0, lines)[0])
         return self.tokens
+
+    def iter_tokens(self, source: str):
+        """Yield tokens one at a time, for a TokenStream to pull from."""
+        lines = self.lines = TokenSpans(source, TOKEN_RE)
+        yield from self.scan(source, 0, lines)[0]
+
+    def iter_file(self, f, chunk_size: int = 1 << 16):
+        """Yield tokens from a text file object, reading it in chunks.
+
+        Chunks are extended to the next newline so no token is split, except
+        a string literal, which is carried over into the next chunk.
+        """
+        offset, ln, col = 0, 1, 1
+        carry = ""
+        while True:
+            data = f.read(chunk_size)
+            if data and not data.endswith("\n"):
+                data += f.readline()
+            text = carry + data
+            lines = self.lines = TokenSpans(text, TOKEN_RE, offset, ln, col)
+            tokens, stop = self.scan(text, offset, lines, final=not data)
+            yield from tokens
+            if not data:
+                break
+            if stop is None:
+                stop = len(text)
+            carry = text[stop:]
+            offset += stop
+            ln, col = lines.locate(offset)
+
+    def scan(self, text: str, offset: int, lines: TokenSpans, final: bool = True):
+        """Return the tokens in `text`, whose first character is at `offset`,
+        and None, or where scanning stopped.
+
+        The tokens end with EOF if `final`. Otherwise, if the text ends inside
+        a string literal, they stop before it and its index in `text` is
+        returned so it can be rescanned together with more input.
+        """
+        STRING = TokenType.STRING
+        values = TOKEN_RE.findall(text)
+        if len(values) > 1 and values[-2] == "":
+            values.pop() # trailing whitespace, then \Z matches again after it
+        kinds = list(map(self.kinds.__getitem__, values))
+        with paused_gc():
+            # identifiers repeat a lot, share one copy
+            tokens = list(map(Token, zip(kinds, map(sys.intern, values), count(), repeat(lines))))
+        stop = None
+        if STRING in kinds or None in kinds:
+            dropped = []
+            for i in sorted([*find_all(kinds, STRING), *find_all(kinds, None)]):
+                value = values[i]
+                if kinds[i] is None:
+                    self.error_at(f"Unexpected character: '{value}' at line {{ln}}, col {{col}}", lines.offset_of(i))
+                    dropped.append(i)
+                elif len(value) > 1 and value[-1] == '"':
+                    tokens[i] = Token((STRING, value[1:-1], i, lines))
+                elif not final:
+                    stop = lines.offset_of(i) - offset
+                    del tokens[i:]
+                    break
+                else:
+                    self.error_at("Unterminated string at line {ln} col {col}", lines.offset_of(i))
+                    dropped.append(i)
+            for i in reversed(dropped):
+                del tokens[i]
+        if not final and stop is None:
+            tokens.pop() # EOF
+        return tokens, stop
@@ -0,0 +1,454 @@
+# loops.py
+from copy import deepcopy
+from src.ir_nodes import *
+from src.constfold import INT_TYPES, ConstFolder, fold_binary, is_int_const, wrap
+from src.deadcode import referenced_names
+from src.cfg import build_cfg, BasicBlock, SeqRegion, IfRegion, stmt_names
+
+# A loop is fully unrolled when it runs at most this many times and the
+# copies come to at most UNROLL_BUDGET IR nodes
+MAX_UNROLL_TRIPS = 8
+UNROLL_BUDGET = 64
+
+COMPARISONS = ("<", "<=", ">", ">=", "!=")
+ARITHMETIC = ("+", "-", "*", "/", "%", "<<", ">>", "&", "|", "^")
+
+# Types a hoisted value's temporary can be declared with
+HOISTABLE_TYPES = tuple(INT_TYPES) + ("str",)
+
+
+def ir_size(ir):
+    count = 0
+    stack = [ir]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, IRNode):
+            count += 1
+            stack.extend(getattr(item, field, None) for field in item.fields())
+    return count
+
+def substitute(ir, name, value):
+    """Replace every read of `name` under `ir` with the constant `value`."""
+    for field in ir.fields():
+        child = getattr(ir, field, None)
+        if isinstance(child, IRIdent) and child.value == name:
+            setattr(ir, field, IRConst(value))
+        elif isinstance(child, IRNode):
+            substitute(child, name, value)
+        elif isinstance(child, list):
+            for i, item in enumerate(child):
+                if isinstance(item, IRIdent) and item.value == name:
+                    child[i] = IRConst(value)
+                elif isinstance(item, IRNode):
+                    substitute(item, name, value)
+
+def written_names(stmts):
+    uses, defs = set(), set()
+    for stmt in stmts:
+        stmt_names(stmt, set(), defs)
+    return defs
+
+def counted_loop(ir):
+    """(name, type, start, compare, limit, step) for `for (var i = a; i op N; i += step)`.
+
+    Both bounds must be integer constants and the body must not assign
+    the counter. None for any other loop.
+    """
+    init, cond, inc = ir.init, ir.condition, ir.increment
+    if init.kind != IRKind.VAR_DECL or not is_int_const(init.value):
+        return None
+    name = init.name
+    if cond.kind != IRKind.BINARY or cond.operator not in COMPARISONS:
+        return None
+    if not (isinstance(cond.left, IRIdent) and cond.left.value == name and is_int_const(cond.right)):
+        return None
+
+    step = None
+    if inc.kind == IRKind.UNARY and inc.operator in ("++", "--") and isinstance(inc.operand, IRIdent):
+        if inc.operand.value == name:
+            step = 1 if inc.operator == "++" else -1
+    elif inc.kind == IRKind.ASSIGNMENT and inc.operator in ("+=", "-=") and is_int_const(inc.value):
+        if isinstance(inc.assignee, IRIdent) and inc.assignee.value == name:
+            step = inc.value.value if inc.operator == "+=" else -inc.value.value
+    if not step or name in written_names(ir.body):
+        return None
+    return name, init.explicit_type, init.value.value, cond.operator, cond.right.value, step
+
+def trip_values(loop, limit):
+    """Counter values the loop runs with, or None if that's more than `limit`."""
+    name, type_name, value, compare, bound, step = loop
+    bits, signed = INT_TYPES.get(type_name, (16, True))
+    values = []
+    while fold_binary(compare, value, bound):
+        if len(values) == limit:
+            return None
+        values.append(value)
+        value = wrap(value + step, bits, signed)
+    return values
+
+
+class LoopOptimizer:
+    """Loop transformations on the structured IR.
+
+    Small loops with a constant trip count are fully unrolled, with the
+    counter replaced by its value in each copy. Counted loops whose index
+    the body never reads count down to zero instead, which is a cheaper
+    test on the SM83 than comparing against the bound. Finally, on each
+    state's and function's CFG, expressions that can't change while a
+    loop runs are computed once in the loop's preheader.
+    """
+    def __init__(self, unroll_budget=UNROLL_BUDGET):
+        self.unroll_budget = unroll_budget
+        self.unrolled = 0
+        self.reversed = 0
+        self.hoisted = 0
+
+    def run(self, program):
+        self.hoister = Hoister(program)
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                stmt.body = self.stmts(stmt.body)
+                self.hoisted += self.hoister.run(stmt)
+        return program
+
+    def stmts(self, body):
+        new = []
+        for stmt in body:
+            new.extend(self.stmt(stmt))
+        return new
+
+    def stmt(self, ir):
+        match ir.kind:
+            case IRKind.IF:
+                ir.then_branch = self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.stmt(elif_ir)
+                ir.else_branch = self.stmts(ir.else_branch)
+            case IRKind.WHILE:
+                ir.body = self.stmts(ir.body)
+            case IRKind.FOR:
+                # Inner loops first, so an unrolled inner loop can make the outer one small enough
+                ir.body = self.stmts(ir.body)
+                loop = counted_loop(ir)
+                if loop is not None:
+                    unrolled = self.unroll(ir, loop)
+                    return unrolled if unrolled is not None else self.count_down(ir, loop)
+        return [ir]
+
+    def unroll(self, ir, loop):
+        # A declaration at the top of the body would be repeated in one scope
+        if any(stmt.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL) for stmt in ir.body):
+            return None
+        size = ir_size(ir.body)
+        values = trip_values(loop, min(MAX_UNROLL_TRIPS, self.unroll_budget // max(size, 1)))
+        if values is None:
+            return None
+
+        name = loop[0]
+        stmts = []
+        for value in values:
+            copy = deepcopy(ir.body)
+            for stmt in copy:
+                substitute(stmt, name, value)
+            folder = ConstFolder()
+            folder.stmts(copy, new_scope=False)
+            stmts.extend(copy)
+        self.unrolled += 1
+        return stmts
+
+    def count_down(self, ir, loop):
+        name, type_name, start, compare, bound, step = loop
+        uses = set()
+        for stmt in ir.body:
+            stmt_names(stmt, uses, set())
+        if name in uses or step != 1 or compare not in ("<", "<=", "!="):
+            return [ir]
+        trips = bound - start + (compare == "<=")
+        if trips <= 0 or (compare == "!=" and start > bound):
+            return [ir]
+
+        ir.init.value = IRConst(trips)
+        if (type_name == "auto" or ir.init.inferred) and trips <= 0xFF:
+            ir.init.explicit_type = "uint8_t"
+        ir.condition = IRBinary("!=", IRIdent(name), IRConst(0))
+        ir.increment = IRUnary("--", IRIdent(name), postfix=getattr(ir.increment, "postfix", True))
+        self.reversed += 1
+        return [ir]
+
+
+class ValueTypes:
+    """Declared types of what expressions read, for typing compiler temporaries.
+
+    `enter` sets up a state or function: its locals declared exactly once
+    (a shadowed name could be either variable) and their types. Groups
+    are typed ("grp", element type).
+    """
+    def __init__(self, program):
+        self.globals = {}
+        self.objects = {}
+        for stmt in program.body:
+            match stmt.kind:
+                case IRKind.VAR_DECL:
+                    self.globals[stmt.name] = stmt.explicit_type
+                case IRKind.GRP_DECL:
+                    self.globals[stmt.name] = ("grp", stmt.declared_type)
+                case IRKind.OBJ_DECL:
+                    self.objects[stmt.name] = {p.name: p.declared_type for p in stmt.properties}
+        self.types = {}
+        self.locals = set()
+
+    def enter(self, ir, cfg):
+        self.types = {}
+        counts = {}
+        params = ir.params if ir.kind == IRKind.FUNC_DECL else []
+        for param in params:
+            counts[param.name] = 1
+            self.types[param.name] = param.declared_type
+        for block in cfg.blocks:
+            for stmt in block.stmts:
+                if stmt.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL):
+                    counts[stmt.name] = counts.get(stmt.name, 0) + 1
+                    self.types[stmt.name] = stmt.explicit_type if stmt.kind == IRKind.VAR_DECL \
+                        else ("grp", stmt.declared_type)
+        self.locals = {name for name, count in counts.items() if count == 1}
+
+    def local_scalar(self, name):
+        """True for a local that no call can change: not a global, and not a group (passed by address)."""
+        return name in self.locals and not isinstance(self.types.get(name), tuple)
+
+    def type_of(self, ir):
+        match ir.kind:
+            case IRKind.CONST:
+                return "int" if is_int_const(ir) else None
+            case IRKind.IDENT:
+                if ir.value in self.types:
+                    return self.types[ir.value] if ir.value in self.locals else None
+                return self.globals.get(ir.value)
+            case IRKind.MEMBER:
+                base = self.type_of(ir.object)
+                if ir.computed:
+                    return base[1] if isinstance(base, tuple) else None
+                props = self.objects.get(base)
+                return props.get(ir.property.value) if props and isinstance(ir.property, IRIdent) else None
+            case IRKind.BINARY:
+                left, right = self.type_of(ir.left), self.type_of(ir.right)
+                if left not in INT_TYPES or right not in INT_TYPES:
+                    return None
+                if ir.operator in ARITHMETIC and "uint16_t" in (left, right):
+                    return "uint16_t"
+                return "int"
+            case IRKind.UNARY:
+                return "int" if self.type_of(ir.operand) in INT_TYPES else None
+        return None
+
+
+class Hoister:
+    """Loop-invariant code motion over a CFG.
+
+    An expression is invariant when it has no side effects and nothing
+    it reads is assigned anywhere in the loop: no plain assignment to a
+    name it uses, and no assignment to a member or element of an object
+    or group it reads from. A call in the loop may change any global and
+    any group passed to it, so only expressions over local scalars and
+    objects are hoisted past one. Each is stored in a temporary declared
+    in the loop's preheader, which needs a type, so only values whose
+    type is known are hoisted.
+    """
+    def __init__(self, program):
+        self.values = ValueTypes(program)
+        self.taken = set()
+        referenced_names(program, self.taken)
+        self.next_temp = 0
+
+    def temp_name(self):
+        while True:
+            name = f"_inv{self.next_temp}"
+            self.next_temp += 1
+            if name not in self.taken:
+                return name
+
+    def run(self, ir):
+        cfg = build_cfg(ir)
+        self.values.enter(ir, cfg)
+        hoisted = self.region(cfg.region)
+        if hoisted:
+            ir.body = cfg.to_ir()
+        return hoisted
+
+    def region(self, region):
+        count = 0
+        if isinstance(region, SeqRegion):
+            for item in region.items:
+                if not isinstance(item, BasicBlock):
+                    count += self.region(item)
+        elif isinstance(region, IfRegion):
+            for _, body in region.branches:
+                count += self.region(body)
+            if region.else_region:
+                count += self.region(region.else_region)
+        else:
+            # Outer loops first: what is invariant in both leaves the whole nest
+            count += self.loop(region)
+            count += self.region(region.body)
+        return count
+
+    def loop(self, loop):
+        blocks = region_blocks(loop)
+        self.written = set()
+        self.has_call = False
+        # The init of a for loop runs inside its scope, after anything hoisted
+        stmts = loop.preheader.stmts[-1:] if loop.kind == "for" else []
+        for block in blocks:
+            stmts = stmts + block.stmts + ([block.cond] if block.cond is not None else [])
+        for stmt in stmts:
+            self.scan(stmt)
+
+        self.decls = []
+        self.temps = {} # repr of a hoisted expression -> temp name
+        for block in blocks:
+            block.stmts = [self.stmt(stmt) for stmt in block.stmts]
+            if block.cond is not None:
+                block.cond = self.expr(block.cond)
+
+        at = len(loop.preheader.stmts) - (loop.kind == "for")
+        loop.preheader.stmts[at:at] = self.decls
+        return len(self.decls)
+
+    def scan(self, ir):
+        """Collect what `ir` writes into self.written, and note calls."""
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.GRP_DECL:
+                self.written.add(ir.name)
+            case IRKind.ASSIGNMENT:
+                self.written.add(root_name(ir.assignee))
+            case IRKind.UNARY if ir.operator in ("++", "--"):
+                self.written.add(root_name(ir.operand))
+            case IRKind.CALL:
+                self.has_call = True
+        for field in ir.fields():
+            value = getattr(ir, field, None)
+            if isinstance(value, IRNode):
+                self.scan(value)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, IRNode):
+                        self.scan(item)
+
+    def invariant(self, ir):
+        match ir.kind:
+            case IRKind.CONST:
+                return True
+            case IRKind.IDENT:
+                if ir.value in self.written:
+                    return False
+                # Only local scalars and objects are safe from a call
+                return not self.has_call or self.values.local_scalar(ir.value)
+            case IRKind.MEMBER:
+                return self.invariant(ir.object) and (not ir.computed or self.invariant(ir.property))
+            case IRKind.BINARY:
+                # `/` and `%` stay put: hoisting one out of a loop that never runs could divide by zero
+                return ir.operator not in ("/", "%") and self.invariant(ir.left) and self.invariant(ir.right)
+            case IRKind.UNARY:
+                return ir.operator in ("-", "!", "~") and self.invariant(ir.operand)
+        return False
+
+    def worth_hoisting(self, ir):
+        if ir.kind == IRKind.MEMBER:
+            return True
+        if ir.kind in (IRKind.BINARY, IRKind.UNARY):
+            names = set()
+            referenced_names(ir, names)
+            return bool(names)
+        return False
+
+    def stmt(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL | IRKind.RETURN:
+                ir.value = self.expr(ir.value)
+            case IRKind.ASSIGNMENT:
+                ir.value = self.expr(ir.value)
+                ir.assignee = self.lvalue(ir.assignee)
+            case IRKind.CALL:
+                ir.args = [self.expr(arg) for arg in ir.args]
+            case IRKind.GRP_DECL | IRKind.CBLOCK | IRKind.NULL | IRKind.IDENT:
+                pass
+            case _:
+                return self.expr(ir)
+        return ir
+
+    def lvalue(self, ir):
+        # The target itself stays, but an element index can be hoisted
+        if ir.kind == IRKind.MEMBER:
+            ir.object = self.lvalue(ir.object)
+            if ir.computed:
+                ir.property = self.expr(ir.property)
+        return ir
+
+    def expr(self, ir):
+        if self.worth_hoisting(ir) and self.invariant(ir):
+            type_name = self.values.type_of(ir)
+            if type_name in HOISTABLE_TYPES:
+                return IRIdent(self.hoist(ir, type_name))
+
+        match ir.kind:
+            case IRKind.BINARY:
+                ir.left = self.expr(ir.left)
+                ir.right = self.expr(ir.right)
+            case IRKind.UNARY:
+                if ir.operator in ("++", "--"):
+                    ir.operand = self.lvalue(ir.operand)
+                else:
+                    ir.operand = self.expr(ir.operand)
+            case IRKind.ASSIGNMENT:
+                ir.value = self.expr(ir.value)
+                ir.assignee = self.lvalue(ir.assignee)
+            case IRKind.CALL:
+                ir.args = [self.expr(arg) for arg in ir.args]
+            case IRKind.MEMBER:
+                ir.object = self.lvalue(ir.object) if not ir.computed else self.expr(ir.object)
+                if ir.computed:
+                    ir.property = self.expr(ir.property)
+        return ir
+
+    def hoist(self, ir, type_name):
+        key = repr(ir)
+        if key not in self.temps:
+            name = self.temp_name()
+            self.temps[key] = name
+            self.decls.append(IRVarDecl(name, type_name, False, ir, inferred=True))
+        return self.temps[key]
+
+
+def root_name(ir):
+    while ir.kind == IRKind.MEMBER:
+        ir = ir.object
+    return ir.value if ir.kind == IRKind.IDENT else None
+
+def region_blocks(region):
+    """Every block inside `region`; for a loop, its header, body and latch."""
+    if isinstance(region, SeqRegion):
+        blocks = []
+        for item in region.items:
+            if isinstance(item, BasicBlock):
+                blocks.append(item)
+            else:
+                if not isinstance(item, IfRegion):
+                    blocks.append(item.preheader)
+                blocks.extend(region_blocks(item))
+        return blocks
+    if isinstance(region, IfRegion):
+        # The first test sits at the end of the block before the if
+        blocks = [block for block, _ in region.branches[1:]]
+        for _, body in region.branches:
+            blocks.extend(region_blocks(body))
+        if region.else_region:
+            blocks.extend(region_blocks(region.else_region))
+        return blocks
+    blocks = [region.header] + region_blocks(region.body)
+    return blocks + [region.latch] if region.latch else blocks
+
+
+def optimize_loops(program, unroll_budget=UNROLL_BUDGET):
+    return LoopOptimizer(unroll_budget).run(program)
@@ -0,0 +1,532 @@
+# narrow.py
+from src.ir_nodes import *
+from src.constfold import INT_TYPES, fold_binary, is_int_const
+from src.parser import INT_ANNOTATIONS
+from src.deadcode import C_IDENT_RE
+
+# Value range of each C integer type, from INT_TYPES' (bits, signed)
+TYPE_RANGES = {
+    name: (-(1 << bits - 1), (1 << bits - 1) - 1) if signed else (0, (1 << bits) - 1)
+    for name, (bits, signed) in INT_TYPES.items()
+}
+FULL = TYPE_RANGES["int"]
+
+# Types the analysis may replace, besides the type of a declaration whose
+# type was inferred (IRVarDecl.inferred); anything else was chosen by the user
+NARROWABLE = ("auto",)
+
+# Candidates tried in order, narrowest first; int before uint16_t so only
+# values past 32767 (which would wrap in a 16-bit int) become unsigned
+NARROW_TYPES = ("uint8_t", "int8_t", "int", "uint16_t")
+
+# A variable whose range is still growing after this many updates
+# (a counter, an accumulator) gets the full range of its type
+WIDEN_AFTER = 8
+
+# Range of a value not known to be an integer: strings, objects, and
+# anything coming from C (calls, undeclared names, object properties)
+NOT_INT = "not int"
+
+def join(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a is NOT_INT or b is NOT_INT:
+        return NOT_INT
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+def fits(r, bounds):
+    return bounds[0] <= r[0] and r[1] <= bounds[1]
+
+def checked(lo, hi):
+    # int arithmetic wraps, so anything leaving the int range could be anything
+    return (lo, hi) if FULL[0] <= lo and hi <= FULL[1] else FULL
+
+def literal_range(value):
+    # A literal up to 65535 is kept exact so it can pick uint16_t; past that it is a long
+    return (value, value) if FULL[0] <= value <= TYPE_RANGES["uint16_t"][1] else FULL
+
+def binary_range(op, a, b):
+    match op:
+        case "+":
+            return checked(a[0] + b[0], a[1] + b[1])
+        case "-":
+            return checked(a[0] - b[1], a[1] - b[0])
+        case "*":
+            products = [x * y for x in a for y in b]
+            return checked(min(products), max(products))
+        case "/":
+            quotients = [fold_binary("/", x, y) for x in a for y in b]
+            if (b[0] > 0 or b[1] < 0) and None not in quotients:
+                return (min(quotients), max(quotients))
+            # Divisor range spans 0, or an operand is outside int (a u16 value)
+            m = max(abs(a[0]), abs(a[1]))
+            return checked(-m, m)
+        case "%":
+            m = max(abs(b[0]), abs(b[1])) - 1
+            if m < 0:
+                return FULL
+            if a[0] >= 0:
+                return (0, min(a[1], m))
+            return (-m, m if a[1] > 0 else 0)
+        case "<<" if b[0] >= 0 and b[1] < 16:
+            shifted = [x << y for x in a for y in b]
+            return checked(min(shifted), max(shifted))
+        case ">>" if b[0] >= 0 and b[1] < 16:
+            return (a[0] >> (b[1] if a[0] >= 0 else b[0]), a[1] >> (b[0] if a[1] >= 0 else b[1]))
+        case "&" if a[0] >= 0 or b[0] >= 0:
+            return (0, min(x[1] for x in (a, b) if x[0] >= 0))
+        case "|" | "^" if a[0] >= 0 and b[0] >= 0:
+            return (0, (1 << max(a[1], b[1]).bit_length()) - 1)
+        case "==" | "!=" | "<" | "<=" | ">" | ">=" | "&&" | "||" | "and" | "or":
+            return (0, 1)
+    return FULL
+
+
+class Var:
+    """One declared variable, parameter or group, and every value stored in it."""
+    __slots__ = ("name", "decl", "type_name", "defs", "range", "updates")
+
+    def __init__(self, name, decl, type_name):
+        self.name = name
+        self.decl = decl # IRVarDecl, IRProperty (parameter) or IRGrpDecl
+        self.type_name = type_name
+        self.defs = []   # (kind, expr, extra), see RangeAnalysis.def_range
+        self.range = None
+        self.updates = 0
+
+    def bounds(self):
+        return TYPE_RANGES.get(self.type_name, FULL)
+
+
+class RangeAnalysis:
+    """Narrows integer variables to the smallest C type that holds their values.
+
+    Every store to a variable (initializer, assignment, ++/--, call
+    argument for parameters, element store for groups) is collected and
+    the value ranges are solved to a fixed point with interval
+    arithmetic. `for` loops stepping a counter towards a bound are
+    recognised, so the counter's range is its start and end values.
+
+    Variables, parameters and group elements whose type is inferred
+    (`auto`) get uint8_t or int8_t when their whole range fits, and
+    inferred integers that don't fit become `int`, or uint16_t when
+    they only hold values from 0 to 65535 that int can't. Declared types,
+    `int` included, are kept; for fixed-width ones (u8, i16, ...) a
+    warning is printed when a stored value can never fit them.
+    """
+    def __init__(self):
+        self.scopes = [{}]
+        self.vars = []
+        self.bind = {}     # id(IRIdent) -> Var it reads
+        self.funcs = {}    # name -> [Var] of its parameters
+        self.returns = {}  # name -> declared return type
+        self.calls = []    # IRCall nodes, resolved once all functions are known
+        self.opaque = set() # names hand-written C may touch
+        self.warnings = []
+        self.narrowed = 0
+
+    # region Collection
+    def run(self, program):
+        self.analyze(program)
+        self.apply(program)
+        return program
+
+    def analyze(self, program):
+        """Collect stores and solve ranges, without changing `program`."""
+        top = self.scopes[0]
+        for stmt in program.body:
+            if stmt.kind in (IRKind.VAR_DECL, IRKind.GRP_DECL) and stmt.name not in top:
+                top[stmt.name] = self.declare(stmt)
+
+        roots = {}
+        for stmt in program.body:
+            if stmt.kind == IRKind.STATE and stmt.name.lower() in ("onload", "gameloop"):
+                roots[stmt.name.lower()] = stmt
+            else:
+                self.stmt(stmt)
+
+        # onload and gameloop both end up in main(), gameloop nested inside,
+        # so gameloop can see onload's variables
+        depth = len(self.scopes)
+        for name in ("onload", "gameloop"):
+            self.scopes.append({})
+            if name in roots:
+                self.stmts(roots[name].body, new_scope=False)
+        del self.scopes[depth:]
+
+        self.resolve_calls()
+        for var in self.vars:
+            if var.name in self.opaque:
+                var.defs.append(("any", None, None))
+        for name, params in self.funcs.items():
+            if name in self.opaque:
+                for var in params:
+                    var.defs.append(("any", None, None))
+        self.solve()
+        return self
+
+    def declare(self, decl):
+        type_name = decl.explicit_type if decl.kind == IRKind.VAR_DECL else decl.declared_type
+        var = Var(decl.name, decl, type_name)
+        self.vars.append(var)
+        return var
+
+    def escape(self, ir):
+        # A group used without an index decays to a pointer; whatever
+        # receives it depends on its element type, so that has to stay
+        var = self.bind.get(id(ir)) if isinstance(ir, IRIdent) else None
+        if var is not None and var.decl.kind == IRKind.GRP_DECL:
+            var.defs.append(("any", None, None))
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def stmts(self, body, new_scope=True):
+        if new_scope:
+            self.scopes.append({})
+        for stmt in body:
+            self.stmt(stmt)
+        if new_scope:
+            self.scopes.pop()
+
+    def stmt(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL:
+                self.expr(ir.value)
+                self.escape(ir.value)
+                var = self.scopes[-1].get(ir.name)
+                if var is None or var.decl is not ir:
+                    var = self.declare(ir)
+                if isinstance(ir.value, IRNull):
+                    if len(self.scopes) == 1:
+                        var.defs.append(("set", IRConst(0), None)) # globals start zeroed
+                else:
+                    var.defs.append(("set", ir.value, None))
+                self.scopes[-1][ir.name] = var
+
+            case IRKind.GRP_DECL:
+                var = self.scopes[-1].get(ir.name)
+                if var is None or var.decl is not ir:
+                    var = self.declare(ir)
+                for item in ir.items:
+                    self.expr(item.value)
+                    var.defs.append(("set", item.value, None))
+                if len(ir.items) < int(ir.size):
+                    var.defs.append(("set", IRConst(0), None))
+                self.scopes[-1][ir.name] = var
+
+            case IRKind.FUNC_DECL:
+                params = [self.declare(param) for param in ir.params]
+                if ir.name not in self.funcs:
+                    self.funcs[ir.name] = params
+                    self.returns[ir.name] = ir.return_type
+                self.scopes.append({var.name: var for var in params})
+                self.stmts(ir.body, new_scope=False)
+                self.scopes.pop()
+
+            case IRKind.STATE:
+                self.stmts(ir.body)
+
+            case IRKind.IF:
+                for cond in ir.conditions:
+                    self.expr(cond)
+                self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.stmt(elif_ir)
+                self.stmts(ir.else_branch)
+
+            case IRKind.WHILE:
+                self.expr(ir.condition)
+                self.stmts(ir.body)
+
+            case IRKind.FOR:
+                self.for_stmt(ir)
+
+            case IRKind.RETURN:
+                self.expr(ir.value)
+                self.escape(ir.value)
+
+            case IRKind.CBLOCK:
+                if ir.name is None:
+                    self.opaque.update(C_IDENT_RE.findall(ir.value))
+
+            case IRKind.OBJ_DECL | IRKind.MODULE | IRKind.NULL:
+                pass
+
+            case _:
+                self.expr(ir)
+
+    def for_stmt(self, ir):
+        self.scopes.append({})
+        self.stmt(ir.init)
+        self.expr(ir.condition)
+        self.stmts(ir.body)
+
+        counter = self.loop_counter(ir)
+        if counter is None:
+            self.expr(ir.increment)
+        else:
+            var, op, bound, step = counter
+            self.bind[id(self.increment_target(ir.increment))] = var
+            var.defs = [("loop", ir.init.value, (op, bound, step))]
+        self.scopes.pop()
+
+    def loop_counter(self, ir):
+        """(var, comparison, bound, step) for `for (var i = a; i < b; i++)` style loops."""
+        if ir.init.kind != IRKind.VAR_DECL or isinstance(ir.init.value, IRNull):
+            return None
+        var = self.scopes[-1].get(ir.init.name)
+        if var is None or len(var.defs) != 1:
+            return None # also stored to in the condition or body
+
+        cond = ir.condition
+        if not (isinstance(cond, IRBinary) and isinstance(cond.left, IRIdent)
+                and self.bind.get(id(cond.left)) is var and cond.operator in ("<", "<=", ">", ">=")):
+            return None
+
+        inc = ir.increment
+        step = None
+        if isinstance(inc, IRUnary) and inc.operator in ("++", "--"):
+            step = 1 if inc.operator == "++" else -1
+        elif (isinstance(inc, IRAssignment) and inc.operator in ("+=", "-=")
+              and isinstance(inc.value, IRConst) and type(inc.value.value) is int and inc.value.value > 0):
+            step = inc.value.value if inc.operator == "+=" else -inc.value.value
+        target = self.increment_target(inc)
+        if step is None or not isinstance(target, IRIdent) or target.value != var.name:
+            return None
+        if (step > 0) != (cond.operator in ("<", "<=")):
+            return None # counts away from its bound
+        return var, cond.operator, cond.right, step
+
+    def increment_target(self, inc):
+        return inc.operand if isinstance(inc, IRUnary) else getattr(inc, "assignee", None)
+
+    def target(self, ir):
+        # The Var a store through `ir` lands in, if any
+        if isinstance(ir, IRIdent):
+            return self.bind.get(id(ir))
+        if isinstance(ir, IRMember) and ir.computed and isinstance(ir.object, IRIdent):
+            return self.bind.get(id(ir.object))
+        return None
+
+    def expr(self, ir):
+        match ir.kind:
+            case IRKind.IDENT:
+                var = self.lookup(ir.value)
+                if var is not None:
+                    self.bind[id(ir)] = var
+
+            case IRKind.BINARY:
+                self.expr(ir.left)
+                self.expr(ir.right)
+
+            case IRKind.UNARY:
+                self.expr(ir.operand)
+                if ir.operator in ("++", "--"):
+                    var = self.target(ir.operand)
+                    if var is not None:
+                        var.defs.append(("step", ir.operand, 1 if ir.operator == "++" else -1))
+
+            case IRKind.ASSIGNMENT:
+                self.expr(ir.assignee)
+                self.expr(ir.value)
+                self.escape(ir.value)
+                var = self.target(ir.assignee)
+                if var is not None:
+                    match ir.operator:
+                        case "=":
+                            var.defs.append(("set", ir.value, None))
+                        case "+=" | "-=":
+                            var.defs.append((ir.operator[0], ir.assignee, ir.value))
+                        case _:
+                            var.defs.append(("any", None, None))
+
+            case IRKind.CALL:
+                self.expr(ir.caller)
+                for arg in ir.args:
+                    self.expr(arg)
+                    self.escape(arg)
+                self.calls.append(ir)
+
+            case IRKind.MEMBER:
+                self.expr(ir.object)
+                if ir.computed:
+                    self.expr(ir.property)
+
+    def resolve_calls(self):
+        for call in self.calls:
+            caller = call.caller
+            if not isinstance(caller, IRIdent) or caller.value not in self.funcs or id(caller) in self.bind:
+                continue
+            for var, arg in zip(self.funcs[caller.value], call.args):
+                var.defs.append(("set", arg, None))
+    # endregion
+
+    # region Solving
+    def value_range(self, ir):
+        """Range of `ir` from the current variable ranges; None while unknown."""
+        match ir.kind:
+            case IRKind.CONST:
+                if type(ir.value) is int:
+                    return literal_range(ir.value)
+                return NOT_INT
+
+            case IRKind.IDENT:
+                var = self.bind.get(id(ir))
+                if var is None:
+                    return NOT_INT
+                if var.type_name not in TYPE_RANGES and var.type_name != "auto":
+                    return NOT_INT
+                return var.range
+
+            case IRKind.MEMBER:
+                if ir.computed:
+                    return self.value_range(ir.object)
+                return NOT_INT
+
+            case IRKind.CALL:
+                caller = ir.caller
+                if isinstance(caller, IRIdent) and id(caller) not in self.bind:
+                    return TYPE_RANGES.get(self.returns.get(caller.value), NOT_INT)
+                return NOT_INT
+
+            case IRKind.BINARY:
+                a = self.value_range(ir.left)
+                b = self.value_range(ir.right)
+                if a is NOT_INT or b is NOT_INT:
+                    return (0, 1) if ir.operator in ("==", "!=") else NOT_INT
+                if a is None or b is None:
+                    return None
+                return binary_range(ir.operator, a, b)
+
+            case IRKind.UNARY:
+                a = self.value_range(ir.operand)
+                if a is None or a is NOT_INT:
+                    return a
+                match ir.operator:
+                    case "-": return checked(-a[1], -a[0])
+                    case "+": return a
+                    case "!": return (0, 1)
+                    case "~": return (~a[1], ~a[0])
+                    case "++": return checked(a[0], a[1] + 1)
+                    case "--": return checked(a[0] - 1, a[1])
+
+        return NOT_INT
+
+    def def_range(self, var, d):
+        kind, expr, extra = d
+        match kind:
+            case "set":
+                r = self.value_range(expr)
+            case "+" | "-" | "step":
+                a = self.value_range(expr)
+                b = (extra, extra) if kind == "step" else self.value_range(extra)
+                if a is None or b is None:
+                    r = None
+                elif a is NOT_INT or b is NOT_INT:
+                    r = NOT_INT
+                else:
+                    r = binary_range("-" if kind == "-" else "+", a, b)
+            case "loop":
+                r = self.loop_range(expr, *extra)
+            case _:
+                r = var.bounds()
+        return r
+
+    def loop_range(self, start, op, bound, step):
+        a, b = self.value_range(start), self.value_range(bound)
+        if a is None or b is None:
+            return None
+        if a is NOT_INT or b is NOT_INT:
+            return NOT_INT
+        # The counter runs from its start to the first value past the bound
+        match op:
+            case "<": return checked(a[0], max(a[1], b[1] + step - 1))
+            case "<=": return checked(a[0], max(a[1], b[1] + step))
+            case ">": return checked(min(a[0], b[0] + step + 1), a[1])
+            case ">=": return checked(min(a[0], b[0] + step), a[1])
+
+    def solve(self):
+        changed = True
+        while changed:
+            changed = False
+            for var in self.vars:
+                r = var.range
+                for d in var.defs:
+                    r = join(r, self.def_range(var, d))
+                if r == var.range:
+                    continue
+                if r is NOT_INT:
+                    var.range = r
+                    changed = True
+                    continue
+                var.updates += 1
+                if var.updates > WIDEN_AFTER:
+                    r = join(r, var.bounds())
+                if var.type_name in TYPE_RANGES and not fits(r, var.bounds()) and not self.narrowable(var):
+                    r = var.bounds() # the stored value wraps to the type
+                if r != var.range:
+                    var.range = r
+                    changed = True
+    # endregion
+
+    # region Rewriting
+    def apply(self, program):
+        for var in self.vars:
+            if self.narrowable(var):
+                new_type = self.narrowest(var)
+                if new_type is not None and new_type != var.type_name:
+                    self.set_type(var, new_type)
+                    self.narrowed += 1
+                    var.type_name = new_type
+            elif var.type_name in TYPE_RANGES:
+                self.check_width(var)
+
+    def narrowable(self, var):
+        return var.type_name in NARROWABLE or getattr(var.decl, "inferred", False)
+
+    def narrowest(self, var):
+        r = var.range
+        if r is None or r is NOT_INT or var.name in self.opaque:
+            return None
+        for name in NARROW_TYPES:
+            if fits(r, TYPE_RANGES[name]):
+                return name
+        return "int"
+
+    def set_type(self, var, new_type):
+        if var.decl.kind == IRKind.VAR_DECL:
+            var.decl.explicit_type = new_type
+        else:
+            var.decl.declared_type = new_type
+
+    def check_width(self, var):
+        bounds = var.bounds()
+        short = next((k for k, v in INT_ANNOTATIONS.items() if v == var.type_name), var.type_name)
+        for d in var.defs:
+            r = self.def_range(var, d)
+            if r is None or r is NOT_INT:
+                continue
+            # Only a value that can never fit is reported, not one that merely might not
+            if d[0] == "loop":
+                # A constant bound the counter can't reach: the loop never ends
+                past_end = is_int_const(d[2][1]) and not fits(r, bounds)
+            else:
+                past_end = r[1] < bounds[0] or r[0] > bounds[1]
+            if past_end:
+                what = "loop counter" if d[0] == "loop" else "value"
+                self.warnings.append(
+                    f"{what} range [{r[0]}, {r[1]}] of '{var.name}' does not fit its type {short} [{bounds[0]}, {bounds[1]}]"
+                )
+    # endregion
+
+
+def narrow_types(program):
+    """Run RangeAnalysis over `program`; returns (program, warnings)."""
+    analysis = RangeAnalysis()
+    return analysis.run(program), analysis.warnings
@@ -1,9 +1,42 @@
 # nodes.py
 from typing import List
 
+class NodeKind:
+    # Integer tag per AST node class, used to index dispatch tables
+    PROGRAM = 0
+    VARIABLE_DECLARATION = 1
+    GROUP_DECLARATION = 2
+    PROPERTY = 3
+    OBJECT_DECLARATION = 4
+    FUNCTION_DECLARATION = 5
+    STATE_DECLARATION = 6
+    RETURN_STMT = 7
+    IF_STMT = 8
+    WHILE_STMT = 9
+    FOR_STMT = 10
+    IDENTIFIER = 11
+    NUMERIC_LITERAL = 12
+    STRING_LITERAL = 13
+    NULL_LITERAL = 14
+    INDEX_LITERAL = 15
+    OBJECT_LITERAL = 16
+    BINARY_EXPR = 17
+    UNARY_EXPR = 18
+    ASSIGNMENT_EXPR = 19
+    CALL_EXPR = 20
+    MEMBER_EXPR = 21
+    MODULE_NODE = 22
+    CPLICIT = 23
+    SPRITE_INSTANCE = 24
+
+    COUNT = 25
+
 class Stmt:
-    def __init__(self, type):
-        self.type = type
+    # Every node class sets `type` (its name, used by to_dict) and `kind`
+    # as class attributes; instances only carry the fields in __slots__.
+    __slots__ = ()
+    type = None
+    kind = None
 
     def to_dict(self):
         return {
@@ -11,13 +44,18 @@ class Stmt:
         }
     
 class Expr(Stmt):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 # Statements
 class Program(Stmt):
+    __slots__ = ('body',)
+    type = "Program"
+    kind = NodeKind.PROGRAM
+
     def __init__(self, body=None):
-        self.type = "Program"
         self.body : List[Stmt] = body if body is not None else []
 
     def to_dict(self):
@@ -27,8 +65,11 @@ class Program(Stmt):
         }
 
 class VariableDeclaration(Stmt):
+    __slots__ = ('name', 'value', 'is_const', 'explicit_type')
+    type = "VariableDeclaration"
+    kind = NodeKind.VARIABLE_DECLARATION
+
     def __init__(self, name: str, value: Expr=None, is_const: bool = False, explicit_type=None):
-        self.type = "VariableDeclaration"
         self.name = name
         self.value = value or NullLiteral() if value is None else value
         self.is_const = is_const
@@ -44,8 +85,11 @@ class VariableDeclaration(Stmt):
         }
 
 class GroupDeclaration(Stmt):
+    __slots__ = ('name', 'declared_type', 'size', 'items')
+    type = "GroupDeclaration"
+    kind = NodeKind.GROUP_DECLARATION
+
     def __init__(self, name, _type, size=0, items=None):
-        self.type = "GroupDeclaration"
         self.name = name
         self.declared_type = _type
         self.size = size
@@ -61,8 +105,11 @@ class GroupDeclaration(Stmt):
         }
 
 class Property:
+    __slots__ = ('name', 'd_type')
+    type = "Property"
+    kind = NodeKind.PROPERTY
+
     def __init__(self, name: str, type: str):
-        self.type = "Property"
         self.name = name
         self.d_type = type
 
@@ -74,8 +121,11 @@ class Property:
         }
     
 class ObjectDeclaration(Stmt):
+    __slots__ = ('name', 'properties')
+    type = "ObjectDeclaration"
+    kind = NodeKind.OBJECT_DECLARATION
+
     def __init__(self, name: str, properties: List[Property]):
-        self.type="ObjectDeclaration"
         self.name = name
         self.properties = properties
 
@@ -94,26 +144,36 @@ class ObjectDeclaration(Stmt):
         }
 
 class FunctionDeclaration(Stmt):
+    __slots__ = ('name', 'params', 'return_type', 'body', 'inline')
+    type = "FunctionDeclaration"
+    kind = NodeKind.FUNCTION_DECLARATION
+
     def __init__(self, name: str, params: List[Property],
-                 body: List[Stmt], return_type: str = None):
-        self.type = "FunctionDeclaration"
+                 body: List[Stmt], return_type: str = None, inline: bool = False):
         self.name = name
         self.params = params
         self.return_type = return_type if return_type is not None else "void"
         self.body = body if body is not None else []
+        self.inline = inline
     
     def to_dict(self):
-        return {
+        d = {
             "type": "FunctionDeclaration",
             "name": self.name,
             "params": [param.to_dict() for param in self.params],
             "return_type": self.return_type,
             "body": [stmt.to_dict() for stmt in self.body]
         }
+        if self.inline:
+            d["inline"] = True
+        return d
 
 class StateDeclaration(Stmt):
+    __slots__ = ('name', 'body')
+    type = "StateDeclaration"
+    kind = NodeKind.STATE_DECLARATION
+
     def __init__(self, name: str, body: List[Stmt]):
-        self.type = "StateDeclaration"
         self.name = name
         self.body = body if body is not None else []
     
@@ -125,9 +185,12 @@ class StateDeclaration(Stmt):
         }
 
 class ReturnStmt(Stmt):
+    __slots__ = ('value',)
+    type = "ReturnStmt"
+    kind = NodeKind.RETURN_STMT
+
     def __init__(self, value=None):
         self.value = value or NullLiteral()  # Default to null if no value is provided
-        self.type = "ReturnStmt"
 
     def to_dict(self):
         return {
@@ -136,8 +199,11 @@ class ReturnStmt(Stmt):
         }
     
 class IfStmt(Stmt):
+    __slots__ = ('conditions', 'then_branch', 'elif_branches', 'else_branch')
+    type = "IfStmt"
+    kind = NodeKind.IF_STMT
+
     def __init__(self, conditions, then_branch, elif_branches=None, else_branch=None):
-        self.type = "IfStmt"
         self.conditions = conditions
         self.then_branch = then_branch
         self.elif_branches = elif_branches if elif_branches is not None else []
@@ -153,8 +219,11 @@ class IfStmt(Stmt):
         }
     
 class WhileStmt(Stmt):
+    __slots__ = ('condition', 'body')
+    type = "WhileStmt"
+    kind = NodeKind.WHILE_STMT
+
     def __init__(self, condition, body):
-        self.type = "WhileStmt"
         self.condition = condition
         self.body = body
 
@@ -166,8 +235,11 @@ class WhileStmt(Stmt):
         }
     
 class ForStmt(Stmt):
+    __slots__ = ('init', 'condition', 'increment', 'body')
+    type = "ForStmt"
+    kind = NodeKind.FOR_STMT
+
     def __init__(self, init, condition, increment, body):
-        self.type = "ForStmt"
         self.init = init  # Typically a VariableDecleration or AssignmentExpr
         self.condition = condition
         self.increment = increment  # Usually an AssignmentExpr
@@ -186,8 +258,11 @@ class ForStmt(Stmt):
 
 # Expressions
 class Identifier(Expr):
+    __slots__ = ('value',)
+    type = "Identifier"
+    kind = NodeKind.IDENTIFIER
+
     def __init__(self, value):
-        self.type = "Identifier"
         self.value : str = value
 
     def to_dict(self):
@@ -200,8 +275,11 @@ class Identifier(Expr):
         return f"{self.value}"
 
 class NumericLiteral(Expr):
+    __slots__ = ('value',)
+    type = "NumericLiteral"
+    kind = NodeKind.NUMERIC_LITERAL
+
     def __init__(self, value):
-        self.type = "NumericLiteral"
         self.value : int = value
 
     def to_dict(self):
@@ -214,8 +292,11 @@ class NumericLiteral(Expr):
         return f"{self.value}"
 
 class StringLiteral(Expr):
+    __slots__ = ('value',)
+    type = "StringLiteral"
+    kind = NodeKind.STRING_LITERAL
+
     def __init__(self, value):
-        self.type = "StringLiteral"
         self.value : str = value
 
     def to_dict(self):
@@ -228,8 +309,11 @@ class StringLiteral(Expr):
         return f"'{self.value}'"
 
 class NullLiteral(Expr):
+    __slots__ = ('value',)
+    type = "NullLiteral"
+    kind = NodeKind.NULL_LITERAL
+
     def __init__(self):
-        self.type = "NullLiteral"
         self.value = "null"
 
     def to_dict(self):
@@ -242,9 +326,12 @@ class NullLiteral(Expr):
         return "undefined"
     
 class IndexLiteral(Expr):
+    __slots__ = ('index', 'value')
+    type = "IndexLiteral"
+    kind = NodeKind.INDEX_LITERAL
+
     def __init__(self, index, value):
         super().__init__()
-        self.type = "IndexLiteral"
         self.index = index
         self.value = value
 
@@ -259,8 +346,11 @@ class IndexLiteral(Expr):
         return f"{self.index}, {self.value}"
 
 class ObjectLiteral(Expr):
+    __slots__ = ('struct_name',)
+    type = "ObjectLiteral"
+    kind = NodeKind.OBJECT_LITERAL
+
     def __init__(self, name: str):
-        self.type="ObjectLiteral"
         self.struct_name = name
 
     def to_dict(self):
@@ -273,8 +363,11 @@ class ObjectLiteral(Expr):
         return f"{self.struct_name}"
     
 class BinaryExpr(Expr):
+    __slots__ = ('left', 'right', 'op')
+    type = "BinaryExpr"
+    kind = NodeKind.BINARY_EXPR
+
     def __init__(self, left, right, op):
-        self.type = "BinaryExpr"
         self.left = left
         self.right = right
         self.op = op
@@ -291,8 +384,11 @@ class BinaryExpr(Expr):
         return f"{self.left} {self.op} {self.right}"
 
 class UnaryExpr(Expr):
+    __slots__ = ('right', 'op', 'postfix')
+    type = "UnaryExpr"
+    kind = NodeKind.UNARY_EXPR
+
     def __init__(self, right, op, postfix=False):
-        self.type = "UnaryExpr"
         self.right = right
         self.op = op
         self.postfix = postfix
@@ -309,9 +405,12 @@ class UnaryExpr(Expr):
         return f"{self.op}{self.right}" 
     
 class AssignmentExpr(Expr):
+    __slots__ = ('assignee', 'value', 'op')
+    type = "AssignmentExpr"
+    kind = NodeKind.ASSIGNMENT_EXPR
+
     def __init__(self, assignee, value, op="="):
         super().__init__()
-        self.type = "AssignmentExpr"
         self.assignee = assignee # +=, =, -=, 
         self.value = value
         self.op = op
@@ -325,8 +424,11 @@ class AssignmentExpr(Expr):
         }
 
 class CallExpr(Expr):
+    __slots__ = ('caller', 'args')
+    type = "CallExpr"
+    kind = NodeKind.CALL_EXPR
+
     def __init__(self, caller, args = List[Expr]):
-        self.type = "CallExpr"
         self.caller = caller
         self.args = args
 
@@ -341,8 +443,11 @@ class CallExpr(Expr):
         return f"{self.caller}({', '.join(map(str, self.args))})"
 
 class MemberExpr(Expr):
+    __slots__ = ('object', 'property', 'computed')
+    type = "MemberExpr"
+    kind = NodeKind.MEMBER_EXPR
+
     def __init__(self, object, property, computed=False):
-        self.type ="MemberExpr"
         self.object = object
         self.property = property
         self.computed = computed  # Default to dot notation
@@ -363,9 +468,12 @@ class MemberExpr(Expr):
 
 
 class ModuleNode(Expr):
+    __slots__ = ('value',)
+    type = "ModuleNode"
+    kind = NodeKind.MODULE_NODE
+
 
     def __init__(self, value):
-        self.type = "ModuleNode"
         self.value : str = value
 
     def to_dict(self):
@@ -378,9 +486,14 @@ class ModuleNode(Expr):
         return f"'{self.value}'"
 
 class CPlicit(Stmt):
-    def __init__(self, code: str):
-        self.type = "CPlicit"
+    __slots__ = ('code', 'name', 'source')
+    type = "CPlicit"
+    kind = NodeKind.CPLICIT
+
+    def __init__(self, code: str, name: str = None, source: str = None):
         self.code = code
+        self.name = name # C symbol the code defines (sprite arrays), if known
+        self.source = source # sprite file the code was generated from, if any
 
     def to_dict(self):
         return {
@@ -392,8 +505,11 @@ class CPlicit(Stmt):
         return f"<CPlicit: {self.code[:30]}...>"
 
 class SpriteInstance(Stmt):
+    __slots__ = ('name', 'code', 'sprite_number')
+    type = "SpriteInstance"
+    kind = NodeKind.SPRITE_INSTANCE
+
     def __init__(self, name, code, spr_num):
-        self.type = "SpriteInstance"
         self.name = name
         self.code = code
         self.sprite_number = spr_num
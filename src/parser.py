@@ -1,6 +1,8 @@
 from src.nodes import *
-from src.tokens import Token, TokenType
+from src.tokens import Token, TokenType, TokenStream, token_name
 from src.sprite import Sprite
+from src.sprite_cache import sprite_cache
+from src.tilemap import TileMap
 import os
 
 ## Precedence Levels Reference, Lowest to Highest
@@ -21,33 +23,46 @@ PRECEDENCE = {
     "speical": {TokenType.SPRITE}
 }
 
+# Fixed-width integer annotations and the C types they stand for
+INT_ANNOTATIONS = {
+    "u8": "uint8_t",
+    "i8": "int8_t",
+    "u16": "uint16_t",
+    "i16": "int16_t",
+}
+
 class Parser:
     def __init__(self, tokens, file_path=None):
         self.tokens = tokens
-        self.current = 0
+        self.stream = TokenStream(tokens)
         self.errors = []
         self.file_path = file_path 
+        self.asset_files = [] # sprite and map paths read while parsing, for the build cache
 
+        # The stream's cursor methods are used directly; at()/adv() are the
+        # hottest calls in the parser and a wrapper method would double their cost.
+        self.at = self.stream.at   # get current token
+        self.adv = self.stream.adv # consume current token
+        self.peek = self.stream.peek # look ahead without consuming
+        self.mark = self.stream.mark
+        self.rewind = self.stream.rewind
 
-    def not_at_end(self):
-        return self.tokens[0].type != TokenType.EOF
-    
-    def at(self): # get current token
-        return self.tokens[0]
 
-    def adv(self): # consume current token
-        prev = self.tokens.pop(0)
-        return prev
+    def not_at_end(self):
+        return self.at().type != TokenType.EOF
     
     def expect(self, expected_type):
-        if self.at().type == expected_type:
+        tok = self.at()
+        if tok.type == expected_type:
             return self.adv()
         else:
-            self.errors.append(f"Expected token {expected_type} at line {self.at().ln}, col {self.at().col}, but found '{self.at().value}'")
+            self.errors.append(f"Expected token {token_name(expected_type)} at line {tok.ln}, col {tok.col}, but found '{tok.value}'")
     
     def get_type(self):
         if self.at().type == TokenType.IDENT:
             type_name = self.adv().value
+            if type_name in INT_ANNOTATIONS:
+                return INT_ANNOTATIONS[type_name]
             if type_name not in ("int", "str", "object", "sprite"):
                 self.errors.append(f"Unsupported type '{type_name}' at line {self.at().ln}, col {self.at().col}")
                 return None
@@ -85,6 +100,15 @@ class Parser:
             case TokenType.FUNC:
                 return self.parse_func_decl()
 
+            case TokenType.INLINE:
+                self.adv()
+                if self.at().type != TokenType.FUNC:
+                    self.errors.append(f"Expected 'func' after 'inline' at line {self.at().ln}, col {self.at().col}")
+                    return None
+                func = self.parse_func_decl()
+                func.inline = True
+                return func
+
             case TokenType.STATE:
                 return self.parse_state()
             
@@ -106,6 +130,9 @@ class Parser:
             case TokenType.SPRITE:
                 return self.parse_sprite()
 
+            case TokenType.MAP:
+                return self.parse_map()
+
             case default:
 
                 expr = self.parse_expr()
@@ -386,11 +413,33 @@ class Parser:
 
         sprite_name = os.path.splitext(os.path.basename(sprite_filename))[0]
 
-        sprite = Sprite.from_file(full_spr_path)
-
-        c_code = CPlicit(sprite.get_c_array(f"{sprite_name}"))
+        # Decoded sheets and their C arrays are memoized across files and builds
+        c_code = CPlicit(sprite_cache.get_c_array(full_spr_path, f"{sprite_name}"), sprite_name, full_spr_path)
+        self.asset_files.append(full_spr_path)
 
         return c_code
+
+    def parse_map(self):
+        tok = self.adv()
+        self.expect(TokenType.LPAREN)
+        map_filename = self.expect(TokenType.STRING).value
+        self.expect(TokenType.RPAREN)
+        self.expect(TokenType.SEMICOLON)
+
+        map_dir = os.path.dirname(self.file_path)
+        full_map_path = os.path.join(map_dir, map_filename)
+
+        map_name = os.path.splitext(os.path.basename(map_filename))[0]
+
+        try:
+            tile_map = TileMap.from_file(full_map_path)
+        except (OSError, ValueError) as e:
+            self.errors.append(f"Could not load map '{map_filename}' at line {tok.ln}, col {tok.col}: {e}")
+            return None
+        self.asset_files.append(full_map_path)
+
+        # Compressed as RLE or LZ, whichever is smaller; load_map(name) unpacks it into VRAM
+        return CPlicit(tile_map.get_c_array(map_name), map_name)
     
 
 
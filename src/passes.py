@@ -0,0 +1,181 @@
+# passes.py
+import time
+from src.constfold import fold_constants
+from src.deadcode import eliminate_dead_code
+from src.narrow import RangeAnalysis
+from src.cfg import build_cfgs
+from src.loops import optimize_loops, UNROLL_BUDGET
+from src.cse import eliminate_common_subexpressions
+from src.sprite_calls import optimize_sprite_calls
+from src.tilebank import build_tile_bank
+from src.inline import inline_functions, INLINE_BUDGET, INLINE_BUDGET_SIZE
+from src.strength import reduce_strength, MAX_MUL_TERMS
+from src.verify import verify_ir, IRVerifyError
+
+
+class PassContext:
+    """State shared by the passes of one compile."""
+    def __init__(self, optimize_size=False):
+        self.optimize_size = optimize_size
+        self.results = {}  # analysis name -> result, dropped whenever a transform runs
+        self.warnings = []
+        self.removed = []  # what deadcode took out, for --report-dead
+        self.tile_bank = None # TileBank the tilebank pass built, for --report-tiles
+        self.timings = []  # (pass name, seconds), in the order passes ran
+
+
+class IRPass:
+    """One step of the optimizer.
+
+    `run(program, ctx)` returns the analysis result for an "analysis"
+    pass, or the (possibly new) program for a "transform". Analyses named
+    in `requires` are run first if their result isn't current.
+    """
+    def __init__(self, name, kind, run, help, requires=()):
+        self.name = name
+        self.kind = kind
+        self.run = run
+        self.help = help
+        self.requires = requires
+
+
+# region Passes
+def inline_pass(program, ctx):
+    program, warnings = inline_functions(program, INLINE_BUDGET_SIZE if ctx.optimize_size else INLINE_BUDGET)
+    ctx.warnings.extend(warnings)
+    return program
+
+def constfold_pass(program, ctx):
+    return fold_constants(program)
+
+def deadcode_pass(program, ctx):
+    program, dropped = eliminate_dead_code(program)
+    ctx.removed.extend(dropped)
+    return program
+
+def loops_pass(program, ctx):
+    # Unrolling grows the code, so -Os only drops loops that never run
+    return optimize_loops(program, 0 if ctx.optimize_size else UNROLL_BUDGET)
+
+def cse_pass(program, ctx):
+    return eliminate_common_subexpressions(program)
+
+def ranges_pass(program, ctx):
+    return RangeAnalysis().analyze(program)
+
+def cfg_pass(program, ctx):
+    return build_cfgs(program)
+
+def narrow_pass(program, ctx):
+    # apply() is where values that can't fit a fixed-width type are reported
+    analysis = ctx.results["ranges"]
+    seen = len(analysis.warnings)
+    analysis.apply(program)
+    ctx.warnings.extend(analysis.warnings[seen:])
+    return program
+
+def strength_pass(program, ctx):
+    # Expanding a multiply into shifts and adds trades size for speed
+    return reduce_strength(program, 1 if ctx.optimize_size else MAX_MUL_TERMS)
+
+def tilebank_pass(program, ctx):
+    program, builder = build_tile_bank(program)
+    ctx.warnings.extend(builder.warnings)
+    ctx.tile_bank = builder.bank
+    return program
+
+def sprites_pass(program, ctx):
+    return optimize_sprite_calls(program)
+# endregion
+
+# Every pass, in the order a pipeline runs them
+PASSES = {p.name: p for p in (
+    IRPass("inline", "transform", inline_pass, "substitute small functions at their call sites"),
+    IRPass("constfold", "transform", constfold_pass, "fold and propagate integer constants"),
+    IRPass("deadcode", "transform", deadcode_pass, "remove unreachable code and unused declarations"),
+    IRPass("loops", "transform", loops_pass, "hoist loop-invariant code, count loops down to zero and unroll small ones"),
+    IRPass("cse", "transform", cse_pass, "compute repeated expressions once per basic block"),
+    IRPass("ranges", "analysis", ranges_pass, "value ranges of integer variables"),
+    IRPass("cfg", "analysis", cfg_pass, "basic blocks of every state and function"),
+    IRPass("narrow", "transform", narrow_pass, "narrow integers to the smallest type", requires=("ranges",)),
+    IRPass("strength", "transform", strength_pass, "turn multiply, divide and modulo by constants into shifts and masks"),
+    IRPass("tilebank", "transform", tilebank_pass, "share one deduplicated, flip-aware tile table between all sprites"),
+    IRPass("sprites", "transform", sprites_pass, "merge load_sprite calls that can share one tile copy"),
+)}
+
+TRANSFORMS = tuple(name for name, p in PASSES.items() if p.kind == "transform")
+
+# -O level -> transforms it runs
+OPT_LEVELS = {
+    "0": (),
+    "1": ("constfold", "deadcode"),
+    "2": ("inline", "constfold", "deadcode", "loops", "cse", "narrow", "strength", "sprites"),
+    "s": ("inline", "constfold", "deadcode", "loops", "cse", "narrow", "strength", "sprites"),
+}
+DEFAULT_OPT_LEVEL = "2"
+
+
+class PassManager:
+    """Runs a pipeline of IR passes between ast_to_ir and generate_c.
+
+    With `verify` set the IR is checked after every pass and an
+    IRVerifyError names the pass that broke it.
+    """
+    def __init__(self, names, verify=False, optimize_size=False):
+        self.names = [name for name in PASSES if name in names] # canonical order
+        self.verify = verify
+        self.optimize_size = optimize_size
+
+    @classmethod
+    def from_options(cls, level=DEFAULT_OPT_LEVEL, enable=(), disable=(), verify=False):
+        names = (set(OPT_LEVELS[level]) | set(enable)) - set(disable)
+        return cls(names, verify, optimize_size=level == "s")
+
+    def describe(self):
+        """Everything about the pipeline that affects its output, for cache keys."""
+        return ",".join(self.names) + (" size" if self.optimize_size else "")
+
+    def run(self, program):
+        ctx = PassContext(self.optimize_size)
+        if self.verify:
+            self.check(program, "ast_to_ir")
+        for name in self.names:
+            program = self.run_pass(PASSES[name], program, ctx)
+        return program, ctx
+
+    def analysis(self, name, program, ctx):
+        """Result of analysis `name` on `program`, running it if it isn't current."""
+        if name not in ctx.results:
+            self.run_pass(PASSES[name], program, ctx)
+        return ctx.results[name]
+
+    def run_pass(self, ir_pass, program, ctx):
+        for name in ir_pass.requires:
+            self.analysis(name, program, ctx)
+
+        start = time.perf_counter()
+        result = ir_pass.run(program, ctx)
+        ctx.timings.append((ir_pass.name, time.perf_counter() - start))
+
+        if ir_pass.kind == "analysis":
+            ctx.results[ir_pass.name] = result
+            return program
+        ctx.results.clear()
+        if self.verify:
+            self.check(result, ir_pass.name)
+        return result
+
+    def check(self, program, after):
+        problems = verify_ir(program)
+        if problems:
+            raise IRVerifyError(after, problems)
+
+
+def format_timings(timings):
+    total = sum(secs for _, secs in timings)
+    lines = ["GBSB pass timings:"]
+    for name, secs in timings:
+        share = secs / total if total > 0 else 0
+        lines.append(f"  {name:<12} {secs * 1000:9.3f} ms  {share:6.1%}")
+    lines.append(f"  {'total':<12} {total * 1000:9.3f} ms")
+    return "\n".join(lines)
@@ -1,51 +1,78 @@
+# sprite.py
+
+TILE_WIDTH = 8   # pixels per row, and bits per 2bpp plane byte
+TILE_BYTES = 16  # one 8x8 tile, 2 bits per pixel
+
+# Pixels are held one byte each, 0-3, row after row
+ASCII_TO_PIXELS = bytes.maketrans(b"0123", b"\x00\x01\x02\x03")
+PIXELS_TO_ASCII = bytes.maketrans(b"\x00\x01\x02\x03", b"0123")
+LOW_PLANE = bytes.maketrans(b"\x02\x03", b"\x00\x01")
+HIGH_PLANE = bytes.maketrans(b"\x01\x02\x03", b"\x00\x01\x01")
+
+# Plane byte -> its 8 bits, one per byte, leftmost pixel first; and back
+SPREAD = tuple(bytes((b >> bit) & 1 for bit in range(7, -1, -1)) for b in range(256))
+GATHER = {bits: b for b, bits in enumerate(SPREAD)}
+
+
+def pixels_from_rows(ascii_rows):
+    """Pixel buffer for rows of '0'-'3' digits."""
+    return "".join(ascii_rows).encode("ascii").translate(ASCII_TO_PIXELS)
+
+def rows_from_pixels(pixels):
+    """Rows of '0'-'3' digits for a pixel buffer."""
+    text = bytes(pixels).translate(PIXELS_TO_ASCII).decode("ascii")
+    return [text[i:i + TILE_WIDTH] for i in range(0, len(text), TILE_WIDTH)]
+
+
 class Sprite:
     def __init__(self, name="unnamed"):
         self.name = name
-        self.tiles = {}  # { tile_id: [ascii_rows] }
+        self.tiles = {}  # { tile_id: pixel bytes, 8 per row }
+
+    @staticmethod
+    def decode_tiles(tile_bytes):
+        """2bpp data (low plane byte, high plane byte per row) -> pixel buffer."""
+        tile_bytes = bytes(tile_bytes)
+        n = len(tile_bytes) // 2 * TILE_WIDTH
+        # Each pixel's low bit from its row's low byte, the high bit from the high byte;
+        # the two spread planes are combined lane by lane as one big integer
+        low = int.from_bytes(b"".join(map(SPREAD.__getitem__, tile_bytes[0::2])), "big")
+        high = int.from_bytes(b"".join(map(SPREAD.__getitem__, tile_bytes[1::2])), "big")
+        return bytearray((low | high << 1).to_bytes(n, "big"))
+
+    @staticmethod
+    def encode_tiles(pixels):
+        """Pixel buffer -> 2bpp data, two bytes per row of 8 pixels."""
+        pixels = bytes(pixels)
+        rows = range(0, len(pixels), TILE_WIDTH)
+        low = pixels.translate(LOW_PLANE)
+        high = pixels.translate(HIGH_PLANE)
+        out = bytearray(len(rows) * 2)
+        out[0::2] = bytes(GATHER[low[i:i + TILE_WIDTH]] for i in rows)
+        out[1::2] = bytes(GATHER[high[i:i + TILE_WIDTH]] for i in rows)
+        return out
 
     @staticmethod
     def decode_tile(tile_bytes):
-        output = []
-        for i in range(0, len(tile_bytes), 2):
-            low = tile_bytes[i]
-            high = tile_bytes[i + 1]
-            row = ''
-            for bit in range(7, -1, -1):
-                lo_bit = (low >> bit) & 1
-                hi_bit = (high >> bit) & 1
-                val = (hi_bit << 1) | lo_bit
-                row += str(val)
-            output.append(row)
-        return output
+        return Sprite.decode_tiles(tile_bytes)
 
     @staticmethod
-    def encode_tile(ascii_rows):
-        tile_bytes = []
-        for row in ascii_rows:
-            low_byte = 0
-            high_byte = 0
-            for i, ch in enumerate(row):
-                val = int(ch)  # 0–3
-                lo_bit = val & 1
-                hi_bit = (val >> 1) & 1
-                bit_pos = 7 - i
-                low_byte |= (lo_bit << bit_pos)
-                high_byte |= (hi_bit << bit_pos)
-            tile_bytes.append(low_byte)
-            tile_bytes.append(high_byte)
-        return tile_bytes
-
-    def add_tile(self, tile_id, ascii_rows):
-        self.tiles[tile_id] = ascii_rows
+    def encode_tile(pixels):
+        if not isinstance(pixels, (bytes, bytearray, memoryview)):
+            pixels = pixels_from_rows(pixels)
+        return Sprite.encode_tiles(pixels)
+
+    def add_tile(self, tile_id, pixels):
+        if not isinstance(pixels, (bytes, bytearray, memoryview)):
+            pixels = pixels_from_rows(pixels)
+        self.tiles[tile_id] = bytes(pixels)
 
     def get_tile_no(self):
         pass
 
     def get_tile_bytes(self):
-        result = []
-        for tile_id in sorted(self.tiles.keys()):
-            result.extend(self.encode_tile(self.tiles[tile_id]))
-        return result
+        # One encode over the whole sheet rather than one per tile
+        return self.encode_tiles(b"".join(self.tiles[tile_id] for tile_id in sorted(self.tiles.keys())))
 
     def print_ascii(self):
         pixel_map = {
@@ -56,12 +83,26 @@ class Sprite:
         }
         for tile_id in sorted(self.tiles.keys()):
             print(f"Tile {tile_id}:")
-            for row in self.tiles[tile_id]:
+            for row in rows_from_pixels(self.tiles[tile_id]):
                 print("".join(pixel_map[ch] for ch in row))
             print()
 
+    def to_text(self, fields=()):
+        """The .gbspr text form; `fields` are extra (key, value) header lines, which from_file ignores."""
+        lines = ["type: sprite", f"name: {self.name}"]
+        lines.extend(f"{key}: {value}" for key, value in fields)
+        lines.extend(("", "tiles:"))
+        for tile_id in sorted(self.tiles.keys()):
+            lines.append(f"{tile_id}:")
+            lines.extend(rows_from_pixels(self.tiles[tile_id]))
+            lines.append("")
+        return "\n".join(lines)
+
     def get_c_array(self, varname="tile_data"):
-        tile_bytes = self.get_tile_bytes()
+        return self.format_c_array(self.get_tile_bytes(), varname)
+
+    @staticmethod
+    def format_c_array(tile_bytes, varname="tile_data"):
         code = ''
         code += f"unsigned char {varname}[] = {{"
         code += "  " + ", ".join(f"0x{b:02X}" for b in tile_bytes)
@@ -83,14 +124,14 @@ class Sprite:
                 sprite.name = line.split(':', 1)[1].strip()
             elif line.endswith(':') and line[:-1].isdigit():
                 if current_tile is not None:
-                    sprite.tiles[current_tile] = tile_rows
+                    sprite.add_tile(current_tile, tile_rows)
                 current_tile = int(line[:-1])
                 tile_rows = []
-            elif all(c in '0123' for c in line) and len(line) == 8:
+            elif len(line) == 8 and not line.strip('0123'):
                 tile_rows.append(line)
 
         if current_tile is not None:
-            sprite.tiles[current_tile] = tile_rows
+            sprite.add_tile(current_tile, tile_rows)
 
         return sprite
 
@@ -0,0 +1,175 @@
+# sprite_bin.py
+import os
+import mmap
+import struct
+import hashlib
+from src.sprite import Sprite
+
+COMPILED_EXT = ".gbsprc"
+MAGIC = b"GBSP"
+FORMAT = 1
+
+# magic, format, name length, tile count, sha256 of the text sheet it was compiled from
+HEADER = struct.Struct("<4sHHI32s")
+# tile id, offset into the tile data, length in bytes
+INDEX_ENTRY = struct.Struct("<III")
+
+
+def compiled_path(path):
+    """Where `gbsb spr --compile` puts the compiled form of a text sheet."""
+    return os.path.splitext(path)[0] + COMPILED_EXT
+
+def is_compiled(path):
+    return path.endswith(COMPILED_EXT)
+
+def compile_sprite(sprite, source_digest=bytes(32)):
+    """The compiled form of `sprite`: header, name, tile index, then the raw 2bpp data of each tile in id order."""
+    name = sprite.name.encode("utf-8")
+    index = []
+    data = []
+    offset = 0
+    try:
+        for tile_id in sorted(sprite.tiles):
+            tile = Sprite.encode_tiles(sprite.tiles[tile_id])
+            index.append(INDEX_ENTRY.pack(tile_id, offset, len(tile)))
+            data.append(tile)
+            offset += len(tile)
+        header = HEADER.pack(MAGIC, FORMAT, len(name), len(index), source_digest)
+    except struct.error as e:
+        raise ValueError(f"sprite '{sprite.name}' does not fit the compiled format: {e}")
+    return b"".join([header, name, *index, *data])
+
+def compile_file(path, out_path=None):
+    """Compile the text sheet at `path`; returns the path written."""
+    out_path = out_path or compiled_path(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).digest()
+    data = compile_sprite(Sprite.from_file(path), digest)
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, out_path) # atomic, so a build never maps half a sheet
+    return out_path
+
+
+class CompiledSprite:
+    """A compiled sprite sheet, read straight out of its buffer.
+
+    Opening one only reads the header and tile index; tile data stays in
+    the (usually memory-mapped) file and `tile()` hands out memoryview
+    slices of it, so looking up one tile of a large sheet copies nothing.
+    Slices must not be used after `close()`; while any are still alive
+    the mapping itself stays open until they are gone.
+    """
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        self.map = None
+        try:
+            self.read_index()
+        except ValueError:
+            self.buf.release()
+            raise
+
+    def read_index(self):
+        try:
+            magic, version, name_len, self.count, self.source_digest = HEADER.unpack_from(self.buf)
+        except struct.error:
+            raise ValueError("compiled sprite is truncated")
+        if magic != MAGIC:
+            raise ValueError("not a compiled sprite")
+        if version != FORMAT:
+            raise ValueError(f"compiled sprite format {version} is not supported (expected {FORMAT})")
+
+        pos = HEADER.size
+        self.name = bytes(self.buf[pos:pos + name_len]).decode("utf-8")
+        pos += name_len
+        data_start = pos + self.count * INDEX_ENTRY.size
+        if data_start > len(self.buf):
+            raise ValueError("compiled sprite is truncated")
+        # Entries are sorted by tile id and searched in place, never loaded whole
+        self.index = self.buf[pos:data_start]
+        self.data = self.buf[data_start:]
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                raise ValueError(f"{path}: compiled sprite is empty")
+        try:
+            sprite = cls(mapped)
+        except ValueError as e:
+            mapped.close()
+            raise ValueError(f"{path}: {e}")
+        sprite.map = mapped
+        return sprite
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tile_ids(self):
+        return [entry[0] for entry in INDEX_ENTRY.iter_unpack(self.index)]
+
+    def tile(self, tile_id):
+        """2bpp data of one tile, without copying."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, offset, length = INDEX_ENTRY.unpack_from(self.index, mid * INDEX_ENTRY.size)
+            if found < tile_id:
+                lo = mid + 1
+            elif found > tile_id:
+                hi = mid
+            else:
+                if offset + length > len(self.data):
+                    raise ValueError(f"tile {tile_id} of compiled sprite '{self.name}' is truncated")
+                return self.data[offset:offset + length]
+        raise KeyError(tile_id)
+
+    def tile_bytes(self):
+        """2bpp data of every tile in id order, as get_tile_bytes gives it."""
+        return self.data
+
+    def to_sprite(self):
+        sprite = Sprite(self.name)
+        for tile_id in self.tile_ids():
+            sprite.add_tile(tile_id, Sprite.decode_tiles(self.tile(tile_id)))
+        return sprite
+
+    def close(self):
+        self.index.release()
+        self.data.release()
+        self.buf.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass # a tile slice is still held; the mapping goes when it does
+            self.map = None
+
+
+def load_compiled(path, source=None):
+    """The compiled sheet at `path`, or None if it is missing, unreadable or was built from other text than `source`."""
+    try:
+        sprite = CompiledSprite.open(path)
+    except (OSError, ValueError):
+        return None
+    if source is not None and sprite.source_digest != hashlib.sha256(source).digest():
+        sprite.close()
+        return None
+    return sprite
+
+def load_sprite(path):
+    """A Sprite from either a text or a compiled sheet."""
+    if is_compiled(path):
+        with CompiledSprite.open(path) as compiled:
+            return compiled.to_sprite()
+    return Sprite.from_file(path)
@@ -0,0 +1,152 @@
+# sprite_cache.py
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+from src.sprite import Sprite
+from src.sprite_bin import CompiledSprite, compiled_path, is_compiled, load_compiled
+from src.cache import compiler_version
+
+DEFAULT_BUDGET = 32 * 1024 * 1024 # bytes of tile data + C text kept in memory
+
+
+class SpriteEntry:
+    def __init__(self, digest, name, tile_bytes):
+        self.digest = digest
+        self.name = name
+        self.tile_bytes = tile_bytes
+        self.c_arrays = {} # { varname: C text }
+
+    def size(self):
+        return len(self.tile_bytes) + sum(len(code) for code in self.c_arrays.values())
+
+
+class SpriteCache:
+    """Memoizes decoded sprites and their generated C arrays.
+
+    Lookups go by (path, mtime, size) first. When those change the file is
+    re-read and matched by content hash, so a touched or copied sheet is not
+    decoded again. Compiled sheets (.gbsprc) are read as they are, and a
+    text sheet with an up-to-date compiled copy next to it is not parsed. With `disk_dir` set, encoded tiles are also kept on disk
+    between runs. The in-memory entries are evicted least recently used once
+    they exceed `max_bytes`.
+    """
+    def __init__(self, max_bytes=DEFAULT_BUDGET, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.by_stat = {}            # (path, mtime_ns, size) -> digest
+        self.entries = OrderedDict() # digest -> SpriteEntry, oldest first
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stat_key = (path, st.st_mtime_ns, st.st_size)
+
+        digest = self.by_stat.get(stat_key)
+        if digest is not None and digest in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(digest)
+            return self.entries[digest]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        h = hashlib.sha256(compiler_version().encode())
+        h.update(data)
+        digest = h.hexdigest()
+        self.by_stat[stat_key] = digest
+
+        entry = self.entries.get(digest)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(digest)
+            return entry
+
+        entry = self.load_disk(digest)
+        if entry is None:
+            self.misses += 1
+            entry = self.decode(path, data, digest)
+            self.store_disk(entry)
+        else:
+            self.hits += 1
+
+        self.entries[digest] = entry
+        self.used += entry.size()
+        self.evict()
+        return entry
+
+    def decode(self, path, data, digest):
+        if is_compiled(path):
+            with CompiledSprite(data) as sprite:
+                return SpriteEntry(digest, sprite.name, bytes(sprite.tile_bytes()))
+        # A compiled copy made from this exact text saves parsing it
+        compiled = load_compiled(compiled_path(path), data)
+        if compiled is not None:
+            with compiled:
+                return SpriteEntry(digest, compiled.name, bytes(compiled.tile_bytes()))
+        sprite = Sprite.from_file(path)
+        return SpriteEntry(digest, sprite.name, bytes(sprite.get_tile_bytes()))
+
+    def get_tile_bytes(self, path):
+        return self.get(path).tile_bytes
+
+    def get_c_array(self, path, varname="tile_data"):
+        entry = self.get(path)
+        code = entry.c_arrays.get(varname)
+        if code is None:
+            code = Sprite.format_c_array(entry.tile_bytes, varname)
+            entry.c_arrays[varname] = code
+            self.used += len(code)
+            self.evict(keep=entry.digest)
+        return code
+
+    def evict(self, keep=None):
+        while self.used > self.max_bytes and len(self.entries) > 1:
+            digest, entry = next(iter(self.entries.items()))
+            if digest == keep:
+                self.entries.move_to_end(digest)
+                continue
+            del self.entries[digest]
+            self.used -= entry.size()
+
+    def clear(self):
+        self.by_stat.clear()
+        self.entries.clear()
+        self.used = 0
+
+    def disk_path(self, digest):
+        return os.path.join(self.disk_dir, digest[:2], digest + ".spr")
+
+    def load_disk(self, digest):
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self.disk_path(digest), "rb") as f:
+                name, tile_bytes = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError):
+            return None
+        return SpriteEntry(digest, name, tile_bytes)
+
+    def store_disk(self, entry):
+        if self.disk_dir is None:
+            return
+        path = self.disk_path(entry.digest)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump((entry.name, entry.tile_bytes), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+# Process-wide cache used by the parser; gbsb reconfigures it from the CLI
+sprite_cache = SpriteCache()
+
+def configure_sprite_cache(max_bytes=DEFAULT_BUDGET, disk_dir=None):
+    sprite_cache.max_bytes = max_bytes
+    sprite_cache.disk_dir = disk_dir
+    sprite_cache.evict()
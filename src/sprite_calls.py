@@ -0,0 +1,121 @@
+# sprite_calls.py
+from src.ir_nodes import *
+from src.constfold import is_int_const
+
+TILE_BYTES = 16 # one 8x8 tile, 2 bits per pixel
+
+
+def sprite_call(ir, name, nargs):
+    """True for `name(array[index], ...)` with `nargs` arguments, as the C emitter lowers it."""
+    return (ir.kind == IRKind.CALL and isinstance(ir.caller, IRIdent) and ir.caller.value == name
+            and len(ir.args) == nargs and isinstance(ir.args[0], IRMember) and ir.args[0].computed
+            and isinstance(ir.args[0].object, IRIdent))
+
+def constant_load(ir):
+    """(array, index, count) for `load_sprite(array[index], count)` with constant index and count."""
+    if not sprite_call(ir, "load_sprite", 2):
+        return None
+    index, count = ir.args[0].property, ir.args[1]
+    if not (is_int_const(index) and is_int_const(count)) or index.value < 0 or count.value <= 0:
+        return None
+    return ir.args[0].object.value, index.value, count.value
+
+def call(name, *args):
+    return IRCall(IRIdent(name), list(args))
+
+def tile_data(array, tile):
+    if tile == 0:
+        return IRIdent(array)
+    return IRBinary("+", IRIdent(array), IRConst(tile * TILE_BYTES))
+
+
+class SpriteCallOptimizer:
+    """Merges load_sprite calls whose tile copies can be done as one.
+
+    `load_sprite(arr[i], n)` copies the first n tiles of arr into VRAM
+    from tile i, then points sprite i at tile i + 1. Consecutive loads on
+    one array share a single `set_sprite_data(first, total, ...)` when
+    that one copy leaves VRAM exactly as the separate copies would: the
+    tiles they write must form one unbroken stretch, each slot holding
+    the array tile that lands there in order. Loads that don't line up
+    keep their own copies, so their tile counts never change.
+    """
+    def __init__(self):
+        self.coalesced = 0
+
+    def run(self, program):
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                stmt.body = self.stmts(stmt.body)
+        return program
+
+    def stmts(self, body):
+        new = []
+        run = []
+        for stmt in body:
+            load = constant_load(stmt)
+            if load is not None and (not run or run[0][0][0] == load[0]):
+                run.append((load, stmt))
+                continue
+            new.extend(self.flush(run))
+            run = [(load, stmt)] if load is not None else []
+            if load is None:
+                self.nested(stmt)
+                new.append(stmt)
+        new.extend(self.flush(run))
+        return new
+
+    def nested(self, ir):
+        match ir.kind:
+            case IRKind.IF:
+                ir.then_branch = self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.nested(elif_ir)
+                ir.else_branch = self.stmts(ir.else_branch)
+            case IRKind.WHILE | IRKind.FOR:
+                ir.body = self.stmts(ir.body)
+
+    def flush(self, run):
+        """The loads of `run` (all on one array), each group that shares one copy merged."""
+        new = []
+        group, vram = [], {}
+        for load, stmt in run:
+            merged = dict(vram)
+            for i in range(load[2]):
+                merged[load[1] + i] = i
+            if group and stretch(merged) is None:
+                new.extend(self.merge(group, vram))
+                group, merged = [], {load[1] + i: i for i in range(load[2])}
+            group.append((load, stmt))
+            vram = merged
+        new.extend(self.merge(group, vram))
+        return new
+
+    def merge(self, group, vram):
+        if len(group) < 2:
+            return [stmt for _, stmt in group]
+        array = group[0][0][0]
+        first, total, tile = stretch(vram)
+        stmts = [call("set_sprite_data", IRConst(first), IRConst(total), tile_data(array, tile))]
+        pointed = []
+        for (_, index, _), _ in group:
+            if index not in pointed:
+                pointed.append(index)
+        stmts.extend(call("set_sprite_tile", IRConst(index), IRConst(index + 1)) for index in pointed)
+        self.coalesced += len(group)
+        return stmts
+
+
+def stretch(vram):
+    """(first slot, count, first array tile) when the VRAM slots written are
+    consecutive and hold consecutive array tiles, else None."""
+    first = min(vram)
+    tile = vram[first]
+    for slot in range(first, first + len(vram)):
+        if vram.get(slot) != tile + slot - first:
+            return None
+    return first, len(vram), tile
+
+
+def optimize_sprite_calls(program):
+    return SpriteCallOptimizer().run(program)
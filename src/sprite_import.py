@@ -0,0 +1,122 @@
+# sprite_import.py
+import os
+import hashlib
+from src.image import load_image
+from src.sprite import Sprite, TILE_WIDTH
+
+IMAGE_EXTS = (".png", ".pgm")
+IMPORT_FORMAT = 1 # bump when the conversion changes, so every image is converted again
+SHADES = 4
+
+
+class ImportResult:
+    def __init__(self, source, output, status, message=""):
+        self.source = source
+        self.output = output
+        self.status = status # "converted", "unchanged" or "failed"
+        self.message = message
+
+
+def shade_table(luma, opaque=None):
+    """Luminance -> GB shade (0 lightest ... 3 darkest) for the levels the image uses.
+
+    Brightness is cut into equal bands, one per shade. If that would merge
+    two of the image's gray levels and there are few enough of them, they
+    are instead spread over the shades from light to dark, so a two-color
+    image keeps both colors. When the image has transparent pixels, those
+    take shade 0 and the opaque ones share shades 1-3.
+    """
+    if opaque is None or all(opaque):
+        levels, first = set(luma), 0
+    else:
+        levels, first = {v for v, keep in zip(luma, opaque) if keep}, 1
+    shades = SHADES - first
+    table = bytearray(SHADES - 1 - v * shades // 256 for v in range(256))
+    if len({table[v] for v in levels}) < len(levels) <= shades:
+        ranked = sorted(levels, reverse=True)
+        for rank, level in enumerate(ranked):
+            table[level] = first + (rank * (shades - 1) + (len(ranked) - 1) // 2) // (len(ranked) - 1)
+    return bytes(table)
+
+def quantize(image):
+    """Pixel buffer of shades 0-3; transparent pixels become 0, which sprites don't draw."""
+    opaque = None
+    if image.alpha is not None:
+        opaque = image.alpha.translate(bytes(0 if a < 128 else 0xFF for a in range(256)))
+    pixels = image.luma.translate(shade_table(image.luma, opaque))
+    if opaque is not None:
+        n = len(pixels)
+        pixels = (int.from_bytes(pixels, "big") & int.from_bytes(opaque, "big")).to_bytes(n, "big")
+    return pixels
+
+def image_to_sprite(image, name):
+    """A Sprite with one tile per 8x8 block of the image, left to right then top to bottom, numbered from 1."""
+    if image.width % TILE_WIDTH or image.height % TILE_WIDTH or not image.width or not image.height:
+        raise ValueError(f"image is {image.width}x{image.height}; sprite sheets must be a multiple of 8 pixels each way")
+    pixels = quantize(image)
+    width = image.width
+    sprite = Sprite(name)
+    tile_id = 1
+    for top in range(0, image.height, TILE_WIDTH):
+        for left in range(0, width, TILE_WIDTH):
+            sprite.add_tile(tile_id, b"".join(pixels[(top + row) * width + left:(top + row) * width + left + TILE_WIDTH]
+                                              for row in range(TILE_WIDTH)))
+            tile_id += 1
+    return sprite
+
+def source_digest(data):
+    h = hashlib.sha256(f"import:{IMPORT_FORMAT}".encode())
+    h.update(data)
+    return h.hexdigest()
+
+def recorded_digest(path):
+    """The `source:` hash a previous import wrote into `path`, if any."""
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("source:"):
+                    return line.split(":", 1)[1].strip()
+                if line.strip() == "tiles:":
+                    break
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+def import_image(source, output, force=False):
+    """Convert one image to a .gbspr, unless `output` was already made from the same image."""
+    try:
+        with open(source, "rb") as f:
+            data = f.read()
+        digest = source_digest(data)
+        if not force and recorded_digest(output) == digest:
+            return ImportResult(source, output, "unchanged")
+
+        image = load_image(source)
+        sprite = image_to_sprite(image, os.path.splitext(os.path.basename(output))[0])
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        tmp = f"{output}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(sprite.to_text([("source", digest)]))
+            f.write("\n")
+        os.replace(tmp, output)
+        return ImportResult(source, output, "converted", f"{len(sprite.tiles)} tiles")
+    except (OSError, ValueError) as e:
+        message = str(e)
+        if source not in message:
+            message = f"{source}: {message}"
+        return ImportResult(source, output, "failed", message)
+
+def collect_images(paths):
+    """Expand files and directories into (image, output-relative .gbspr path) pairs."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTS):
+                        src = os.path.join(root, name)
+                        found.append((src, os.path.splitext(os.path.relpath(src, path))[0] + ".gbspr"))
+        else:
+            found.append((path, os.path.splitext(os.path.basename(path))[0] + ".gbspr"))
+    return found
@@ -0,0 +1,212 @@
+# strength.py
+from copy import deepcopy
+from src.ir_nodes import *
+from src.constfold import INT_TYPES, is_int_const
+
+# The SM83 has no multiply or divide; SDCC calls a library routine for every
+# `*`, `/` and `%` on an int. These are rewritten into shifts, adds and masks.
+
+# A constant multiply is only expanded while it takes at most this many
+# shifted copies of the operand
+MAX_MUL_TERMS = 2
+
+def is_pure(ir):
+    """True if evaluating `ir` twice is the same as evaluating it once."""
+    match ir.kind:
+        case IRKind.CONST | IRKind.IDENT:
+            return True
+        case IRKind.MEMBER:
+            return is_pure(ir.object) and (not ir.computed or is_pure(ir.property))
+    return False
+
+def log2(n):
+    """k if n == 2**k for k >= 1, else None."""
+    if n > 1 and n & (n - 1) == 0:
+        return n.bit_length() - 1
+    return None
+
+def shl(ir, k):
+    return ir if k == 0 else IRBinary("<<", ir, IRConst(k))
+
+def mul_terms(n):
+    """Split n into shifts: [(sign, shift), ...] with n == sum(sign << shift)."""
+    plus = [(1, bit) for bit in range(n.bit_length()) if n >> bit & 1]
+    # 2^a - 2^b is shorter for runs of ones, e.g. 7 == 8 - 1
+    low = (n & -n).bit_length() - 1
+    top = (n + (1 << low)).bit_length() - 1
+    if (1 << top) - (1 << low) == n and len(plus) > 2:
+        return [(1, top), (-1, low)]
+    return plus
+
+def sign_bias(ir, mask, bits):
+    # (x >> (bits - 1)) is -1 for negative x and 0 otherwise, so this is
+    # `mask` for negative x: the correction that makes >> round towards zero
+    return IRBinary("&", IRBinary(">>", deepcopy(ir), IRConst(bits - 1)), IRConst(mask))
+
+
+class StrengthReducer:
+    """Rewrites `*`, `/` and `%` by constants into cheaper operations.
+
+    Multiplying by 2^k becomes a shift, and other small constants become
+    a sum of at most `max_terms` shifts. Dividing by 2^k becomes a shift
+    and modulo a mask; when the left operand may be negative a sign
+    correction is added so the result still rounds towards zero like C.
+    An operand is treated as non-negative when its declared type is
+    unsigned; a division or modulo whose operand type isn't known is left
+    alone. Rewrites that repeat an operand only happen when it has no
+    side effects.
+    """
+    def __init__(self, max_terms=MAX_MUL_TERMS):
+        self.scopes = [{}] # name -> declared type
+        self.objects = {}  # obj type name -> { field: declared type }
+        self.max_terms = max_terms
+        self.reduced = 0
+
+    def run(self, program):
+        self.stmts(program.body)
+        return program
+
+    def type_of(self, ir):
+        if ir.kind == IRKind.MEMBER:
+            if ir.computed:
+                return self.type_of(ir.object) # group element
+            if ir.property.kind != IRKind.IDENT:
+                return None
+            return self.objects.get(self.type_of(ir.object), {}).get(ir.property.value)
+        if ir.kind != IRKind.IDENT:
+            return None
+        for scope in reversed(self.scopes):
+            if ir.value in scope:
+                return scope[ir.value]
+        return None
+
+    def int_type(self, ir):
+        """(bits, signed) of an integer operand, or None when its type isn't known."""
+        if is_int_const(ir):
+            return (16, ir.value < 0)
+        return INT_TYPES.get(self.type_of(ir))
+
+    def stmts(self, body, new_scope=True):
+        if new_scope:
+            self.scopes.append({})
+        for stmt in body:
+            self.stmt(stmt)
+        if new_scope:
+            self.scopes.pop()
+
+    def stmt(self, ir):
+        match ir.kind:
+            case IRKind.VAR_DECL:
+                ir.value = self.expr(ir.value)
+                self.scopes[-1][ir.name] = ir.explicit_type
+
+            case IRKind.GRP_DECL:
+                self.scopes[-1][ir.name] = ir.declared_type
+
+            case IRKind.FUNC_DECL:
+                self.scopes.append({param.name: param.declared_type for param in ir.params})
+                self.stmts(ir.body, new_scope=False)
+                self.scopes.pop()
+
+            case IRKind.STATE:
+                self.stmts(ir.body)
+
+            case IRKind.IF:
+                ir.conditions = [self.expr(cond) for cond in ir.conditions]
+                self.stmts(ir.then_branch)
+                for elif_ir in ir.elif_branches:
+                    self.stmt(elif_ir)
+                self.stmts(ir.else_branch)
+
+            case IRKind.WHILE:
+                ir.condition = self.expr(ir.condition)
+                self.stmts(ir.body)
+
+            case IRKind.FOR:
+                self.scopes.append({})
+                self.stmt(ir.init)
+                ir.condition = self.expr(ir.condition)
+                ir.increment = self.expr(ir.increment)
+                self.stmts(ir.body)
+                self.scopes.pop()
+
+            case IRKind.RETURN:
+                ir.value = self.expr(ir.value)
+
+            case IRKind.OBJ_DECL:
+                self.objects[ir.name] = {prop.name: prop.declared_type for prop in ir.properties}
+
+            case IRKind.MODULE | IRKind.CBLOCK | IRKind.NULL:
+                pass
+
+            case _:
+                self.expr(ir)
+
+    def expr(self, ir):
+        match ir.kind:
+            case IRKind.BINARY:
+                ir.left = self.expr(ir.left)
+                ir.right = self.expr(ir.right)
+                return self.reduce(ir)
+
+            case IRKind.UNARY:
+                ir.operand = self.expr(ir.operand)
+
+            case IRKind.ASSIGNMENT:
+                ir.assignee = self.expr(ir.assignee)
+                ir.value = self.expr(ir.value)
+
+            case IRKind.CALL:
+                ir.args = [self.expr(arg) for arg in ir.args]
+
+            case IRKind.MEMBER:
+                ir.object = self.expr(ir.object)
+                if ir.computed:
+                    ir.property = self.expr(ir.property)
+
+        return ir
+
+    def reduce(self, ir):
+        op, left, right = ir.operator, ir.left, ir.right
+        if op == "*" and is_int_const(left) and not is_int_const(right):
+            left, right = right, left
+        if op not in ("*", "/", "%") or not is_int_const(right) or right.value <= 0:
+            return ir
+
+        n = right.value
+        k = log2(n)
+        new = None
+        if op == "*":
+            if n == 1:
+                new = left
+            elif k is not None:
+                new = shl(left, k)
+            elif is_pure(left):
+                terms = mul_terms(n)
+                if len(terms) <= self.max_terms:
+                    new = shl(left, terms[0][1])
+                    for sign, shift in terms[1:]:
+                        new = IRBinary("+" if sign > 0 else "-", new, shl(deepcopy(left), shift))
+        elif op in ("/", "%") and k is not None:
+            int_type = self.int_type(left)
+            if int_type is None:
+                pass # an unsigned operand must not get the signed correction, so guess neither
+            elif not int_type[1]:
+                new = IRBinary(">>", left, IRConst(k)) if op == "/" else IRBinary("&", left, IRConst(n - 1))
+            elif is_pure(left):
+                bias = sign_bias(left, n - 1, int_type[0])
+                if op == "/":
+                    new = IRBinary(">>", IRBinary("+", left, bias), IRConst(k))
+                else:
+                    # x - (x rounded towards zero to a multiple of n)
+                    rounded = IRBinary("&", IRBinary("+", left, bias), IRConst(-n))
+                    new = IRBinary("-", deepcopy(left), rounded)
+
+        if new is None:
+            return ir
+        self.reduced += 1
+        return new
+
+
+def reduce_strength(program, max_terms=MAX_MUL_TERMS):
+    return StrengthReducer(max_terms).run(program)
@@ -0,0 +1,212 @@
+# tilebank.py
+from src.ir_nodes import *
+from src.sprite import Sprite, TILE_BYTES
+from src.sprite_cache import sprite_cache
+from src.sprite_calls import sprite_call, constant_load, call
+from src.deadcode import referenced_names
+
+# OAM attribute bits that mirror a sprite's tile (S_FLIPX / S_FLIPY in GBDK)
+FLIP_X = 0x20
+FLIP_Y = 0x40
+SPRITE_TILE_SLOTS = 256 # a sprite's tile number is one byte
+BANK_NAME = "tile_bank"
+
+# Calls that write sprite VRAM or tiles themselves, which a shared bank would clobber
+VRAM_CALLS = ("set_sprite_data", "set_sprite_tile")
+
+# Byte -> the same byte with its bits in reverse order: one row of a plane mirrored
+REVERSED_BITS = bytes(int(f"{b:08b}"[::-1], 2) for b in range(256))
+
+
+def flip_x(tile):
+    return tile.translate(REVERSED_BITS)
+
+def flip_y(tile):
+    # Rows are two bytes (low plane, high plane); reverse their order
+    return b"".join(tile[i:i + 2] for i in range(len(tile) - 2, -1, -2))
+
+
+class TileBank:
+    """Tiles shared by every sprite of a program, each stored once.
+
+    A tile that is a mirror image of one already in the bank (left-right,
+    top-bottom or both) is not stored again: it refers to that tile plus
+    the OAM flip bits that draw it the right way round.
+    """
+    def __init__(self):
+        self.tiles = []   # unique 2bpp tiles, in bank order
+        self.lookup = {}  # tile bytes -> (bank index, flip attribute), for each flip of each bank tile
+        self.sprites = {} # name -> ([bank index], [flip attribute]), one per tile of the sprite, used while compiling
+        self.total = 0
+        self.flipped = 0
+
+    def add(self, tile):
+        found = self.lookup.get(tile)
+        if found is None:
+            index = len(self.tiles)
+            self.tiles.append(tile)
+            # setdefault: a symmetric tile is its own mirror and keeps the unflipped entry
+            for attr, variant in ((0, tile), (FLIP_X, flip_x(tile)), (FLIP_Y, flip_y(tile)),
+                                  (FLIP_X | FLIP_Y, flip_x(flip_y(tile)))):
+                self.lookup.setdefault(variant, (index, attr))
+            return index, 0
+        if found[1]:
+            self.flipped += 1
+        return found
+
+    def add_sprite(self, name, tile_bytes):
+        indexes, attrs = [], []
+        for i in range(0, len(tile_bytes), TILE_BYTES):
+            index, attr = self.add(bytes(tile_bytes[i:i + TILE_BYTES]))
+            indexes.append(index)
+            attrs.append(attr)
+        self.total += len(indexes)
+        self.sprites[name] = (indexes, attrs)
+
+    def rom_bytes(self):
+        """Bytes of the bank; loads refer to its tiles by constant, so nothing else is stored."""
+        return len(self.tiles) * TILE_BYTES
+
+    def report(self):
+        saved_rom = self.total * TILE_BYTES - self.rom_bytes()
+        duplicates = self.total - len(self.tiles) - self.flipped
+        return (f"tile bank: {len(self.tiles)} tiles for {len(self.sprites)} sprite(s) of {self.total} tiles "
+                f"({duplicates} duplicate, {self.flipped} flipped); "
+                f"VRAM {self.total} -> {len(self.tiles)} tiles ({(self.total - len(self.tiles)) * TILE_BYTES} bytes saved), "
+                f"ROM {self.total * TILE_BYTES} -> {self.rom_bytes()} bytes ({saved_rom} saved)")
+
+
+class TileBankBuilder:
+    """Replaces each sprite's tile array with one bank shared by the program.
+
+    The bank is copied into sprite VRAM once, at the start of onload, and
+    the sprites' own arrays are dropped. `load_sprite(arr[i], n)` then
+    only points sprite i at the bank tile the plain lowering would have
+    left at VRAM slot i + 1 and sets its flip bits, both constants; later
+    loads no longer overwrite the tiles earlier sprites show.
+
+    The program is left alone (with a warning) if it writes sprite VRAM
+    itself, has no onload state, or uses a sprite array other than as
+    the first argument of load_sprite and draw_sprite.
+    """
+    def __init__(self):
+        self.bank = TileBank()
+        self.warnings = []
+
+    def run(self, program):
+        sprites = [stmt for stmt in program.body if stmt.kind == IRKind.CBLOCK and stmt.source is not None]
+        if not sprites:
+            return program
+        onload = next((stmt for stmt in program.body
+                       if stmt.kind == IRKind.STATE and stmt.name.lower() == "onload"), None)
+        if onload is None:
+            return self.skip(program, "there is no onload state to copy it into VRAM")
+
+        names = {stmt.name for stmt in sprites}
+        self.statements = set()
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                self.find_loads(stmt.body)
+        reason = self.uses(program.body, names)
+        if reason:
+            return self.skip(program, reason)
+
+        for stmt in sprites:
+            tile_bytes = sprite_cache.get_tile_bytes(stmt.source)
+            if len(tile_bytes) % TILE_BYTES:
+                return self.skip(program, f"sprite '{stmt.name}' has a tile that isn't 8 rows")
+            self.bank.add_sprite(stmt.name, tile_bytes)
+        if len(self.bank.tiles) > SPRITE_TILE_SLOTS:
+            return self.skip(program, f"it needs {len(self.bank.tiles)} tiles and sprites can only use {SPRITE_TILE_SLOTS}")
+
+        taken = set()
+        referenced_names(program, taken)
+        bank_name = BANK_NAME
+        while bank_name in taken or bank_name in names:
+            bank_name = "_" + bank_name
+
+        first = program.body.index(sprites[0])
+        program.body = [stmt for stmt in program.body if stmt not in sprites]
+        program.body.insert(first, IRCBlock(Sprite.format_c_array(b"".join(self.bank.tiles), bank_name), bank_name))
+
+        for stmt in program.body:
+            if stmt.kind in (IRKind.STATE, IRKind.FUNC_DECL):
+                stmt.body = self.rewrite_loads(stmt.body)
+        onload.body.insert(0, call("set_sprite_data", IRConst(0), IRConst(len(self.bank.tiles)), IRIdent(bank_name)))
+        return program
+
+    def skip(self, program, reason):
+        self.warnings.append(f"sprite tiles were not banked: {reason}")
+        self.bank = None
+        return program
+
+    def find_loads(self, body):
+        """Note the load_sprite calls that are whole statements, the only ones that can be rewritten."""
+        for stmt in body:
+            match stmt.kind:
+                case IRKind.CALL:
+                    self.statements.add(id(stmt))
+                case IRKind.IF:
+                    self.find_loads(stmt.then_branch)
+                    self.find_loads(stmt.elif_branches)
+                    self.find_loads(stmt.else_branch)
+                case IRKind.WHILE | IRKind.FOR:
+                    self.find_loads(stmt.body)
+
+    def uses(self, ir, names):
+        """Why the sprite arrays can't be replaced, or None."""
+        if isinstance(ir, list):
+            for item in ir:
+                reason = self.uses(item, names)
+                if reason:
+                    return reason
+            return None
+        if not isinstance(ir, IRNode):
+            return None
+        if ir.kind == IRKind.CALL and isinstance(ir.caller, IRIdent):
+            if ir.caller.value in VRAM_CALLS:
+                return f"it calls {ir.caller.value}() itself"
+            if sprite_call(ir, "load_sprite", 2) and ir.args[0].object.value in names:
+                if constant_load(ir) is None:
+                    return f"load_sprite({ir.args[0].object.value}[...]) needs a constant index and count"
+                if id(ir) not in self.statements:
+                    return "load_sprite() is used inside an expression"
+                return None
+            if sprite_call(ir, "draw_sprite", 3) and ir.args[0].object.value in names:
+                return self.uses([ir.args[0].property] + ir.args[1:], names)
+        if ir.kind == IRKind.IDENT and ir.value in names:
+            return f"'{ir.value}' is used as an array"
+        if ir.kind == IRKind.CBLOCK:
+            return None
+        return self.uses([getattr(ir, field, None) for field in ir.fields()], names)
+
+    def rewrite_loads(self, body):
+        new = []
+        for stmt in body:
+            load = constant_load(stmt)
+            if load is not None and load[0] in self.bank.sprites:
+                array, index, count = load
+                indexes, attrs = self.bank.sprites[array]
+                # The plain lowering shows VRAM slot index + 1, which holds the load's second tile
+                tile = max(0, min(1, count - 1, len(indexes) - 1))
+                new.append(call("set_sprite_tile", IRConst(index), IRConst(indexes[tile])))
+                new.append(call("set_sprite_prop", IRConst(index), IRConst(attrs[tile])))
+                continue
+            match stmt.kind:
+                case IRKind.IF:
+                    self.rewrite_if(stmt)
+                case IRKind.WHILE | IRKind.FOR:
+                    stmt.body = self.rewrite_loads(stmt.body)
+            new.append(stmt)
+        return new
+
+    def rewrite_if(self, ir):
+        ir.then_branch = self.rewrite_loads(ir.then_branch)
+        for elif_ir in ir.elif_branches:
+            self.rewrite_if(elif_ir)
+        ir.else_branch = self.rewrite_loads(ir.else_branch)
+
+
+def build_tile_bank(program):
+    builder = TileBankBuilder()
+    return builder.run(program), builder
@@ -0,0 +1,217 @@
+# tilemap.py
+
+BG_TILES = 32      # the background map is 32x32 tiles, row after row from 0x9800
+MAP_RLE = 1
+MAP_LZ = 2
+METHOD_NAMES = {MAP_RLE: "RLE", MAP_LZ: "LZ"}
+
+# Packets shared by RLE and LZ: a control byte below 0x80 is followed by
+# control + 1 literal bytes. At or above 0x80 it is a run (RLE) or a
+# back-reference (LZ) whose length is the low 7 bits plus the minimum.
+MAX_LITERALS = 0x80
+MIN_RUN = 3        # RLE: control, value
+MIN_MATCH = 4      # LZ: control, distance low, distance high
+MAX_RUN = 0x7F + MIN_RUN
+MAX_MATCH = 0x7F + MIN_MATCH
+
+# Unpacks what TileMap.compress produced into the background map. VRAM
+# can only be touched while the LCD isn't drawing, so every access waits
+# for that first and maps can be loaded with the screen on.
+MAP_LOADER = """\
+void load_map(const unsigned char *map) {
+	unsigned char *dst = (unsigned char *)0x9800;
+	unsigned char *back;
+	unsigned char method = map[0];
+	unsigned int left = map[1] | (map[2] << 8);
+	unsigned char c, n, v;
+	map += 3;
+	while (left) {
+		c = *map++;
+		if (c < 0x80) {
+			n = c + 1;
+			left -= n;
+			while (n--) {
+				v = *map++;
+				while (STAT_REG & STATF_BUSY);
+				*dst++ = v;
+			}
+		} else if (method == %d) {
+			n = (c & 0x7F) + %d;
+			left -= n;
+			v = *map++;
+			while (n--) {
+				while (STAT_REG & STATF_BUSY);
+				*dst++ = v;
+			}
+		} else {
+			n = (c & 0x7F) + %d;
+			left -= n;
+			back = dst - (map[0] | (map[1] << 8));
+			map += 2;
+			while (n--) {
+				while (STAT_REG & STATF_BUSY);
+				v = *back++;
+				while (STAT_REG & STATF_BUSY);
+				*dst++ = v;
+			}
+		}
+	}
+}
+""" % (MAP_RLE, MIN_RUN, MIN_MATCH)
+
+
+def literals(out, data, start, end):
+    while start < end:
+        n = min(MAX_LITERALS, end - start)
+        out.append(n - 1)
+        out += data[start:start + n]
+        start += n
+
+def compress_rle(data):
+    out = bytearray()
+    pending = 0 # start of the literals not yet written
+    i = 0
+    while i < len(data):
+        run = 1
+        while i + run < len(data) and run < MAX_RUN and data[i + run] == data[i]:
+            run += 1
+        if run >= MIN_RUN:
+            literals(out, data, pending, i)
+            out += bytes((0x80 | (run - MIN_RUN), data[i]))
+            i += run
+            pending = i
+        else:
+            i += run
+    literals(out, data, pending, len(data))
+    return bytes(out)
+
+def compress_lz(data):
+    """Greedy LZ77 over the whole map; a distance of 1 repeats the previous tile, so runs come for free."""
+    out = bytearray()
+    heads = {}  # MIN_MATCH bytes -> positions they start at, latest last
+    pending = 0
+    i = 0
+    while i < len(data):
+        best_len = best_dist = 0
+        key = data[i:i + MIN_MATCH]
+        if len(key) == MIN_MATCH:
+            for start in reversed(heads.get(key, ())):
+                n = MIN_MATCH
+                while i + n < len(data) and n < MAX_MATCH and data[start + n] == data[i + n]:
+                    n += 1
+                if n > best_len:
+                    best_len, best_dist = n, i - start
+                    if n == MAX_MATCH:
+                        break
+        if best_len >= MIN_MATCH:
+            literals(out, data, pending, i)
+            out += bytes((0x80 | (best_len - MIN_MATCH), best_dist & 0xFF, best_dist >> 8))
+            end = i + best_len
+        else:
+            end = i + 1
+        while i < end:
+            heads.setdefault(data[i:i + MIN_MATCH], []).append(i)
+            i += 1
+        if best_len >= MIN_MATCH:
+            pending = i
+    literals(out, data, pending, len(data))
+    return bytes(out)
+
+def decompress(packed):
+    """What load_map writes, for checking the compressors."""
+    method, size = packed[0], packed[1] | packed[2] << 8
+    out = bytearray()
+    pos = 3
+    while len(out) < size:
+        c = packed[pos]
+        pos += 1
+        if c < 0x80:
+            out += packed[pos:pos + c + 1]
+            pos += c + 1
+        elif method == MAP_RLE:
+            out += bytes((packed[pos],)) * ((c & 0x7F) + MIN_RUN)
+            pos += 1
+        else:
+            dist = packed[pos] | packed[pos + 1] << 8
+            pos += 2
+            for _ in range((c & 0x7F) + MIN_MATCH):
+                out.append(out[-dist])
+    return bytes(out)
+
+
+class TileMap:
+    """A background map of tile indexes, `width` x `height`, row after row."""
+    def __init__(self, name="unnamed", width=0, height=0, tiles=b""):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+
+    def bg_bytes(self):
+        """The map as load_map writes it: rows padded with tile 0 to the 32-tile background width."""
+        if self.width == BG_TILES:
+            return self.tiles
+        pad = bytes(BG_TILES - self.width)
+        return b"".join(self.tiles[y * self.width:(y + 1) * self.width] + pad for y in range(self.height))
+
+    def compress(self):
+        """(method, packed bytes) with the smallest packing; the bytes start with the method and the unpacked size."""
+        data = self.bg_bytes()
+        best = None
+        for method, packer in ((MAP_RLE, compress_rle), (MAP_LZ, compress_lz)):
+            packed = bytes((method, len(data) & 0xFF, len(data) >> 8)) + packer(data)
+            if best is None or len(packed) < len(best[1]):
+                best = (method, packed)
+        return best
+
+    def get_c_array(self, varname="map_data"):
+        method, packed = self.compress()
+        code = f"// {self.width}x{self.height} map, {METHOD_NAMES[method]}: {len(packed)} of {self.width * self.height} bytes\n"
+        code += f"const unsigned char {varname}[] = {{"
+        code += "  " + ", ".join(f"0x{b:02X}" for b in packed)
+        code += "};"
+        return code
+
+    @classmethod
+    def from_file(cls, path):
+        tile_map = cls()
+        header = {}
+        rows = []
+        in_tiles = False
+        with open(path, 'r') as f:
+            for ln, line in enumerate(f, 1):
+                line = line.split("//", 1)[0].strip()
+                if not line:
+                    continue
+                if not in_tiles:
+                    key, sep, value = line.partition(":")
+                    if not sep:
+                        raise ValueError(f"{path}:{ln}: expected 'key: value' or 'tiles:'")
+                    if key.strip() == "tiles":
+                        in_tiles = True
+                    else:
+                        header[key.strip()] = value.strip()
+                    continue
+                try:
+                    row = [int(v, 0) for v in line.replace(",", " ").split()]
+                except ValueError:
+                    raise ValueError(f"{path}:{ln}: tile indexes must be numbers")
+                if any(not 0 <= v <= 0xFF for v in row):
+                    raise ValueError(f"{path}:{ln}: tile indexes must be 0-255")
+                if rows and len(row) != len(rows[0]):
+                    raise ValueError(f"{path}:{ln}: row has {len(row)} tiles, the first row has {len(rows[0])}")
+                rows.append(row)
+
+        tile_map.name = header.get("name", tile_map.name)
+        tile_map.height = len(rows)
+        tile_map.width = len(rows[0]) if rows else 0
+        for key in ("width", "height"):
+            if key in header and header[key] != str(getattr(tile_map, key)):
+                raise ValueError(f"{path}: {key} is {header[key]} but the tiles are {getattr(tile_map, key)}")
+        if not rows:
+            raise ValueError(f"{path}: map has no tiles")
+        if tile_map.width > BG_TILES or tile_map.height > BG_TILES:
+            raise ValueError(f"{path}: map is {tile_map.width}x{tile_map.height}; "
+                             f"the background holds at most {BG_TILES}x{BG_TILES} tiles")
+        tile_map.tiles = bytes(v for row in rows for v in row)
+        return tile_map
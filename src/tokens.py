@@ -1,84 +1,234 @@
 # tokens.py
+from enum import IntEnum
 from typing import Type
+from bisect import bisect_right
+from itertools import islice
+from collections import namedtuple
 
 class TokenType:
-     # Identifiers & literals
-    IDENT = "identifier"
-    NUMBER = "number"
-    STRING = "string"
-    NULL = "null" # null literal
-    EOF = "eof"
-
-    LPAREN = "l_paren" # (
-    RPAREN = "r_paren" # )
-    LBRAC = "l_bracket" # [
-    RBRAC = "r_bracket" # ]
-    LCURL = "l_curl" # {
-    RCURL = "r_curl" # }
+    # Token kinds are small ints so the parser compares ints, not strings.
+    # Use TokenKind / token_name() to display them.
+
+    # Identifiers & literals
+    IDENT = 0
+    NUMBER = 1
+    STRING = 2
+    NULL = 3 # null literal
+    EOF = 4
+
+    LPAREN = 5 # (
+    RPAREN = 6 # )
+    LBRAC = 7 # [
+    RBRAC = 8 # ]
+    LCURL = 9 # {
+    RCURL = 10 # }
 
     # Operators
-    PLUS = "plus"
-    DASH = "dash"
-    STAR = "star"
-    SLASH = "slash"
-    PERCENT = "percent"
-
-    ASSIGNMENT = "assignment" # =
-    EQUALS = "equals" # ==
-    NOT = "not" # !
-    NOT_EQ = "not_equals" # !=
-    LESS = "less"
-    LESS_EQ = "less_eq"
-    GREATER = "greater"
-    GREATER_EQ = "greater_eq"
-
-    OR = "or" 
-    AND = "and" 
+    PLUS = 11
+    DASH = 12
+    STAR = 13
+    SLASH = 14
+    PERCENT = 15
+
+    ASSIGNMENT = 16 # =
+    EQUALS = 17 # ==
+    NOT = 18 # !
+    NOT_EQ = 19 # !=
+    LESS = 20
+    LESS_EQ = 21
+    GREATER = 22
+    GREATER_EQ = 23
+
+    OR = 24
+    AND = 25
 
     # Delimiters
-    SEMICOLON = "semicolon"
-    COLON = "colon"
-    QUESTION = "question_mark"
-    DOT = "dot"
-    COMMA = "comma"
-    P_PLUS = "plus_plus" # ++
-    M_MINUS = "minus_minus" # --
-    PLUS_EQ = "plus_eq" # +=
-    MINUS_EQ = "minus_eq" # -=
+    SEMICOLON = 26
+    COLON = 27
+    QUESTION = 28
+    DOT = 29
+    COMMA = 30
+    P_PLUS = 31 # ++
+    M_MINUS = 32 # --
+    PLUS_EQ = 33 # +=
+    MINUS_EQ = 34 # -=
 
     # Reserved Keywords
-    VAR = "var"
-    CONST = "const"
-    OBJ = "obj"
-    STATE = "state"
-    GRP = "grp"
-    SPRITE = "sprite"
-    NEW = "new"
-    MODULE = "module"
-    IMPORT = "import"
-    FROM ="from"
-    FUNC = "func"
-    IF = "if"
-    ELIF = "elif"
-    ELSE ="else"
-    WHILE ="while"
-    FOR ="for"
-    IN = "in"
-    RETURN = "return"
-
-
-class Token:
-    def __init__(self, type : TokenType, value : str, ln : int = 0, col : int = 0):
-        self.type = type
-        self.value = value
-        self.ln = ln
-        self.col = col
+    VAR = 35
+    CONST = 36
+    OBJ = 37
+    STATE = 38
+    GRP = 39
+    SPRITE = 40
+    NEW = 41
+    MODULE = 42
+    IMPORT = 43
+    FROM = 44
+    FUNC = 45
+    IF = 46
+    ELIF = 47
+    ELSE = 48
+    WHILE = 49
+    FOR = 50
+    IN = 51
+    RETURN = 52
+    INLINE = 53
+    MAP = 54
+
+
+# Display names, as shown in --debug-lexer output and parser errors
+TOKEN_NAMES = {
+    TokenType.IDENT: "identifier",
+    TokenType.NUMBER: "number",
+    TokenType.STRING: "string",
+    TokenType.NULL: "null",
+    TokenType.EOF: "eof",
+    TokenType.LPAREN: "l_paren",
+    TokenType.RPAREN: "r_paren",
+    TokenType.LBRAC: "l_bracket",
+    TokenType.RBRAC: "r_bracket",
+    TokenType.LCURL: "l_curl",
+    TokenType.RCURL: "r_curl",
+    TokenType.PLUS: "plus",
+    TokenType.DASH: "dash",
+    TokenType.STAR: "star",
+    TokenType.SLASH: "slash",
+    TokenType.PERCENT: "percent",
+    TokenType.ASSIGNMENT: "assignment",
+    TokenType.EQUALS: "equals",
+    TokenType.NOT: "not",
+    TokenType.NOT_EQ: "not_equals",
+    TokenType.LESS: "less",
+    TokenType.LESS_EQ: "less_eq",
+    TokenType.GREATER: "greater",
+    TokenType.GREATER_EQ: "greater_eq",
+    TokenType.OR: "or",
+    TokenType.AND: "and",
+    TokenType.SEMICOLON: "semicolon",
+    TokenType.COLON: "colon",
+    TokenType.QUESTION: "question_mark",
+    TokenType.DOT: "dot",
+    TokenType.COMMA: "comma",
+    TokenType.P_PLUS: "plus_plus",
+    TokenType.M_MINUS: "minus_minus",
+    TokenType.PLUS_EQ: "plus_eq",
+    TokenType.MINUS_EQ: "minus_eq",
+    TokenType.VAR: "var",
+    TokenType.CONST: "const",
+    TokenType.OBJ: "obj",
+    TokenType.STATE: "state",
+    TokenType.GRP: "grp",
+    TokenType.SPRITE: "sprite",
+    TokenType.NEW: "new",
+    TokenType.MODULE: "module",
+    TokenType.IMPORT: "import",
+    TokenType.FROM: "from",
+    TokenType.FUNC: "func",
+    TokenType.IF: "if",
+    TokenType.ELIF: "elif",
+    TokenType.ELSE: "else",
+    TokenType.WHILE: "while",
+    TokenType.FOR: "for",
+    TokenType.IN: "in",
+    TokenType.RETURN: "return",
+    TokenType.INLINE: "inline",
+    TokenType.MAP: "map",
+}
+
+# IntEnum view of the kinds, for code that wants names rather than ints
+TokenKind = IntEnum("TokenKind", {name: kind for name, kind in vars(TokenType).items() if name.isupper()})
+
+def token_name(kind: int) -> str:
+    return TOKEN_NAMES.get(kind, str(kind))
+
+
+class LineIndex:
+    """Maps source offsets to (line, column), both 1-based.
+
+    The table of line start offsets is only built the first time a position
+    is looked up, so a clean lex never pays for it. When lexing in chunks,
+    each chunk gets its own index that knows the offset, line and column it
+    starts at.
+    """
+    def __init__(self, source: str, offset: int = 0, first_ln: int = 1, first_col: int = 1):
+        self.source = source
+        self.offset = offset
+        self.first_ln = first_ln
+        self.first_col = first_col
+        self.starts = None
+
+    def locate(self, pos: int):
+        if self.starts is None:
+            starts = [0]
+            find = self.source.find
+            i = find("\n")
+            while i != -1:
+                starts.append(i + 1)
+                i = find("\n", i + 1)
+            self.starts = starts
+        pos -= self.offset
+        line = bisect_right(self.starts, pos)
+        col = pos - self.starts[line - 1] + 1
+        if line == 1:
+            col += self.first_col - 1
+        return self.first_ln + line - 1, col
+
+    def offset_of(self, at: int) -> int:
+        return at
+
+
+class TokenSpans(LineIndex):
+    """LineIndex for tokens that record their number within a scan.
+
+    Scanning a whole source doesn't keep match objects around, so the lexer
+    stores each token's index instead of its offset. The offsets are found
+    by running the scan pattern over the source again, the first time any
+    position is asked for.
+    """
+    def __init__(self, source: str, pattern, offset: int = 0, first_ln: int = 1, first_col: int = 1):
+        super().__init__(source, offset, first_ln, first_col)
+        self.pattern = pattern
+        self.token_starts = None
+
+    def offset_of(self, at: int) -> int:
+        if self.token_starts is None:
+            self.token_starts = [m.start(1) for m in self.pattern.finditer(self.source)]
+        return self.offset + self.token_starts[at]
+
+
+# Only lends Token its field getters, which read the tuple in C
+_TokenFields = namedtuple("_TokenFields", ("type", "value", "at", "lines"))
+
+
+class Token(tuple):
+    """(type, value, at, lines), where `lines` resolves `at` to an offset.
+
+    A tuple, built like one from a 4-item iterable, so the lexer can make
+    a whole scan's tokens in C rather than calling __init__ for each one.
+    """
+    __slots__ = ()
+
+    type = _TokenFields.type
+    value = _TokenFields.value
+    lines = _TokenFields.lines
+
+    @property
+    def pos(self): # offset into the source, resolved to ln/col on demand
+        return self[3].offset_of(self[2]) if self[3] else self[2]
+
+    @property
+    def ln(self):
+        return self[3].locate(self.pos)[0] if self[3] else 0
+
+    @property
+    def col(self):
+        return self[3].locate(self.pos)[1] if self[3] else 0
 
     def __repr__(self):
         if match_toks(self, [TokenType.IDENT, TokenType.NUMBER, TokenType.STRING]):
-            return f"{self.type}({self.value})" #, ln={self.line}, col={self.column})"
+            return f"{TOKEN_NAMES[self.type]}({self.value})" #, ln={self.line}, col={self.column})"
         else:
-            return f"{self.type}()" #, ln={self.line}, col={self.column})"
+            return f"{TOKEN_NAMES[self.type]}()" #, ln={self.line}, col={self.column})"
 
 
 def match_toks(token: Token, expected_tokens: list[TokenType]) -> bool:
@@ -87,3 +237,69 @@ def match_toks(token: Token, expected_tokens: list[TokenType]) -> bool:
             return True
         
     return False
+
+
+class TokenStream:
+    """Index cursor over a token list or a token iterator.
+
+    The parser reads through this instead of popping from the list, so each
+    token costs O(1) and the original list is left untouched for debugging.
+    Given an iterator (e.g. Lexer.iter_tokens) tokens are pulled on demand
+    and consumed ones are dropped, so only the lookahead is kept in memory.
+    Tokens from an active mark() onwards are kept until rewind()/release().
+    """
+    KEEP = 32 # consumed tokens to collect before trimming the buffer
+
+    def __init__(self, tokens):
+        if isinstance(tokens, list):
+            self.tokens = tokens
+            self.source = None
+        else:
+            self.tokens = []
+            self.source = iter(tokens)
+        self.pos = 0  # cursor into self.tokens
+        self.base = 0 # absolute index of self.tokens[0]
+        self.marks = []
+
+    def fill(self, k: int):
+        missing = self.pos + k + 1 - len(self.tokens)
+        if missing > 0 and self.source is not None:
+            self.tokens.extend(islice(self.source, missing))
+
+    def at(self): # current token
+        try:
+            return self.tokens[self.pos]
+        except IndexError:
+            self.fill(0)
+            return self.tokens[self.pos]
+
+    def peek(self, k: int = 1): # k tokens past the current one
+        self.fill(k)
+        pos = self.pos + k
+        if pos < len(self.tokens):
+            return self.tokens[pos]
+        return self.tokens[-1]
+
+    def adv(self): # consume current token
+        tok = self.at()
+        self.pos += 1
+        if self.source is not None and self.pos >= self.KEEP and not self.marks:
+            del self.tokens[:self.pos]
+            self.base += self.pos
+            self.pos = 0
+        return tok
+
+    def not_at_end(self):
+        return self.at().type != TokenType.EOF
+
+    def mark(self):
+        mark = self.base + self.pos
+        self.marks.append(mark)
+        return mark
+
+    def rewind(self, mark: int):
+        self.release(mark)
+        self.pos = mark - self.base
+
+    def release(self, mark: int):
+        self.marks.remove(mark)
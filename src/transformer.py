@@ -3,125 +3,150 @@ from src.ir_nodes import *
 from src.nodes import *
 
 def ast_to_ir(node):
-    match node.type:
-        case "Program":
-            return IRProgram([ast_to_ir(stmt) for stmt in node.body])
+    handler = AST_TO_IR[node.kind] if node.kind is not None else None
+    if handler is None:
+        raise NotImplementedError(f"AST node type '{node.type}' not supported.")
+    return handler(node)
 
-        case "Identifier":
-            return IRIdent(node.value)
+def program_to_ir(node):
+    return IRProgram([ast_to_ir(stmt) for stmt in node.body])
 
-        case "NumericLiteral" | "StringLiteral":
-            return IRConst(node.value)
-        
-        case "NullLiteral":
-            return IRNull()
-        
-        case "Property":
-            return IRProperty(node.name, node.d_type)
-        
-        case "IndexLiteral":
-            return IRIndex(node.index, node.value)
-        
-        case "VariableDeclaration":
-            return IRVarDecl(node.name, infer_type(node), node.is_const, ast_to_ir(node.value))
-        
-        case "ObjectDeclaration":
-            props = []
-            for prop in node.properties: props.append(ast_to_ir(prop))
-            return IRObjDecl(node.name, props)
-        
-        case "GroupDeclaration":
-            items = []
-            for item in node.items:
-                items.append(ast_to_ir(item))  # Transform AST IndexLiteral → IRIndex
-            return IRGrpDecl(node.name, node.declared_type, node.size, items)
-
-        case "FunctionDeclaration":
-            stmts = []
-            for stmt in node.body: stmts.append(ast_to_ir(stmt))
-            args = []
-            for arg in node.params: args.append(ast_to_ir(arg))
-            return IRFuncDecl(node.name, args, node.return_type, stmts)
-
-        case "StateDeclaration":
-            stmts = []
-            for stmt in node.body: stmts.append(ast_to_ir(stmt))
-            return IRState(node.name, stmts)
-        
-        case "IfStmt":
-            conds = []
-            for cond in node.conditions: conds.append(ast_to_ir(cond))
-            then = []
-            for stmt in node.then_branch: then.append(ast_to_ir(stmt))
-            elif_brnch = []
-            for stmt in node.elif_branches: elif_brnch.append(ast_to_ir(stmt))
-            else_brnch = []
-            for stmt in node.else_branch: else_brnch.append(ast_to_ir(stmt))
-            return IRIf(conds, then, elif_brnch, else_brnch)
-        
-        case "WhileStmt":
-            cond = ast_to_ir(node.condition)
-            stmts = []
-            for stmt in node.body: stmts.append(ast_to_ir(stmt))
-            return IRWhile(cond, stmts)
-
-        case "ForStmt":
-            init = ast_to_ir(node.init)
-            cond = ast_to_ir(node.condition)
-            inc = ast_to_ir(node.increment)
-            stmts = []
-            for stmt in node.body: stmts.append(ast_to_ir(stmt))
-            return IRFor(init, cond, inc, stmts)
-
-        case "ReturnStmt":
-            return IRReturn(ast_to_ir(node.value))
-
-        case "BinaryExpr":
-            left_ir = ast_to_ir(node.left)
-            right_ir = ast_to_ir(node.right)
-            return IRBinary(node.op, left_ir, right_ir)
-        
-        case "UnaryExpr":
-            return IRUnary(node.op, ast_to_ir(node.right), node.postfix)
-        
-        case "AssignmentExpr":
-            return IRAssignment(node.assignee, ast_to_ir(node.value), node.op)
-        
-        case "CallExpr":
-            args = []
-            args = [ast_to_ir(arg) for arg in node.args]
-            return IRCall(ast_to_ir(node.caller), args)
-        
-        case "MemberExpr":
-            return IRMember(ast_to_ir(node.object), ast_to_ir(node.property), node.computed)
+def identifier_to_ir(node):
+    return IRIdent(node.value)
 
+def literal_to_ir(node):
+    return IRConst(node.value)
 
-        case "ModuleNode":
-            return IRModule(node.value)
-        
-        case "CPlicit":
-            return IRCBlock(node.code)
+def null_to_ir(node):
+    return IRNull()
+
+def property_to_ir(node):
+    return IRProperty(node.name, node.d_type)
+
+def index_to_ir(node):
+    return IRIndex(node.index, ast_to_ir(node.value))
+
+def var_decl_to_ir(node):
+    inferred = getattr(node, "explicit_type", None) in (None, "object")
+    return IRVarDecl(node.name, infer_type(node), node.is_const, ast_to_ir(node.value), inferred)
+
+def obj_decl_to_ir(node):
+    props = []
+    for prop in node.properties: props.append(ast_to_ir(prop))
+    return IRObjDecl(node.name, props)
+
+def grp_decl_to_ir(node):
+    items = []
+    for item in node.items:
+        items.append(ast_to_ir(item))  # Transform AST IndexLiteral → IRIndex
+    return IRGrpDecl(node.name, node.declared_type, node.size, items)
+
+def func_decl_to_ir(node):
+    stmts = []
+    for stmt in node.body: stmts.append(ast_to_ir(stmt))
+    args = []
+    for arg in node.params: args.append(ast_to_ir(arg))
+    return IRFuncDecl(node.name, args, node.return_type, stmts, node.inline)
+
+def state_to_ir(node):
+    stmts = []
+    for stmt in node.body: stmts.append(ast_to_ir(stmt))
+    return IRState(node.name, stmts)
+
+def if_to_ir(node):
+    conds = []
+    for cond in node.conditions: conds.append(ast_to_ir(cond))
+    then = []
+    for stmt in node.then_branch: then.append(ast_to_ir(stmt))
+    elif_brnch = []
+    for stmt in node.elif_branches: elif_brnch.append(ast_to_ir(stmt))
+    else_brnch = []
+    for stmt in node.else_branch: else_brnch.append(ast_to_ir(stmt))
+    return IRIf(conds, then, elif_brnch, else_brnch)
+
+def while_to_ir(node):
+    cond = ast_to_ir(node.condition)
+    stmts = []
+    for stmt in node.body: stmts.append(ast_to_ir(stmt))
+    return IRWhile(cond, stmts)
+
+def for_to_ir(node):
+    init = ast_to_ir(node.init)
+    cond = ast_to_ir(node.condition)
+    inc = ast_to_ir(node.increment)
+    stmts = []
+    for stmt in node.body: stmts.append(ast_to_ir(stmt))
+    return IRFor(init, cond, inc, stmts)
+
+def return_to_ir(node):
+    return IRReturn(ast_to_ir(node.value))
+
+def binary_to_ir(node):
+    left_ir = ast_to_ir(node.left)
+    right_ir = ast_to_ir(node.right)
+    return IRBinary(node.op, left_ir, right_ir)
+
+def unary_to_ir(node):
+    return IRUnary(node.op, ast_to_ir(node.right), node.postfix)
+
+def assignment_to_ir(node):
+    return IRAssignment(ast_to_ir(node.assignee), ast_to_ir(node.value), node.op)
+
+def call_to_ir(node):
+    args = [ast_to_ir(arg) for arg in node.args]
+    return IRCall(ast_to_ir(node.caller), args)
+
+def member_to_ir(node):
+    return IRMember(ast_to_ir(node.object), ast_to_ir(node.property), node.computed)
+
+def module_to_ir(node):
+    return IRModule(node.value)
 
+def cplicit_to_ir(node):
+    return IRCBlock(node.code, node.name, node.source)
 
-        case _:
-            raise NotImplementedError(f"AST node type '{node.type}' not supported.")
+# AST kind -> lowering function; kinds without an entry are unsupported
+AST_TO_IR = [None] * NodeKind.COUNT
+AST_TO_IR[NodeKind.PROGRAM] = program_to_ir
+AST_TO_IR[NodeKind.IDENTIFIER] = identifier_to_ir
+AST_TO_IR[NodeKind.NUMERIC_LITERAL] = literal_to_ir
+AST_TO_IR[NodeKind.STRING_LITERAL] = literal_to_ir
+AST_TO_IR[NodeKind.NULL_LITERAL] = null_to_ir
+AST_TO_IR[NodeKind.PROPERTY] = property_to_ir
+AST_TO_IR[NodeKind.INDEX_LITERAL] = index_to_ir
+AST_TO_IR[NodeKind.VARIABLE_DECLARATION] = var_decl_to_ir
+AST_TO_IR[NodeKind.OBJECT_DECLARATION] = obj_decl_to_ir
+AST_TO_IR[NodeKind.GROUP_DECLARATION] = grp_decl_to_ir
+AST_TO_IR[NodeKind.FUNCTION_DECLARATION] = func_decl_to_ir
+AST_TO_IR[NodeKind.STATE_DECLARATION] = state_to_ir
+AST_TO_IR[NodeKind.IF_STMT] = if_to_ir
+AST_TO_IR[NodeKind.WHILE_STMT] = while_to_ir
+AST_TO_IR[NodeKind.FOR_STMT] = for_to_ir
+AST_TO_IR[NodeKind.RETURN_STMT] = return_to_ir
+AST_TO_IR[NodeKind.BINARY_EXPR] = binary_to_ir
+AST_TO_IR[NodeKind.UNARY_EXPR] = unary_to_ir
+AST_TO_IR[NodeKind.ASSIGNMENT_EXPR] = assignment_to_ir
+AST_TO_IR[NodeKind.CALL_EXPR] = call_to_ir
+AST_TO_IR[NodeKind.MEMBER_EXPR] = member_to_ir
+AST_TO_IR[NodeKind.MODULE_NODE] = module_to_ir
+AST_TO_IR[NodeKind.CPLICIT] = cplicit_to_ir
         
 def infer_type(node):
     if hasattr(node, "explicit_type"):
         if node.explicit_type not in (None, "object"):
             return node.explicit_type
     
-    match node.value.type:
-        case "NumericLiteral" | "BinaryExpr" | "UnaryExpr":
+    match node.value.kind:
+        case NodeKind.NUMERIC_LITERAL | NodeKind.BINARY_EXPR | NodeKind.UNARY_EXPR:
             return "int"
     
-        case "StringLiteral":
+        case NodeKind.STRING_LITERAL:
             return "str"
         
-        case "Indentifier" | "NullLiteral":
+        case NodeKind.IDENTIFIER | NodeKind.NULL_LITERAL:
             return "auto"
 
-        case "ObjectLiteral":
+        case NodeKind.OBJECT_LITERAL:
             et = node.value
             node.value = NullLiteral()
             return f"{et}"
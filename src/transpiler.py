@@ -1,7 +1,7 @@
 # transpiler.py
 from src.ir_nodes import *
+from src.tilemap import MAP_LOADER
 
-indent_level = 0
 sprites_loaded = 0
 # Maps GBScript built-in functions to their C equivalents or wrapped functions
 CALL_ALIASES = {
@@ -12,29 +12,114 @@ MODULES = {
     "std" : "#include <stdio.h>",
     "GB" : "#include <gb/gb.h>",
     "stdgb" : "#include <stdio.h>\n#include <gb/gb.h>",
+    "stdint" : "#include <stdint.h>",
 }
 
+# C binding strength of binary operators, used to decide where parentheses
+# are needed when nested IRBinary nodes are written out
+BINARY_PRECEDENCE = {
+    "*": 10, "/": 10, "%": 10,
+    "+": 9, "-": 9,
+    "<<": 8, ">>": 8,
+    "<": 7, "<=": 7, ">": 7, ">=": 7,
+    "==": 6, "!=": 6,
+    "&": 5,
+    "^": 4,
+    "|": 3,
+    "&&": 2, "and": 2,
+    "||": 1, "or": 1,
+}
+
+# Fixed-width integer types; using any of them pulls in <stdint.h>
+STDINT_TYPES = ("uint8_t", "int8_t", "uint16_t", "int16_t")
+
+# Operands of these get parentheses whenever they are a different binary
+# operator, even if C wouldn't need them: `(x + 1) << 2`, not `x + 1 << 2`
+BITWISE_OPERATORS = ("<<", ">>", "&", "^", "|")
+
 
 def generate_c(ir, indent_level=0):
+    emitter = CEmitter(indent_level)
     if isinstance(ir, IRProgram):
+        emitter.program(ir)
+    elif EXPR_HANDLERS[ir.kind] is not None:
+        emitter.expr(ir)
+    else:
+        emitter.stmt(ir)
+    return emitter.getvalue().rstrip("\n")
+
+
+class CEmitter:
+    """Writes C for an IR tree into a single buffer.
+
+    Expressions are written piece by piece with write(); statements go
+    through stmt(), which starts each line at the current indentation.
+    push()/pop() manage the indentation stack. Handlers are looked up by
+    IRKind in EXPR_HANDLERS and STMT_HANDLERS.
+    """
+    def __init__(self, indent_level=0):
+        self.parts = []
+        self.write = self.parts.append
+        self.indents = [get_indent(indent_level)]
+        self.uses_stdint = False
+        self.uses_map_loader = False
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+    def push(self):
+        self.indents.append(self.indents[-1] + "\t")
+
+    def pop(self):
+        self.indents.pop()
+
+    def line(self, text):
+        self.write(self.indents[-1] + text + "\n")
+
+    def text(self, ir):
+        # Render a (small) sub-expression on its own, for the few places
+        # that need to inspect the generated text
+        sub = CEmitter()
+        sub.indents = self.indents
+        sub.expr(ir)
+        self.uses_stdint = self.uses_stdint or sub.uses_stdint
+        self.uses_map_loader = self.uses_map_loader or sub.uses_map_loader
+        return sub.getvalue()
+
+    def expr(self, ir):
+        handler = EXPR_HANDLERS[ir.kind] if ir.kind is not None else None
+        if handler is None:
+            raise NotImplementedError(f"Unhandled IR node: {type(ir).__name__}")
+        handler(self, ir)
+
+    def stmt(self, ir):
+        handler = STMT_HANDLERS[ir.kind] if ir.kind is not None else None
+        if handler is not None:
+            handler(self, ir)
+            return
+        self.write(self.indents[-1])
+        self.expr(ir)
+        self.write(";\n")
+
+    def block(self, stmts):
+        self.push()
+        for stmt in stmts:
+            self.stmt(stmt)
+        self.pop()
+
+    # region Program
+    def program(self, ir):
         includes = []
         globals = []
         for stmt in ir.body:
             if isinstance(stmt, IRModule):
-                includes.append(generate_c(stmt))
+                includes.append(stmt)
             elif isinstance(stmt, IRCBlock):
-                globals.append(generate_c(stmt))
-            #elif isinstance(stmt, IRVarDecl) or isinstance(stmt, IRGrpDecl) or isinstance(stmt, IRFuncDecl):
-            #    globals.append(generate_c(stmt))
-
-                
+                globals.append(stmt)
 
         # Collect states by name for main function generation
         onload_state = None
         mainloop_state = None
-
-
-        # region State
         for stmt in ir.body:
             if isinstance(stmt, IRState):
                 name = stmt.name.lower()
@@ -43,252 +128,264 @@ def generate_c(ir, indent_level=0):
                 elif name == "gameloop":
                     mainloop_state = stmt
 
-        # 3. Generate final code
-        indent = get_indent(indent_level)
-        code_lines = []
-
-        # Add all includes at the top
-        code_lines.extend(includes)
-        code_lines.append("")  # blank line for readability
-        code_lines.extend(globals)
-        code_lines.append("")  # blank line
+        # Add all includes at the top; <stdint.h> is filled in at the end
+        # if a fixed-width type was written
+        stdint_slot = len(self.parts)
+        self.write("")
+        for stmt in includes:
+            self.expr(stmt)
+            self.write("\n")
+        self.write("\n")  # blank line for readability
+        for stmt in globals:
+            self.expr(stmt)
+            self.write("\n")
+        self.write("\n")
+        # load_map()'s decompressor goes here once the body shows it's called
+        map_loader_slot = len(self.parts)
+        self.write("")
 
         # Generate main() function
-        code_lines.append(f"{indent}void main() {{")
-
+        self.line("void main() {")
+        self.push()
 
         # Generate load body
         if onload_state:
-            load_lines = [generate_c(stmt, indent_level + 1) + ";" for stmt in onload_state.body]
-            code_lines.extend(indent_lines(load_lines, indent_level + 1))
+            for stmt in onload_state.body:
+                self.stmt(stmt)
 
-        # Start while(1) loop
-        code_lines.append(f"{indent}\twhile(1) {{")
-
-        # Generate update body inside while
+        # Start while(1) loop, with the update body inside it
+        self.line("while(1) {")
         if mainloop_state:
-            update_lines = [generate_c(stmt, indent_level + 2) + ";" for stmt in mainloop_state.body]
-            code_lines.extend(indent_lines(update_lines, indent_level + 2))
-
-        # Close while and main braces
-        code_lines.append(f"{indent}\t}}")  # close while
-        code_lines.append(f"{indent}}}")  # close main
-        # endregion
-
-        return "\n".join(code_lines)
-
-    elif isinstance(ir, IRModule):
-        # Get the module name as string
-        module_name = None
-        ir_vl = ir.value
-        module_name = ir_vl
-
-        val = MODULES[module_name]
-        return str(val)
+            self.block(mainloop_state.body)
+        self.line("}")
+
+        self.pop()
+        self.line("}")
+
+        if self.uses_stdint and not any(stmt.value == "stdint" for stmt in includes):
+            self.parts[stdint_slot] = MODULES["stdint"] + "\n"
+        if self.uses_map_loader:
+            self.parts[map_loader_slot] = MAP_LOADER + "\n"
+    # endregion
+
+    # region Statements
+    def obj_decl(self, ir):
+        self.line("typedef struct {")
+        self.push()
+        for prop in ir.properties:
+            self.stmt(prop)
+        self.pop()
+        self.line(f"}} {ir.name};")
+
+    def func_decl(self, ir):
+        params = ", ".join(self.text(p) for p in ir.params)
+        self.line(f"{ir.return_type} {ir.name}({params}) {{")
+        self.block(ir.body)
+        self.line("}")
+
+    def if_stmt(self, ir, prefix=""):
+        self.write(f"{self.indents[-1]}{prefix}if (")
+        self.expr(ir.conditions[0])
+        self.write(") {\n")
+        self.block(ir.then_branch)
+        self.line("}")
 
-    elif isinstance(ir, IRNull):
-        return ""
+        for elif_ir in ir.elif_branches:
+            self.if_stmt(elif_ir, "else ")
 
-    elif isinstance(ir, IRIdent):
-        return str(ir.value)
-        
-    elif isinstance(ir, IRConst):
+        if ir.else_branch:
+            self.line("else {")
+            self.block(ir.else_branch)
+            self.line("}")
+
+    def while_stmt(self, ir):
+        self.write(f"{self.indents[-1]}while (")
+        self.expr(ir.condition)
+        self.write(") {\n")
+        self.block(ir.body)
+        self.line("}")
+
+    def for_stmt(self, ir):
+        self.write(f"{self.indents[-1]}for (")
+        self.expr(ir.init)
+        self.write("; ")
+        self.expr(ir.condition)
+        self.write("; ")
+        self.expr(ir.increment)
+        self.write(") {\n")
+        self.block(ir.body)
+        self.line("}")
+    # endregion
+
+    # region Expressions
+    def module(self, ir):
+        self.write(str(MODULES[ir.value]))
+
+    def null(self, ir):
+        pass
+
+    def ident(self, ir):
+        self.write(str(ir.value))
+
+    def const(self, ir):
         if ir.value is None:
-            return "NULL"
+            self.write("NULL")
         elif isinstance(ir.value, str):
-            return f"\"{ir.value}\""
+            self.write(f"\"{ir.value}\"")
         else:
-            return str(ir.value)
+            self.write(str(ir.value))
 
+    def c_type(self, type_):
+        c_type = convert_type(type_)
+        if c_type in STDINT_TYPES:
+            self.uses_stdint = True
+        return c_type
 
-    elif isinstance(ir, IRVarDecl):
-        var_type = convert_type(ir.explicit_type) or "auto"
+    def var_decl(self, ir):
+        var_type = self.c_type(ir.explicit_type) or "auto"
         const = "const " if ir.is_const else ""
-        name = ir.name
-        value_code = generate_c(ir.value) if not isinstance(ir.value, IRNull) else ""
-        assign = f" = {value_code}" if value_code else ""
-        return f"{const}{var_type} {name}{assign}"
+        self.write(f"{const}{var_type} {ir.name}")
+        if not isinstance(ir.value, IRNull):
+            self.write(" = ")
+            self.expr(ir.value)
 
-    elif isinstance(ir, IRObjDecl):
-        struct_lines = ["typedef struct {"]
-        for prop in ir.properties:
-            struct_lines.append(
-                get_indent(indent_level + 1) + f"{generate_c(prop)};"
-            )
-        struct_lines.append(get_indent(indent_level) + f"}} {ir.name}")
-        return "\n".join(struct_lines)
-    
-    elif isinstance(ir, IRGrpDecl):
-        decl = f"{convert_type(ir.declared_type)} {ir.name}[{ir.size}]"
+    def grp_decl(self, ir):
+        self.write(f"{self.c_type(ir.declared_type)} {ir.name}[{ir.size}]")
 
         if ir.items:
-            size = int(ir.size)  # <-- fix: ensure it's an integer
+            size = int(ir.size)
             values = ["0"] * size  # default fallback
             for item in ir.items:
                 idx = item.index
-                val = generate_c(IRConst(item.value), indent_level)
                 if 0 <= idx < size:
-                    values[idx] = val
-
-            initializer = "{" + ", ".join(values) + "}"
-            return f"{decl} = {initializer}"
+                    values[idx] = self.text(item.value)
+            self.write(" = {" + ", ".join(values) + "}")
+
+    def return_stmt(self, ir):
+        self.write("return ")
+        self.expr(ir.value)
+
+    def binary(self, ir):
+        prec = BINARY_PRECEDENCE.get(ir.operator, 0)
+        clarify = ir.operator if ir.operator in BITWISE_OPERATORS else None
+        self.operand(ir.left, prec, clarify)
+        self.write(f" {ir.operator} ")
+        # Operators are left-associative, so an equal-precedence right
+        # operand still needs parentheses
+        self.operand(ir.right, prec + 1, clarify)
+
+    def operand(self, ir, min_prec, clarify=None):
+        if isinstance(ir, IRBinary) and (BINARY_PRECEDENCE.get(ir.operator, 0) < min_prec
+                                         or clarify is not None and ir.operator != clarify):
+            self.write("(")
+            self.expr(ir)
+            self.write(")")
         else:
-            return f"{decl}" 
-
-    elif isinstance(ir, IRFuncDecl):
-        decl = f"{ir.return_type} {ir.name}("
-        decl += ", ".join(generate_c(p) for p in ir.params)
-        decl += ") {\n"
-
-        body_lines = [generate_c(stmt, indent_level + 1) + ";" for stmt in ir.body]
-        body_code = "\n".join(indent_lines(body_lines, indent_level + 1))
-        
-        decl += body_code + "\n" + get_indent(indent_level) + "}"
-        return decl
-
-
-    elif isinstance(ir, IRIf):
-        lines = []
-
-        # Handle main if condition
-        cond = generate_c(ir.conditions[0])
-        lines.append(f"{get_indent(indent_level)}if ({cond}) {{")
-        for stmt in ir.then_branch:
-            lines.append(get_indent(indent_level + 1) + generate_c(stmt) + ";")
-        lines.append(get_indent(indent_level) + "}")
-
-        # Handle elif blocks
-        for elif_ir in ir.elif_branches:
-            # If it's a full nested IRIf, recurse into it and replace "if" with "else if"
-            if isinstance(elif_ir, IRIf):
-                elif_code = generate_c(elif_ir, indent_level)
-                # Replace first 'if' with 'else if'
-                elif_code = elif_code.replace("if", "else if", 1)
-                lines.append(elif_code)
-            else:
-                elif_cond = generate_c(elif_ir.conditions[0])
-                lines.append(f"{get_indent(indent_level)}else if ({elif_cond}) {{")
-                for stmt in elif_ir.then_branch:
-                    lines.append(get_indent(indent_level + 1) + generate_c(stmt) + ";")
-                lines.append(get_indent(indent_level) + "}")
-
-        # Handle else
-        if ir.else_branch:
-            if len(ir.else_branch) > 0:
-                lines.append(f"{get_indent(indent_level)}else {{")
-                for stmt in ir.else_branch:
-                    lines.append(get_indent(indent_level + 1) + generate_c(stmt) + ";")
-                lines.append(get_indent(indent_level) + "}")
-
-        return "\n".join(lines)
+            self.expr(ir)
+
+    def unary(self, ir):
+        wrap = isinstance(ir.operand, IRBinary)
+        if not ir.postfix:
+            self.write(ir.operator)
+        if wrap:
+            self.write("(")
+        self.expr(ir.operand)
+        if wrap:
+            self.write(")")
+        if ir.postfix:
+            self.write(ir.operator)
+
+    def assignment(self, ir):
+        self.expr(ir.assignee)
+        self.write(f" {ir.operator} ")
+        self.expr(ir.value)
+
+    def call(self, ir):
+        func_name = self.text(ir.caller)
 
-    elif isinstance(ir, IRWhile):
-        cond_code = generate_c(ir.condition)
-        lines = [f"{get_indent(indent_level)}while ({cond_code}) {{"]
-
-        for stmt in ir.body:
-            stmt_code = generate_c(stmt, indent_level + 1)
-            lines.append(get_indent(indent_level + 1) + stmt_code + ";")
-
-        lines.append(get_indent(indent_level) + "}")
-        return "\n".join(lines)
-
-    elif isinstance(ir, IRFor):
-        init_code = generate_c(ir.init)
-        cond_code = generate_c(ir.condition)
-        inc_code = generate_c(ir.increment)
-
-        lines = [f"{get_indent(indent_level)}for ({init_code}; {cond_code}; {inc_code}) {{"]
-
-        for stmt in ir.body:
-            stmt_code = generate_c(stmt, indent_level + 1)
-            lines.append(get_indent(indent_level + 1) + stmt_code + ";")
-
-        lines.append(get_indent(indent_level) + "}")
-        return "\n".join(lines)
-
-
-    elif isinstance(ir, IRReturn):
-        return f"return {generate_c(ir.value)}"
-
-
-    elif isinstance(ir, IRBinary):
-        left = generate_c(ir.left)
-        right = generate_c(ir.right)
-        if isinstance(left, IRBinary) or isinstance(right, IRBinary):
-            return f"({left} {ir.operator} {right})"
-        else:
-            return f"{left} {ir.operator} {right}"
-    
-    elif isinstance(ir, IRUnary):
-        right = generate_c(ir.operand)
-        pos = ""
-        if ir.postfix == False: pos = f"{ir.operator}{right}"
-        else: pos = f"{right}{ir.operator}"
-        if isinstance(right, IRBinary) or isinstance(right, IRUnary):
-            return f"({pos})"
-        else:
-            return f"{pos}"
-
-    elif isinstance(ir, IRAssignment):
-        target = ir.assignee
-        val = generate_c(ir.value)
-        return f"{target} {ir.operator} {val}"
-
-    elif isinstance(ir, IRCall):
-        func_name = generate_c(ir.caller)
-
-        indent = get_indent(indent_level)
         # Custom handling for special built-in functions
         if func_name == "load_sprite" and len(ir.args) == 2:
             arg = ir.args[0]
             spr_num = ir.args[1]
             if isinstance(arg, IRMember) and arg.computed:
-                array_name = generate_c(arg.object)
-                index = generate_c(arg.property)
-                spr_index = generate_c(spr_num)
-                return (
+                array_name = self.text(arg.object)
+                index = self.text(arg.property)
+                spr_index = self.text(spr_num)
+                self.write(
                     f"set_sprite_data({index}, {int(spr_index)}, {array_name});\n"
-                    f"{indent}set_sprite_tile({index}, {int(index) + 1})"
+                    f"{self.indents[-1]}set_sprite_tile({index}, {int(index) + 1})"
                 )
+                return
+
+        elif func_name == "load_map":
+            self.uses_map_loader = True
 
         elif func_name == "draw_sprite" and len(ir.args) == 3:
             arg = ir.args[0]
-            x = generate_c(ir.args[1])
-            y = generate_c(ir.args[2])
             if isinstance(arg, IRMember) and arg.computed:
-                index = generate_c(arg.property)
-                return f"move_sprite({index}, {x}, {y})"
+                self.write("move_sprite(")
+                self.expr(arg.property)
+                self.write(", ")
+                self.expr(ir.args[1])
+                self.write(", ")
+                self.expr(ir.args[2])
+                self.write(")")
+                return
 
         # Default: remap aliases and fallback to C-style call
-        if func_name in CALL_ALIASES:
-            func_name = CALL_ALIASES[func_name]
-
-        arg_list = [generate_c(arg) for arg in ir.args]
-        return f"{func_name}({', '.join(arg_list)})"
-
-
-    elif isinstance(ir, IRMember):
-        obj = generate_c(ir.object)
-        prop = generate_c(ir.property)
+        self.write(CALL_ALIASES.get(func_name, func_name))
+        self.write("(")
+        for i, arg in enumerate(ir.args):
+            if i:
+                self.write(", ")
+            self.expr(arg)
+        self.write(")")
+
+    def member(self, ir):
+        self.expr(ir.object)
         if ir.computed:
-            return f"{obj}[{prop}]"
+            self.write("[")
+            self.expr(ir.property)
+            self.write("]")
         else:
-            return f"{obj}.{prop}"
+            self.write(".")
+            self.expr(ir.property)
+
+    def prop(self, ir):
+        self.write(f"{self.c_type(ir.declared_type)} {ir.name}")
+
+    def cblock(self, ir):
+        self.write(ir.value.strip())
+    # endregion
+
+
+# IR kind -> CEmitter method writing the node as an expression
+EXPR_HANDLERS = [None] * IRKind.COUNT
+EXPR_HANDLERS[IRKind.MODULE] = CEmitter.module
+EXPR_HANDLERS[IRKind.NULL] = CEmitter.null
+EXPR_HANDLERS[IRKind.IDENT] = CEmitter.ident
+EXPR_HANDLERS[IRKind.CONST] = CEmitter.const
+EXPR_HANDLERS[IRKind.VAR_DECL] = CEmitter.var_decl
+EXPR_HANDLERS[IRKind.GRP_DECL] = CEmitter.grp_decl
+EXPR_HANDLERS[IRKind.RETURN] = CEmitter.return_stmt
+EXPR_HANDLERS[IRKind.BINARY] = CEmitter.binary
+EXPR_HANDLERS[IRKind.UNARY] = CEmitter.unary
+EXPR_HANDLERS[IRKind.ASSIGNMENT] = CEmitter.assignment
+EXPR_HANDLERS[IRKind.CALL] = CEmitter.call
+EXPR_HANDLERS[IRKind.MEMBER] = CEmitter.member
+EXPR_HANDLERS[IRKind.PROPERTY] = CEmitter.prop
+EXPR_HANDLERS[IRKind.CBLOCK] = CEmitter.cblock
+
+# IR kind -> CEmitter method writing the node as whole line(s); anything
+# else is written as an expression statement ending in ';'
+STMT_HANDLERS = [None] * IRKind.COUNT
+STMT_HANDLERS[IRKind.OBJ_DECL] = CEmitter.obj_decl
+STMT_HANDLERS[IRKind.FUNC_DECL] = CEmitter.func_decl
+STMT_HANDLERS[IRKind.IF] = CEmitter.if_stmt
+STMT_HANDLERS[IRKind.WHILE] = CEmitter.while_stmt
+STMT_HANDLERS[IRKind.FOR] = CEmitter.for_stmt
 
 
-
-    elif isinstance(ir, IRProperty):
-        return f"{convert_type(ir.declared_type)} {ir.name}"
-
-    
-    if isinstance(ir, IRCBlock):
-        return ir.value.strip()
-
-
-    else:
-        raise NotImplementedError(f"Unhandled IR node: {type(ir).__name__}")
-
 def get_indent(level):
     return "\t" * level
 
@@ -312,8 +409,7 @@ IRProgram([
             IRIdent(printf), args([IRConst(Hello World)])
         )
     ])
-    ), 
+    ),
     IRState(update, body([])),
     IRState(draw, body([]))])
 """
-
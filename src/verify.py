@@ -0,0 +1,116 @@
+# verify.py
+from src.ir_nodes import *
+
+# Fields holding a list of IR nodes
+LIST_FIELDS = ("body", "properties", "items", "params", "conditions",
+               "then_branch", "elif_branches", "else_branch", "args")
+
+# Kinds that are statements only and may not appear inside an expression
+STMT_KINDS = (IRKind.PROGRAM, IRKind.OBJ_DECL, IRKind.FUNC_DECL, IRKind.STATE,
+              IRKind.IF, IRKind.WHILE, IRKind.FOR, IRKind.MODULE)
+
+# Kinds that only make sense at the top level of the program
+TOP_LEVEL_KINDS = (IRKind.FUNC_DECL, IRKind.STATE, IRKind.OBJ_DECL, IRKind.MODULE)
+
+BINARY_OPERATORS = ("+", "-", "*", "/", "%", "<<", ">>", "&", "|", "^",
+                    "==", "!=", "<", "<=", ">", ">=", "&&", "||", "and", "or")
+UNARY_OPERATORS = ("-", "+", "!", "~", "++", "--")
+ASSIGN_OPERATORS = ("=", "+=", "-=", "*=", "/=", "%=", "<<=", ">>=", "&=", "|=", "^=")
+
+
+class IRVerifyError(Exception):
+    def __init__(self, pass_name, problems):
+        super().__init__(f"IR verification failed after '{pass_name}': " + "; ".join(problems[:5]))
+        self.pass_name = pass_name
+        self.problems = problems
+
+
+class IRVerifier:
+    """Checks the structural invariants IR passes and the C emitter rely on.
+
+    Every node is a known IR class with its own `kind`, appears only once
+    in the tree (passes rewrite nodes in place, so sharing one between two
+    parents would change both), list fields hold lists, operators are ones
+    the emitter can write, and statements only appear where statements go.
+    """
+    def __init__(self):
+        self.problems = []
+        self.seen = set()
+
+    def error(self, node, msg):
+        self.problems.append(f"{type(node).__name__}: {msg}")
+
+    def run(self, program):
+        if not isinstance(program, IRProgram):
+            self.error(program, "root is not an IRProgram")
+            return self.problems
+        self.seen.add(id(program))
+        self.block(program, program.body, top=True)
+        return self.problems
+
+    def block(self, parent, stmts, top=False):
+        if not isinstance(stmts, list):
+            self.error(parent, "statement list is not a list")
+            return
+        for stmt in stmts:
+            if isinstance(stmt, IRNode) and stmt.kind in TOP_LEVEL_KINDS and not top:
+                self.error(stmt, "only allowed at the top level")
+            self.node(stmt, statement=True)
+
+    def node(self, ir, statement=False):
+        if not isinstance(ir, IRNode):
+            self.problems.append(f"expected an IR node, found {ir!r}")
+            return
+        if ir.kind is None or type(ir).kind != ir.kind:
+            self.error(ir, f"bad kind {ir.kind!r}")
+            return
+        if id(ir) in self.seen:
+            self.error(ir, f"node shared between two parents: {ir!r}")
+            return
+        self.seen.add(id(ir))
+        if not statement and ir.kind in STMT_KINDS:
+            self.error(ir, "statement used as an expression")
+
+        match ir.kind:
+            case IRKind.CONST:
+                if ir.value is not None and type(ir.value) not in (int, str):
+                    self.error(ir, f"value {ir.value!r} is not an int or string")
+            case IRKind.IDENT:
+                if not isinstance(ir.value, str):
+                    self.error(ir, f"name {ir.value!r} is not a string")
+            case IRKind.BINARY:
+                if ir.operator not in BINARY_OPERATORS:
+                    self.error(ir, f"unknown operator {ir.operator!r}")
+            case IRKind.UNARY:
+                if ir.operator not in UNARY_OPERATORS:
+                    self.error(ir, f"unknown operator {ir.operator!r}")
+            case IRKind.ASSIGNMENT:
+                if ir.operator not in ASSIGN_OPERATORS:
+                    self.error(ir, f"unknown operator {ir.operator!r}")
+            case IRKind.IF:
+                if not ir.conditions:
+                    self.error(ir, "no condition")
+                if any(not isinstance(e, IRIf) for e in ir.elif_branches):
+                    self.error(ir, "elif branch is not an IRIf")
+            case IRKind.GRP_DECL:
+                for item in ir.items:
+                    if not isinstance(item, IRIndex) or not 0 <= item.index < int(ir.size):
+                        self.error(ir, f"bad item {item!r} for size {ir.size}")
+
+        for field in ir.fields():
+            value = getattr(ir, field, None)
+            if field in LIST_FIELDS:
+                if field in ("body", "then_branch", "else_branch"):
+                    self.block(ir, value)
+                elif not isinstance(value, list):
+                    self.error(ir, f"'{field}' is not a list")
+                else:
+                    for item in value:
+                        self.node(item, statement=field == "elif_branches")
+            elif isinstance(value, IRNode):
+                self.node(value)
+
+
+def verify_ir(program):
+    """Return a list of problems found in `program`; empty when it is well formed."""
+    return IRVerifier().run(program)
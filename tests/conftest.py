@@ -0,0 +1,40 @@
+# conftest.py
+import os
+import sys
+import subprocess
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gbsb import parse_source
+from src.transformer import ast_to_ir
+from src.transpiler import generate_c
+from src.passes import PassManager
+
+
+def compile_ir(source, passes=None, level="2"):
+    """(IR, PassContext) for `source` after the -O `level` pipeline, or just `passes`; the IR is verified after every pass."""
+    _, program = parse_source(source, "test.gbs")
+    manager = PassManager(passes, verify=True) if passes is not None else PassManager.from_options(level, verify=True)
+    return manager.run(ast_to_ir(program))
+
+
+@pytest.fixture
+def build():
+    """Compile a source string to (C code, warnings)."""
+    def build(source, level="2"):
+        ir, ctx = compile_ir(source, level=level)
+        return generate_c(ir), ctx.warnings
+    return build
+
+
+@pytest.fixture
+def gbsb(tmp_path):
+    """Run the gbsb command line from the repository root, with a build cache of its own."""
+    def gbsb(*args):
+        cmd = [sys.executable, os.path.join(ROOT, "gbsb.py"), *args]
+        if args[0] == "build":
+            cmd += ["--cache-dir", str(tmp_path / "cache")]
+        return subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    return gbsb
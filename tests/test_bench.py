@@ -0,0 +1,44 @@
+# test_bench.py
+import json
+import copy
+import pytest
+from src import bench
+
+
+@pytest.mark.parametrize("shape", bench.SHAPES)
+def test_generated_programs_compile(shape, tmp_path):
+    source = bench.generate_program(shape, 60, seed=1, asset_dir=str(tmp_path))
+    assert source == bench.generate_program(shape, 60, seed=1, asset_dir=str(tmp_path))
+    phases = [phase for phase, _ in bench.run_phases(source, str(tmp_path / "bench.gbs"))]
+    assert phases == list(bench.PHASES)
+
+def test_result_has_every_phase_and_unit():
+    result = bench.run_bench(("mixed",), 40, repeat=1, sprite_tiles=8)
+    mixed = result["shapes"]["mixed"]
+    assert list(mixed["phases"]) == list(bench.PHASES)
+    assert mixed["tokens"] > 0 and mixed["c_bytes"] > 0
+    assert mixed["phases"]["lexer"]["tokens_per_sec"] > 0
+    assert result["sprites"]["tile_bytes"] == 8 * 16
+    assert list(result["sprites"]["phases"]) == list(bench.SPRITE_PHASES)
+
+def test_compare_flags_growth_past_the_threshold():
+    result = bench.run_bench(("states",), 20, repeat=1, sprite_tiles=0)
+    slower = copy.deepcopy(result)
+    phase = slower["shapes"]["states"]["phases"]["parser"]
+    phase["seconds"] = result["shapes"]["states"]["phases"]["parser"]["seconds"] * 2
+    assert bench.compare(result, result) == []
+    regressions = bench.compare(slower, result, threshold=0.5)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("states/parser seconds:")
+    assert bench.compare(slower, result, threshold=1.5) == []
+
+def test_command_writes_and_checks_a_baseline(gbsb, tmp_path):
+    out = tmp_path / "bench.json"
+    args = ("bench", "--shape", "states", "--size", "20", "--repeat", "1", "--sprite-tiles", "0")
+    result = gbsb(*args, "--json", str(out))
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.startswith("states: ")
+    assert "states" in json.loads(out.read_text())["shapes"]
+    result = gbsb(*args, "--baseline", str(out), "--threshold", "100000")
+    assert result.returncode == 0
+    assert "No regressions against" in result.stdout
@@ -0,0 +1,44 @@
+# test_cache.py
+import os
+import shutil
+from conftest import ROOT
+from src.cache import BuildCache
+
+
+def entries(cache_dir):
+    return [name for _, _, files in os.walk(cache_dir) for name in files if name.endswith(".pkl")]
+
+
+def test_key_covers_source_directory_and_options(tmp_path):
+    cache = BuildCache(str(tmp_path))
+    key = cache.key("var x = 1;", "game/main.gbs", "O2")
+    assert key == cache.key("var x = 1;", "game/other.gbs", "O2")
+    assert key != cache.key("var x = 2;", "game/main.gbs", "O2")
+    assert key != cache.key("var x = 1;", "tools/main.gbs", "O2") # sprite paths resolve differently
+    assert key != cache.key("var x = 1;", "game/main.gbs", "O0")
+
+def test_entry_is_dropped_when_a_dependency_changes(tmp_path):
+    sprite = tmp_path / "slime.gbspr"
+    sprite.write_text("tiles")
+    cache = BuildCache(str(tmp_path / "cache"))
+    assert cache.store("ab12", None, "void main() {}", [str(sprite)], ["a warning"])
+    entry = cache.load("ab12")
+    assert entry.c_code == "void main() {}"
+    assert entry.warnings == ["a warning"]
+    sprite.write_text("other tiles")
+    assert cache.load("ab12") is None
+    assert cache.load("cd34") is None
+
+def test_second_build_comes_from_the_cache(gbsb, tmp_path):
+    for name in ("sprite.gbs", "slime.gbspr"):
+        shutil.copy(os.path.join(ROOT, "examples", name), tmp_path)
+    source = str(tmp_path / "sprite.gbs")
+    first = gbsb("build", source)
+    assert first.returncode == 0, first.stdout
+    assert len(entries(tmp_path / "cache")) == 1
+    second = gbsb("build", source)
+    assert second.stdout == first.stdout
+    assert len(entries(tmp_path / "cache")) == 1
+    # a different -O level is a different entry
+    assert gbsb("build", source, "-O0").returncode == 0
+    assert len(entries(tmp_path / "cache")) == 2
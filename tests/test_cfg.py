@@ -0,0 +1,98 @@
+# test_cfg.py
+from conftest import compile_ir
+from src.cfg import build_cfg, liveness, SSA
+from src.transpiler import generate_c
+
+SOURCE = """\
+state onload() {
+    var x: int = 0;
+    var n: int = 3;
+    if (n > 1) {
+        x = 1;
+    } elif (n > 0) {
+        x = 2;
+    }
+    while (n > 0) {
+        x = x + n;
+        n--;
+    }
+    printf("%d", x);
+}
+"""
+
+
+def lower(source, index=0):
+    ir, _ = compile_ir(source, passes=())
+    return ir.body[index], build_cfg(ir.body[index])
+
+def edges(cfg):
+    return {repr(block): [repr(succ) for succ in block.succs] for block in cfg.blocks}
+
+
+def test_branches_and_loops_become_blocks():
+    _, cfg = lower(SOURCE)
+    assert edges(cfg) == {
+        "B0": ["B1", "B2"], # if
+        "B1": ["B4"],
+        "B2": ["B3", "B4"], # elif, tested in its own block
+        "B3": ["B4"],
+        "B4": ["B5"],       # join
+        "B5": ["B6"],       # preheader
+        "B6": ["B7", "B8"], # loop header
+        "B7": ["B6"],       # back edge
+        "B8": ["B9"],
+    }
+    assert cfg.exit.preds == [cfg.blocks[8]]
+
+def test_unchanged_blocks_give_back_the_same_code():
+    state, cfg = lower(SOURCE)
+    original = [generate_c(stmt) for stmt in state.body]
+    assert [generate_c(stmt) for stmt in cfg.to_ir()] == original
+
+def test_code_after_return_is_unreachable():
+    func, cfg = lower("func f(a: int) : int {\n    return a;\n    a = 2;\n}\n")
+    returned, after = cfg.blocks
+    assert returned.succs == [cfg.exit]
+    assert after.preds == []
+    assert cfg.reachable() == {returned, cfg.exit}
+
+def test_phis_merge_branch_and_loop_values():
+    _, cfg = lower(SOURCE)
+    dump = cfg.dump(SSA(cfg)).splitlines()
+    assert "    x.4 = phi(B2: x.1, B1: x.3, B3: x.2)" in dump
+    assert "    n.2 = phi(B5: n.1, B7: n.3)" in dump
+    assert "    x.5 = phi(B5: x.4, B7: x.6)" in dump
+    assert "    x = x + n // x.6" in dump
+
+def test_parameters_enter_as_version_zero_and_shadowed_names_are_skipped():
+    func, cfg = lower("""\
+func f(a: int) : int {
+    var s: int = a;
+    if (a > 0) {
+        var s: int = 2;
+        a = s;
+    }
+    return a;
+}
+""")
+    ssa = SSA(cfg)
+    assert ssa.names == {"a"}
+    assert ("a", 0) in ssa.uses.values()
+    assert "s" not in {name for name, _ in ssa.defs.values()}
+
+def test_liveness():
+    _, cfg = lower(SOURCE)
+    live_in, live_out = liveness(cfg)
+    header, body, after = cfg.blocks[6:9]
+    assert {"n", "x"} <= live_in[header]
+    assert live_out[body] == live_in[header]
+    assert "n" not in live_in[after]
+    assert not {"n", "x"} & live_in[cfg.entry]
+
+def test_debug_cfg_prints_every_state(gbsb):
+    result = gbsb("build", "examples/basic.gbs", "--debug-cfg", "-O0")
+    assert result.returncode == 0, result.stdout
+    lines = result.stdout.splitlines()
+    for state in ("load", "update", "draw"):
+        assert f"CFG {state}:" in lines
+    assert lines[1:4] == ["  B0 (entry): preds [] succs [B1]", '    printf("Hello World")', "  B1 (exit): preds [B0] succs []"]
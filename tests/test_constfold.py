@@ -0,0 +1,69 @@
+# test_constfold.py
+import pytest
+from conftest import compile_ir
+from src.constfold import fold_binary, fold_unary
+from src.transpiler import generate_c
+
+
+def fold(body, decls=""):
+    ir, _ = compile_ir(f"{decls}state onload() {{\n{body}\n}}\n", passes=("constfold",))
+    return generate_c(ir)
+
+
+@pytest.mark.parametrize("op, a, b, expected", [
+    ("+", 32767, 1, -32768),   # int wraps at 16 bits
+    ("*", 300, 300, 24464),
+    ("/", -7, 2, -3),          # C truncates towards zero
+    ("%", -7, 2, -1),
+    ("/", 1, 0, None),         # left for the C compiler
+    ("<<", 1, 16, None),
+    (">>", -8, 1, -4),
+    ("+", 40000, 1, None),     # a long literal in C
+    ("<", 1, 2, 1),
+    ("and", 1, 0, 0),
+])
+def test_fold_binary(op, a, b, expected):
+    assert fold_binary(op, a, b) == expected
+
+def test_fold_unary():
+    assert fold_unary("-", -32768) == -32768
+    assert fold_unary("~", 0) == -1
+    assert fold_unary("!", 5) == 0
+    assert fold_unary("-", 40000) is None
+
+def test_constant_expressions_fold():
+    c_code = fold("    var x = 2 * 3 + 4;\n    var y = 10 / 0;\n")
+    assert "int x = 10;" in c_code
+    assert "int y = 10 / 0;" in c_code
+
+def test_const_is_propagated_and_folded():
+    c_code = fold("    const c = 4;\n    var x = c * 2;\n")
+    assert "int x = 8;" in c_code
+
+def test_const_wraps_to_its_declared_type():
+    c_code = fold("    const e: u8 = 300;\n    var x = e + 1;\n")
+    assert "const uint8_t e = 44;" in c_code
+    assert "int x = 45;" in c_code
+
+def test_const_outside_int_is_not_propagated():
+    c_code = fold("    const c: u16 = 40000;\n    const d: u16 = 300;\n    var x = c / 3 + d;\n")
+    assert "x = c / 3 + 300;" in c_code
+    assert "40000 / 3" not in c_code
+
+def test_shadowing_stops_propagation():
+    c_code = fold("""\
+    const c = 4;
+    if (1) {
+        var c = 9;
+        c = c + 1;
+        var y = c;
+    }
+    var x = c;
+""")
+    assert "y = c;" in c_code
+    assert "x = 4;" in c_code
+
+def test_parameter_shadows_global_const():
+    ir, _ = compile_ir("const n = 3;\nfunc f(n: int) : int {\n    return n + 1;\n}\n", passes=("constfold",))
+    func = ir.body[1]
+    assert generate_c(func.body[0].value) == "n + 1"
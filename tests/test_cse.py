@@ -0,0 +1,97 @@
+# test_cse.py
+from conftest import compile_ir
+from src.transpiler import generate_c
+
+
+def cse(body, decls=""):
+    ir, _ = compile_ir(f"{decls}state onload() {{\n{body}\n}}\n", passes=("cse",))
+    return generate_c(ir)
+
+
+def test_repeated_expression_is_computed_once():
+    c_code = cse("""\
+    var a: int = 1;
+    var b: int = 2;
+    var c = a + b;
+    var d = a + b;
+""")
+    assert "int _cse0 = a + b;" in c_code
+    assert "int c = _cse0;" in c_code
+    assert "int d = _cse0;" in c_code
+
+def test_write_ends_the_reuse():
+    c_code = cse("""\
+    var a: int = 1;
+    var b: int = 2;
+    var c = a + b;
+    a = 5;
+    var d = a + b;
+""")
+    assert "_cse" not in c_code
+
+def test_field_write_only_kills_what_it_aliases():
+    c_code = cse("""\
+    var c = p.x + 1;
+    p.y = 3;
+    var d = p.x + 1;
+    p.x = 4;
+    var e = p.x + 1;
+""", "obj Pt {\n    x: int,\n    y: int\n};\nobj p = Pt {};\n")
+    assert "int _cse0 = p.x + 1;" in c_code
+    assert "int d = _cse0;" in c_code
+    assert "e = p.x + 1;" in c_code
+
+def test_call_kills_global_reads():
+    c_code = cse("""\
+    var c = g + 1;
+    tick();
+    var d = g + 1;
+""", "var g: int = 0;\n")
+    assert "_cse" not in c_code
+
+def test_comparison_temporary_is_a_byte():
+    c_code = cse("""\
+    var a: int = 1;
+    var b = a > 3;
+    var c = a > 3;
+""")
+    assert "uint8_t _cse0 = a > 3;" in c_code
+
+def test_division_is_never_hoisted():
+    c_code = cse("""\
+    var x: int = 10;
+    var y: int = 0;
+    var a = x / y + 1;
+    var b = x / y + 1;
+    var c = x % y;
+    var d = x % y;
+""")
+    assert "_cse" not in c_code
+
+def test_guarded_division_stays_behind_its_guard():
+    c_code = cse("""\
+    var x: int = 10;
+    var y: int = 0;
+    if (y != 0 && x / y + 1 > 3 && x / y + 1 < 9) { printf("a"); }
+""")
+    assert "_cse" not in c_code
+    assert "if (y != 0 && x / y + 1 > 3 && x / y + 1 < 9)" in c_code
+
+def test_short_circuit_operand_starts_no_temporary():
+    c_code = cse("""\
+    var x: int = 10;
+    var n: int = 0;
+    if (n > 0 && x + n > 3 && x + n < 9) { printf("b"); }
+    if (n > 0 or x * n > 3 or x * n < 9) { printf("c"); }
+""")
+    assert "_cse" not in c_code
+
+def test_short_circuit_operand_reuses_an_earlier_value():
+    c_code = cse("""\
+    var x: int = 10;
+    var n: int = 0;
+    var s = x + n;
+    if (n > 0 && x + n > 3) { printf("b"); }
+""")
+    assert "int _cse0 = x + n;" in c_code
+    assert "if (n > 0 && _cse0 > 3)" in c_code
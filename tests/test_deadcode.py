@@ -0,0 +1,90 @@
+# test_deadcode.py
+from conftest import compile_ir
+from src.transpiler import generate_c
+
+
+def dead(source):
+    ir, ctx = compile_ir(source, passes=("deadcode",))
+    return generate_c(ir), ctx.removed
+
+
+def test_statements_after_return_are_dropped():
+    ir, ctx = compile_ir("""\
+func f() : int {
+    return 1;
+    printf("never");
+}
+state onload() {
+    printf("%d", f());
+}
+""", passes=("deadcode",))
+    assert len(ir.body[0].body) == 1
+    assert ctx.removed == ["1 unreachable statement(s) after return in 'f'"]
+
+def test_constant_branches_are_resolved():
+    c_code, removed = dead("""\
+state onload() {
+    if (0) {
+        printf("a");
+    } elif (1) {
+        printf("b");
+    } else {
+        printf("c");
+    }
+    while (0) {
+        printf("d");
+    }
+}
+""")
+    assert 'printf("b");' in c_code
+    for text in ('"a"', '"c"', '"d"', "if", "while (0)"):
+        assert text not in c_code
+    assert "while loop with false condition in 'onload'" in removed
+
+def test_false_for_keeps_initializer_side_effects():
+    c_code, removed = dead("""\
+state onload() {
+    for (var i = tick(); 0; i++) {
+        printf("x");
+    }
+    for (var j = 0; 0; j++) {
+        printf("y");
+    }
+}
+""")
+    assert "\ttick();" in c_code
+    assert "printf" not in c_code
+    assert " j" not in c_code
+    assert removed.count("for loop with false condition in 'onload'") == 2
+
+def test_true_branch_with_declarations_keeps_its_scope():
+    c_code, _ = dead("""\
+state onload() {
+    if (1) {
+        var a = 1;
+        printf("%d", a);
+    }
+}
+""")
+    assert "if (1) {" in c_code
+
+def test_unreachable_globals_are_pruned():
+    ir, ctx = compile_ir("""\
+var used: int = 1;
+var unused: int = 2;
+func helper() : int {
+    return used;
+}
+func orphan() : int {
+    return 3;
+}
+state onload() {
+    printf("%d", helper());
+}
+state other() {
+    printf("x");
+}
+""", passes=("deadcode",))
+    names = [stmt.name for stmt in ir.body]
+    assert names == ["used", "helper", "onload"]
+    assert ctx.removed == ["global 'unused' (unused)", "function 'orphan' (unused)", "state 'other' (never entered)"]
@@ -0,0 +1,87 @@
+# test_inline.py
+from conftest import compile_ir
+from src.transpiler import generate_c
+
+FUNCS = """\
+func half(a: int) : int {
+    return a / 2;
+}
+func low(b: u8) : int {
+    return b + 1;
+}
+func twice(c: int) : int {
+    return c + c;
+}
+func report(d: int) : void {
+    var e = d * 3;
+    printf("%d", e);
+}
+"""
+
+
+def inline(body, funcs=FUNCS):
+    ir, ctx = compile_ir(f"{funcs}state onload() {{\n{body}\n}}\n", passes=("inline",))
+    return generate_c(ir), ctx.warnings
+
+
+def test_return_expression_is_substituted():
+    c_code, _ = inline("""\
+    var x: int = 8;
+    var y = half(x) + 1;
+""")
+    assert "int y = x / 2 + 1;" in c_code
+
+def test_argument_with_side_effects_used_twice_is_not_substituted():
+    c_code, _ = inline("""\
+    var x: int = 8;
+    var y = twice(x++) + 1;
+""")
+    assert "x++ + x++" not in c_code
+    assert "twice(x++)" in c_code
+
+def test_statement_body_is_spliced_with_fresh_names():
+    c_code, _ = inline("""\
+    var e: int = 1;
+    report(e);
+""")
+    assert "report(" not in c_code
+    assert "int _d2 = e;" in c_code
+    assert "int _e1 = _d2 * 3;" in c_code
+    assert 'printf("%d", _e1);' in c_code
+
+def test_unsigned_argument_is_not_reinterpreted():
+    # half() sees 40000 as the int -25536; substituting u would divide it unsigned
+    c_code, _ = inline("""\
+    var u: u16 = 40000;
+    var y = half(u) + 1;
+""")
+    assert "half(u) + 1" in c_code
+
+def test_unsigned_argument_keeps_the_conversion_when_spliced():
+    c_code, _ = inline("""\
+    var u: u16 = 40000;
+    var y = half(u);
+""")
+    assert "int _a1 = u;" in c_code
+    assert "y = _a1 / 2;" in c_code
+
+def test_narrower_argument_is_substituted():
+    c_code, _ = inline("""\
+    var s: u8 = 10;
+    var y = half(s) + 1;
+""")
+    assert "int y = s / 2 + 1;" in c_code
+
+def test_constant_out_of_parameter_range_is_not_substituted():
+    c_code, _ = inline("""\
+    var y = low(300) + 1;
+    var z = low(30) + 1;
+    var w = half(40000) + 1;
+""")
+    assert "low(300) + 1" in c_code
+    assert "int z = 30 + 1 + 1;" in c_code
+    assert "half(40000) + 1" in c_code
+
+def test_recursive_inline_function_warns():
+    _, warnings = inline("    loop(3);\n", "inline func loop(n: int) : void {\n    loop(n);\n}\n")
+    assert warnings == ["'loop' is recursive and was not inlined"]
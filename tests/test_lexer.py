@@ -0,0 +1,36 @@
+# test_lexer.py
+import io
+from src.lexer import Lexer
+from src.tokens import TokenType
+
+SOURCE = """\
+var x = 10; // ten
+  if (x >= 2 && y != 3) { x++; }
+printf("a // b");
+"""
+
+
+def summary(tokens):
+    return [(repr(tok), tok.ln, tok.col) for tok in tokens]
+
+
+def test_tokens_and_positions():
+    tokens = Lexer().tokenize(SOURCE)
+    assert [repr(tok) for tok in tokens[:5]] == ["var()", "identifier(x)", "assignment()", "number(10)", "semicolon()"]
+    assert [repr(tok) for tok in tokens[8:13]] == ["greater_eq()", "number(2)", "and()", "identifier(y)", "not_equals()"]
+    assert summary(tokens)[5] == ("if()", 2, 3)
+    assert summary(tokens)[-2:] == [("semicolon()", 3, 17), ("eof()", 4, 1)]
+    assert tokens[-4].type == TokenType.STRING and tokens[-4].value == "a // b"
+
+def test_errors_are_reported_and_skipped():
+    lexer = Lexer()
+    tokens = lexer.tokenize('x # y\n"open')
+    assert [repr(tok) for tok in tokens] == ["identifier(x)", "identifier(y)", "eof()"]
+    assert lexer.errors == ["Unexpected character: '#' at line 1, col 3", "Unterminated string at line 2 col 1"]
+
+def test_streams_match_the_whole_source_scan():
+    expected = summary(Lexer().tokenize(SOURCE))
+    assert summary(Lexer().iter_tokens(SOURCE)) == expected
+    for chunk_size in (1, 5, 64):
+        # strings are carried across chunk boundaries
+        assert summary(Lexer().iter_file(io.StringIO(SOURCE), chunk_size)) == expected
@@ -0,0 +1,88 @@
+# test_loops.py
+from conftest import compile_ir
+from src.transpiler import generate_c
+
+DECLS = """\
+var g: int = 2;
+obj Pt {
+    x: int,
+    y: int
+};
+obj p = Pt {};
+"""
+
+
+def loops(body):
+    ir, _ = compile_ir(f"{DECLS}state onload() {{\n    var a: int = 3;\n    var b: int = 4;\n    var n: int = 10;\n    var x: int = 0;\n{body}\n}}\n", passes=("loops",))
+    return generate_c(ir)
+
+
+def test_short_constant_loop_is_unrolled():
+    c_code = loops("""\
+    for (var i = 0; i < 3; i++) {
+        printf("%d", i * 2);
+    }
+""")
+    assert 'printf("%d", 0);\n\tprintf("%d", 2);\n\tprintf("%d", 4);' in c_code
+    assert "for" not in c_code
+
+def test_long_or_declaring_loops_are_not_unrolled():
+    c_code = loops("""\
+    for (var i = 0; i < 9; i++) {
+        printf("%d", i);
+    }
+    for (var k = 0; k < 2; k++) {
+        var t: int = k;
+        printf("%d", t);
+    }
+""")
+    assert "for (int i = 0; i < 9; i++) {" in c_code
+    assert "for (int k = 0; k < 2; k++) {" in c_code
+
+def test_loop_that_ignores_its_counter_counts_down():
+    c_code = loops("""\
+    for (var j = 0; j < 100; j++) {
+        tick();
+    }
+    for (var k = 0; k <= 300; k++) {
+        tick();
+    }
+    for (var m = 0; m < 100; m++) {
+        x = x + m;
+    }
+""")
+    assert "for (uint8_t j = 100; j != 0; j--) {" in c_code
+    assert "for (int k = 301; k != 0; k--) {" in c_code
+    assert "for (int m = 0; m < 100; m++) {" in c_code
+
+def test_invariant_expression_moves_before_the_loop():
+    c_code = loops("""\
+    while (n > 0) {
+        x = a * b + n + x / b;
+        n--;
+    }
+""")
+    assert "int _inv0 = a * b;\n\twhile (n > 0) {" in c_code
+    assert "x = _inv0 + n + x / b;" in c_code # dividing could fault if the loop never ran
+
+def test_member_writes_and_calls_keep_expressions_in_the_loop():
+    c_code = loops("""\
+    while (n > 0) {
+        x = p.x + p.y;
+        p.y = n;
+        n--;
+    }
+    while (n < 5) {
+        x = g + a;
+        tick();
+        n++;
+    }
+    while (n < 9) {
+        x = a * b;
+        tick();
+        n++;
+    }
+""")
+    assert "x = p.x + p.y;" in c_code
+    assert "x = g + a;" in c_code
+    assert "int _inv0 = a * b;" in c_code # locals can't change in a call
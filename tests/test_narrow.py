@@ -0,0 +1,80 @@
+# test_narrow.py
+
+OUT_OF_RANGE = """\
+state onload() {
+    var e: u8 = 300;
+    printf("%d", e);
+}
+"""
+
+WARNING = "value range [300, 300] of 'e' does not fit its type u8 [0, 255]"
+
+
+def test_out_of_range_initializer_warns(build):
+    c_code, warnings = build(OUT_OF_RANGE)
+    assert warnings == [WARNING]
+    assert "uint8_t e = 300;" in c_code
+
+def test_value_that_fits_does_not_warn(build):
+    _, warnings = build(OUT_OF_RANGE.replace("300", "255"))
+    assert warnings == []
+
+def test_warning_is_printed(gbsb, tmp_path):
+    source = tmp_path / "wide.gbs"
+    source.write_text(OUT_OF_RANGE)
+    for _ in range(2): # the second build comes from the cache
+        result = gbsb("build", str(source))
+        assert result.returncode == 0
+        assert f"GBSB: warning: {WARNING}" in result.stdout.splitlines()
+
+def test_inferred_integers_are_narrowed(build):
+    c_code, _ = build("""\
+state onload() {
+    var small = 5;
+    var negative = -5;
+    var wide = 1000;
+    printf("%d %d %d", small, negative, wide);
+}
+""")
+    assert "uint8_t small = 5;" in c_code
+    assert "int8_t negative = -5;" in c_code
+    assert "int wide = 1000;" in c_code
+
+def test_declared_int_is_kept(build):
+    c_code, _ = build("""\
+state onload() {
+    var a: int = 5;
+    printf("%d", a);
+}
+""")
+    assert "int a = 5;" in c_code
+    assert "int8_t" not in c_code
+
+def test_division_of_a_u16_value_is_not_folded_as_int(build):
+    # 40000 is outside int, so it can't go through int constant folding
+    c_code, warnings = build("""\
+state onload() {
+    var u: u16 = 40000;
+    var y = u / 3;
+    printf("%u", y);
+}
+""")
+    assert warnings == []
+    assert "y = u / 3;" in c_code
+
+def test_values_past_int_become_uint16(build):
+    c_code, warnings = build("""\
+state onload() {
+    var x = 40000;
+    var y = 30000;
+    var mixed = -1;
+    if (y > 0) {
+        mixed = 40000;
+    }
+    printf("%u %d %d", x, y, mixed);
+}
+""")
+    assert warnings == []
+    assert "uint16_t x = 40000;" in c_code
+    assert "int y = 30000;" in c_code
+    assert "int mixed = -1;" in c_code
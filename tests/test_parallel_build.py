@@ -0,0 +1,52 @@
+# test_parallel_build.py
+import os
+import shutil
+from conftest import ROOT
+
+GOOD = """\
+state onload() {
+    printf("%s");
+}
+"""
+
+
+def write_tree(root):
+    (root / "game" / "levels").mkdir(parents=True)
+    for rel in ("game/title.gbs", "game/levels/one.gbs", "game/levels/two.gbs"):
+        (root / rel).write_text(GOOD % rel)
+
+
+def test_directory_build_matches_single_builds(gbsb, tmp_path):
+    write_tree(tmp_path)
+    out = tmp_path / "out"
+    result = gbsb("build", str(tmp_path / "game"), "-j", "2", "-o", str(out))
+    assert result.returncode == 0, result.stdout
+    for rel in ("title", "levels/one", "levels/two"):
+        single = gbsb("build", str(tmp_path / "game" / f"{rel}.gbs"), "--no-cache")
+        assert (out / f"{rel}.c").read_text() == single.stdout.rstrip("\n")
+
+def test_failures_are_listed_and_the_rest_still_built(gbsb, tmp_path):
+    write_tree(tmp_path)
+    (tmp_path / "game" / "broken.gbs").write_text("state onload( {\n")
+    result = gbsb("build", str(tmp_path / "game"), "-j", "2")
+    assert result.returncode == 1
+    lines = result.stdout.splitlines()
+    assert f"== {tmp_path / 'game' / 'broken.gbs'}" in lines
+    assert "GBSB: 1 of 4 files failed to build:" in lines
+    assert (tmp_path / "game" / "levels" / "two.c").exists()
+    assert not (tmp_path / "game" / "broken.c").exists()
+
+def test_sequential_build_gives_the_same_files(gbsb, tmp_path):
+    write_tree(tmp_path)
+    assert gbsb("build", str(tmp_path / "game"), "-j", "3", "-o", str(tmp_path / "a")).returncode == 0
+    assert gbsb("build", str(tmp_path / "game"), "-j", "1", "-o", str(tmp_path / "b")).returncode == 0
+    for rel in ("title.c", "levels/one.c", "levels/two.c"):
+        assert (tmp_path / "a" / rel).read_text() == (tmp_path / "b" / rel).read_text()
+
+def test_outputs_that_collide_are_refused(gbsb, tmp_path):
+    shutil.copy(os.path.join(ROOT, "examples", "basic.gbs"), tmp_path)
+    (tmp_path / "other").mkdir()
+    shutil.copy(os.path.join(ROOT, "examples", "basic.gbs"), tmp_path / "other")
+    result = gbsb("build", str(tmp_path / "basic.gbs"), str(tmp_path / "other" / "basic.gbs"), "-o", str(tmp_path / "out"))
+    assert result.returncode == 1
+    assert "would both be written to" in result.stdout
@@ -0,0 +1,70 @@
+# test_sprite_bin.py
+import os
+import re
+import shutil
+import pytest
+from conftest import ROOT
+from src.sprite import Sprite
+from src.sprite_bin import (CompiledSprite, compile_sprite, compile_file, compiled_path, load_compiled,
+                            load_sprite, HEADER, MAGIC)
+
+SLIME = os.path.join(ROOT, "examples", "slime.gbspr")
+
+
+def sheet():
+    sprite = Sprite("bat")
+    sprite.add_tile(7, bytes(i % 4 for i in range(64)))
+    sprite.add_tile(2, bytes(3 - i % 4 for i in range(64)))
+    sprite.add_tile(30, bytes(64))
+    return sprite
+
+
+def test_compiled_sheet_reads_back_the_same_tiles():
+    sprite = sheet()
+    with CompiledSprite(compile_sprite(sprite)) as compiled:
+        assert compiled.name == "bat"
+        assert len(compiled) == 3
+        assert compiled.tile_ids() == [2, 7, 30]
+        assert bytes(compiled.tile(7)) == Sprite.encode_tiles(sprite.tiles[7])
+        assert bytes(compiled.tile_bytes()) == sprite.get_tile_bytes()
+        assert compiled.to_sprite().tiles == sprite.tiles
+        with pytest.raises(KeyError):
+            compiled.tile(3)
+
+@pytest.mark.parametrize("damage, message", [
+    (lambda data: data[:HEADER.size - 1], "compiled sprite is truncated"),
+    (lambda data: data[:HEADER.size + 3 + 5], "compiled sprite is truncated"), # inside the index
+    (lambda data: b"XXXX" + data[4:], "not a compiled sprite"),
+    (lambda data: MAGIC + b"\x09\x00" + data[6:], "compiled sprite format 9 is not supported (expected 1)"),
+])
+def test_damaged_sheet_is_refused(damage, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        CompiledSprite(damage(compile_sprite(sheet())))
+
+def test_truncated_tile_data_is_refused_on_lookup():
+    with CompiledSprite(compile_sprite(sheet())[:-8]) as compiled:
+        assert bytes(compiled.tile(2)) == Sprite.encode_tiles(sheet().tiles[2])
+        with pytest.raises(ValueError, match="tile 30 of compiled sprite 'bat' is truncated"):
+            compiled.tile(30)
+
+def test_stale_compiled_sheet_is_ignored(tmp_path):
+    text = tmp_path / "slime.gbspr"
+    shutil.copy(SLIME, text)
+    out = compile_file(str(text))
+    assert out == compiled_path(str(text)) == str(tmp_path / "slime.gbsprc")
+    with load_compiled(out, text.read_bytes()) as compiled:
+        assert bytes(compiled.tile_bytes()) == Sprite.from_file(str(text)).get_tile_bytes()
+    assert load_compiled(out, text.read_bytes() + b"\n") is None
+    assert load_compiled(str(tmp_path / "missing.gbsprc")) is None
+    assert load_sprite(out).tiles == load_sprite(str(text)).tiles
+
+def test_spr_compile_and_view(gbsb, tmp_path):
+    out = tmp_path / "slime.gbsprc"
+    result = gbsb("spr", SLIME, "--compile", "-o", str(out))
+    assert result.returncode == 0, result.stdout
+    assert result.stdout == f"Compiled {SLIME} to {out}\n"
+    assert gbsb("spr", str(out)).stdout == gbsb("spr", SLIME).stdout
+    out.write_bytes(b"")
+    result = gbsb("spr", str(out))
+    assert result.returncode == 1
+    assert result.stdout == f"Error: {out}: compiled sprite is empty\n"
@@ -0,0 +1,51 @@
+# test_sprite_calls.py
+from conftest import compile_ir
+from src.sprite_calls import stretch
+from src.transpiler import generate_c
+
+
+def sprites(body):
+    ir, _ = compile_ir(f"state onload() {{\n{body}\n}}\n", passes=("sprites",))
+    return generate_c(ir)
+
+
+def test_loads_that_leave_one_stretch_share_a_copy():
+    c_code = sprites("""\
+    load_sprite(slime[0], 1);
+    load_sprite(slime[0], 3);
+    load_sprite(slime[0], 2);
+""")
+    assert c_code.count("set_sprite_data") == 1
+    assert "set_sprite_data(0, 3, slime);\n\tset_sprite_tile(0, 1);" in c_code
+
+def test_overlapping_loads_keep_their_own_copies():
+    # the second load puts slime's tile 0 in slot 1, over the first load's tile 1
+    c_code = sprites("""\
+    load_sprite(slime[0], 2);
+    load_sprite(slime[1], 2);
+""")
+    assert "set_sprite_data(0, 2, slime);\n\tset_sprite_tile(0, 1);" in c_code
+    assert "set_sprite_data(1, 2, slime);\n\tset_sprite_tile(1, 2);" in c_code
+
+def test_runs_stop_at_other_statements_and_arrays():
+    c_code = sprites("""\
+    load_sprite(slime[0], 1);
+    tick();
+    load_sprite(slime[0], 2);
+    load_sprite(bat[0], 1);
+    load_sprite(bat[0], 2);
+    if (1) {
+        load_sprite(bat[4], 1);
+        load_sprite(bat[4], 2);
+    }
+""")
+    assert c_code.count("set_sprite_data") == 4
+    assert "set_sprite_data(0, 1, slime);\n\tset_sprite_tile(0, 1);\n\ttick();" in c_code
+    assert "set_sprite_data(0, 2, bat);" in c_code
+    assert "set_sprite_data(4, 2, bat);\n\t\tset_sprite_tile(4, 5);" in c_code
+
+def test_stretch():
+    assert stretch({3: 0, 4: 1, 5: 2}) == (3, 3, 0)
+    assert stretch({0: 1, 1: 2}) == (0, 2, 1)
+    assert stretch({0: 0, 1: 0}) is None
+    assert stretch({0: 0, 2: 1}) is None
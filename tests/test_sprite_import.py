@@ -0,0 +1,77 @@
+# test_sprite_import.py
+import zlib
+import struct
+from src.image import decode_image
+from src.sprite import Sprite
+from src.sprite_import import image_to_sprite, import_image, quantize
+
+# Four gray levels, white to black, across each 8-pixel row
+GRAYS = bytes((255, 255, 170, 170, 85, 85, 0, 0))
+
+
+def pgm(width, height, pixels):
+    return f"P5\n# test\n{width} {height}\n255\n".encode() + bytes(pixels)
+
+def png(width, height, rows, color_type=0):
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+    raw = b"".join(b"\x00" + row for row in rows) # filter type 0 on every row
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def test_gray_levels_map_light_to_dark():
+    image = decode_image(pgm(8, 8, GRAYS * 8))
+    assert quantize(image) == bytes((0, 0, 1, 1, 2, 2, 3, 3)) * 8
+
+def test_png_and_pgm_of_the_same_picture_agree():
+    from_pgm = image_to_sprite(decode_image(pgm(16, 8, GRAYS * 16)), "a")
+    from_png = image_to_sprite(decode_image(png(16, 8, [GRAYS * 2] * 8)), "a")
+    assert sorted(from_png.tiles) == [1, 2]
+    assert from_png.tiles == from_pgm.tiles
+
+def test_two_colors_stay_apart():
+    # both grays fall in the same quarter of the brightness range
+    image = decode_image(pgm(8, 8, bytes((200, 230)) * 32))
+    assert set(quantize(image)) == {0, 3}
+
+def test_transparent_pixels_take_shade_zero():
+    row = b"".join(bytes((0, 0, 0, 255 if x % 2 else 0)) for x in range(8)) # black, every other pixel clear
+    image = decode_image(png(8, 8, [row] * 8, color_type=6))
+    assert quantize(image) == bytes((0, 3)) * 32
+
+def test_import_skips_images_it_already_converted(tmp_path):
+    source = tmp_path / "bat.pgm"
+    source.write_bytes(pgm(8, 16, GRAYS * 16))
+    output = str(tmp_path / "bat.gbspr")
+    first = import_image(str(source), output)
+    assert (first.status, first.message) == ("converted", "2 tiles")
+    sprite = Sprite.from_file(output)
+    assert sprite.name == "bat"
+    assert sprite.tiles[1] == bytes((0, 0, 1, 1, 2, 2, 3, 3)) * 8
+    assert import_image(str(source), output).status == "unchanged"
+    assert import_image(str(source), output, force=True).status == "converted"
+    source.write_bytes(pgm(8, 8, GRAYS * 8))
+    assert import_image(str(source), output).message == "1 tiles"
+
+def test_bad_images_fail_with_their_path(tmp_path):
+    odd = tmp_path / "odd.pgm"
+    odd.write_bytes(pgm(12, 8, bytes(96)))
+    result = import_image(str(odd), str(tmp_path / "odd.gbspr"))
+    assert result.status == "failed"
+    assert result.message == f"{odd}: image is 12x8; sprite sheets must be a multiple of 8 pixels each way"
+    junk = tmp_path / "junk.png"
+    junk.write_bytes(b"not an image")
+    assert import_image(str(junk), str(tmp_path / "junk.gbspr")).message == f"{junk}: not a PNG or PGM image"
+
+def test_spr_import_converts_a_directory(gbsb, tmp_path):
+    (tmp_path / "art" / "enemies").mkdir(parents=True)
+    (tmp_path / "art" / "hero.pgm").write_bytes(pgm(8, 8, GRAYS * 8))
+    (tmp_path / "art" / "enemies" / "bat.png").write_bytes(png(8, 8, [GRAYS] * 8))
+    out = tmp_path / "out"
+    result = gbsb("spr", "import", str(tmp_path / "art"), "-o", str(out), "-j", "2")
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.splitlines()[-1] == "GBSB: 2 converted, 0 unchanged, 0 failed"
+    assert Sprite.from_file(str(out / "enemies" / "bat.gbspr")).tiles == Sprite.from_file(str(out / "hero.gbspr")).tiles
+    again = gbsb("spr", "import", str(tmp_path / "art"), "-o", str(out))
+    assert again.stdout == "GBSB: 0 converted, 2 unchanged, 0 failed\n"
@@ -0,0 +1,110 @@
+# test_strength.py
+import pytest
+from conftest import compile_ir
+from src.ir_nodes import IRKind
+
+SOURCE = """\
+obj Pt {
+    x: u16,
+    y: int
+};
+
+obj p = Pt {};
+var s: int = 0;
+var u: u16 = 0;
+
+state onload() {
+    var s_div = s / %(n)d;
+    var s_mod = s %% %(n)d;
+    var u_div = u / %(n)d;
+    var u_mod = u %% %(n)d;
+    var x_div = p.x / %(n)d;
+    var x_mod = p.x %% %(n)d;
+    var y_div = p.y / %(n)d;
+    var y_mod = p.y %% %(n)d;
+}
+"""
+
+SIGNED = (-32768, -32767, -5, -1, 0, 1, 5, 32766, 32767)
+UNSIGNED = (0, 1, 5, 32767, 32768, 32769, 40001, 40003, 65535)
+
+
+def c_div(a, b):
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def evaluate(ir, env):
+    """Value of a reduced expression; shifts and masks act on Python ints, so an unsigned operand never looks negative."""
+    match ir.kind:
+        case IRKind.CONST:
+            return ir.value
+        case IRKind.IDENT:
+            return env[ir.value]
+        case IRKind.MEMBER:
+            return env[f"{ir.object.value}.{ir.property.value}"]
+        case IRKind.BINARY:
+            a, b = evaluate(ir.left, env), evaluate(ir.right, env)
+            match ir.operator:
+                case "+": return a + b
+                case "-": return a - b
+                case "&": return a & b
+                case ">>": return a >> b
+                case "<<": return a << b
+                case "/": return c_div(a, b)
+                case "%": return a - c_div(a, b) * b
+    raise AssertionError(f"unexpected IR {ir!r}")
+
+def reduced(n):
+    ir, _ = compile_ir(SOURCE % {"n": n}, passes=("strength",))
+    onload = next(stmt for stmt in ir.body if stmt.kind == IRKind.STATE)
+    return {stmt.name: stmt.value for stmt in onload.body}
+
+
+@pytest.mark.parametrize("n", [2, 4, 8, 256])
+@pytest.mark.parametrize("name, operand, values", [
+    ("s", "s", SIGNED),
+    ("u", "u", UNSIGNED),
+    ("x", "p.x", UNSIGNED),
+    ("y", "p.y", SIGNED),
+])
+def test_division_by_power_of_two(n, name, operand, values):
+    exprs = reduced(n)
+    for op in ("div", "mod"):
+        expr = exprs[f"{name}_{op}"]
+        assert expr.kind != IRKind.BINARY or expr.operator not in ("/", "%"), f"{operand} {op} {n} was not reduced"
+        for value in values:
+            expected = c_div(value, n) if op == "div" else value - c_div(value, n) * n
+            assert evaluate(expr, {operand: value}) == expected, f"{operand} = {value}, {op} {n}"
+
+def test_unsigned_operands_get_no_sign_correction():
+    exprs = reduced(4)
+    for name in ("u_div", "x_div"):
+        assert exprs[name].operator == ">>" and exprs[name].left.kind != IRKind.BINARY
+    for name in ("u_mod", "x_mod"):
+        assert exprs[name].operator == "&"
+
+def test_sign_correction_shifts_by_operand_width():
+    ir, _ = compile_ir("""\
+var a: i8 = 0;
+var b: i16 = 0;
+state onload() {
+    var c = a / 4;
+    var d = b / 4;
+}
+""", passes=("strength",))
+    onload = next(stmt for stmt in ir.body if stmt.kind == IRKind.STATE)
+    shifts = [stmt.value.left.right.left.right.value for stmt in onload.body]
+    assert shifts == [7, 15]
+
+def test_unknown_operand_type_is_left_alone():
+    ir, _ = compile_ir("""\
+obj Pt {
+    x: u16
+};
+obj p = Pt {};
+state onload() {
+    var q = p.z / 4;
+}
+""", passes=("strength",))
+    onload = next(stmt for stmt in ir.body if stmt.kind == IRKind.STATE)
+    assert onload.body[0].value.operator == "/"
@@ -0,0 +1,75 @@
+# test_tilebank.py
+from conftest import compile_ir
+from src.sprite import Sprite
+from src.tilebank import TileBank, flip_x, flip_y, FLIP_X, FLIP_Y
+from src.transpiler import generate_c
+
+# Left half light, right half dark: differs from its left-right mirror only
+ROW = bytes((0, 1, 2, 3, 0, 0, 0, 0))
+TILE = ROW * 8
+MIRRORED = ROW[::-1] * 8
+BLANK = bytes(64)
+
+
+def encode(pixels):
+    return bytes(Sprite.encode_tiles(pixels))
+
+def write_sheet(path, name, *tiles):
+    sprite = Sprite(name)
+    for i, pixels in enumerate(tiles, 1):
+        sprite.add_tile(i, pixels)
+    path.write_text(sprite.to_text())
+    return str(path)
+
+def bank_program(tmp_path, body, gameloop=""):
+    hero = write_sheet(tmp_path / "hero.gbspr", "hero", TILE, BLANK)
+    foe = write_sheet(tmp_path / "foe.gbspr", "foe", MIRRORED, BLANK)
+    source = f'sprite("{hero}");\nsprite("{foe}");\nstate onload() {{\n{body}\n}}\nstate gameloop() {{\n{gameloop}\n}}\n'
+    ir, ctx = compile_ir(source, passes=("tilebank",))
+    return generate_c(ir), ctx
+
+
+def test_flips_undo_themselves():
+    tile = encode(TILE)
+    assert flip_x(tile) == encode(MIRRORED)
+    assert flip_x(flip_x(tile)) == tile
+    assert flip_y(flip_y(tile)) == tile
+    assert flip_y(encode(BLANK)) == encode(BLANK)
+
+def test_bank_stores_each_tile_once():
+    bank = TileBank()
+    tile = encode(TILE)
+    assert bank.add(tile) == (0, 0)
+    assert bank.add(encode(BLANK)) == (1, 0) # symmetric, so not a flip of anything
+    assert bank.add(tile) == (0, 0)
+    assert bank.add(flip_x(tile)) == (0, FLIP_X)
+    top = encode(ROW * 4 + bytes(32)) # differs from its top-bottom mirror too
+    assert bank.add(top) == (2, 0)
+    assert bank.add(flip_y(top)) == (2, FLIP_Y)
+    assert bank.add(flip_x(flip_y(top))) == (2, FLIP_X | FLIP_Y)
+    assert len(bank.tiles) == 3
+    assert bank.flipped == 3
+
+def test_sprites_share_one_bank(tmp_path):
+    c_code, ctx = bank_program(tmp_path, "    load_sprite(hero[0], 2);\n    load_sprite(foe[1], 1);",
+                               "    draw_sprite(foe[1], 10, 20);")
+    assert ctx.warnings == []
+    assert "unsigned char tile_bank[] = {" in c_code
+    assert "hero[]" not in c_code and "foe[]" not in c_code
+    assert ("\tset_sprite_data(0, 2, tile_bank);\n"
+            "\tset_sprite_tile(0, 1);\n\tset_sprite_prop(0, 0);\n"
+            "\tset_sprite_tile(1, 0);\n\tset_sprite_prop(1, 32);\n") in c_code
+    assert ctx.tile_bank.report() == (
+        "tile bank: 2 tiles for 2 sprite(s) of 4 tiles (1 duplicate, 1 flipped); "
+        "VRAM 4 -> 2 tiles (32 bytes saved), ROM 64 -> 32 bytes (32 saved)")
+
+def test_programs_the_bank_would_break_are_left_alone(tmp_path):
+    for body, reason in (
+        ("    set_sprite_data(0, 2, hero);", "it calls set_sprite_data() itself"),
+        ("    var r = load_sprite(hero[0], 2);", "load_sprite() is used inside an expression"),
+        ("    var h = hero;", "'hero' is used as an array"),
+    ):
+        c_code, ctx = bank_program(tmp_path, body)
+        assert ctx.warnings == [f"sprite tiles were not banked: {reason}"]
+        assert "tile_bank" not in c_code
+        assert ctx.tile_bank is None
@@ -0,0 +1,44 @@
+# test_tilemap.py
+import random
+import pytest
+from src.tilemap import (TileMap, compress_rle, compress_lz, decompress, MAP_RLE, MAP_LZ,
+                         MAX_LITERALS, MAX_RUN, MAX_MATCH, BG_TILES)
+
+PACKERS = {MAP_RLE: compress_rle, MAP_LZ: compress_lz}
+
+
+def pack(method, data):
+    return bytes((method, len(data) & 0xFF, len(data) >> 8)) + PACKERS[method](data)
+
+def samples():
+    rng = random.Random(0)
+    yield "empty", b""
+    yield "one tile", b"\x07"
+    yield "all literals", bytes(range(256)) * 3
+    yield "long run", b"\x01" * 1000
+    yield "runs at the limits", b"".join(bytes((i,)) * n for i, n in enumerate(
+        (1, 2, 3, MAX_RUN - 1, MAX_RUN, MAX_RUN + 1, MAX_MATCH, MAX_MATCH + 1, MAX_LITERALS + 1)))
+    yield "repeated rows", bytes(rng.randrange(8) for _ in range(BG_TILES)) * BG_TILES
+    yield "noise", bytes(rng.randrange(256) for _ in range(BG_TILES * BG_TILES))
+    yield "sparse", bytes(rng.choice((0, 0, 0, 0, 1, 2)) for _ in range(2000))
+
+
+@pytest.mark.parametrize("method", [MAP_RLE, MAP_LZ])
+@pytest.mark.parametrize("name, data", list(samples()))
+def test_round_trip(method, name, data):
+    assert decompress(pack(method, data)) == data
+
+@pytest.mark.parametrize("width, height", [(20, 18), (32, 32), (1, 1), (7, 3)])
+def test_tile_map_round_trip(width, height):
+    rng = random.Random(width * height)
+    tiles = bytes(rng.choice((0, 1, 1, 2, 5)) for _ in range(width * height))
+    tile_map = TileMap("test", width, height, tiles)
+    method, packed = tile_map.compress()
+    assert packed[0] == method
+    assert decompress(packed) == tile_map.bg_bytes()
+    assert len(packed) <= min(len(pack(m, tile_map.bg_bytes())) for m in PACKERS)
+
+def test_rows_are_padded_to_the_background_width():
+    tile_map = TileMap("test", 2, 2, b"\x01\x02\x03\x04")
+    pad = bytes(BG_TILES - 2)
+    assert tile_map.bg_bytes() == b"\x01\x02" + pad + b"\x03\x04" + pad